@@ -0,0 +1,45 @@
+"""
+Benchmark trajectory association.
+
+Compares the vectorised searchsorted association against evo's
+sync.associate_trajectories, which loops over every pose and returns
+deep-copied trajectories.
+
+Usage:
+    python3 -m benchmarks.bench_association [--duration S] [--rate HZ]
+"""
+import argparse
+import json
+import time
+from evo.core import sync
+from src.evo_analyser.association import associate
+from src.evo_analyser.evo_analyser import trajectory_from_poses
+from src.utils.synthetic import make_trajectory, perturb_trajectory
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=3600.0)
+    parser.add_argument("--rate", type=float, default=100.0)
+    parser.add_argument("--max-diff", type=float, default=0.01)
+    args = parser.parse_args()
+
+    reference = make_trajectory(args.duration, args.rate)
+    estimate = perturb_trajectory(reference, time_offset=0.003)
+    traj_ref, traj_est = trajectory_from_poses(reference), trajectory_from_poses(estimate)
+    results = {"poses": len(reference)}
+
+    start = time.perf_counter()
+    ref_ids, _ = associate(traj_ref.timestamps, traj_est.timestamps, args.max_diff)
+    results["searchsorted_s"] = time.perf_counter() - start
+    results["searchsorted_pairs"] = len(ref_ids)
+
+    start = time.perf_counter()
+    synced_ref, _ = sync.associate_trajectories(traj_ref, traj_est, max_diff=args.max_diff)
+    results["evo_s"] = time.perf_counter() - start
+    results["evo_pairs"] = synced_ref.num_poses
+
+    results["speedup"] = results["evo_s"] / results["searchsorted_s"]
+    print(json.dumps(results, indent=4))
+
+if __name__ == "__main__":
+    main()
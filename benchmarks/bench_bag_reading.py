@@ -0,0 +1,89 @@
+"""
+Benchmark bag reading throughput on a synthetic multi-GB sqlite3 bag.
+
+Compares the direct SQLite reader (all topics, and pose topics pushed down
+into the query) with rosbag2_py's SequentialReader filtering in Python, as
+BagProcessor did before. The rosbag2_py path is skipped when ROS2 is not
+available.
+
+Usage:
+    python3 -m benchmarks.bench_bag_reading [--size-gb 2] [--bag PATH]
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from src.bag_processor.bag_reader import SqliteBagReader
+from src.utils.synthetic import POSE_TYPE, write_synthetic_bag
+
+# Large non-pose topic that makes up the bulk of the bag, like camera images
+IMAGE_TOPIC = '/camera/image_raw'
+IMAGE_RATE = 10.0
+IMAGE_BYTES = 256 * 1024
+
+def time_reader(read) -> dict:
+    """
+    Drain a reader and measure its throughput.
+
+    Args:
+        read: Callable returning an iterable of message batches
+
+    Returns:
+        dict: Elapsed seconds, message count and bytes read
+    """
+    messages = payload_bytes = 0
+    start = time.perf_counter()
+    for batch in read():
+        messages += len(batch)
+        payload_bytes += sum(len(data) for _, data, _ in batch)
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": elapsed,
+        "messages": messages,
+        "mb_per_s": payload_bytes / 1e6 / elapsed,
+        "msgs_per_s": messages / elapsed,
+    }
+
+def read_sequential(bag_path: Path, pose_topics: list):
+    """
+    Read every message through rosbag2_py and keep the pose topics in Python.
+    """
+    import rosbag2_py
+
+    reader = rosbag2_py.SequentialReader()
+    reader.open(rosbag2_py.StorageOptions(uri=str(bag_path), storage_id='sqlite3'),
+                rosbag2_py.ConverterOptions(input_serialization_format='cdr',
+                                            output_serialization_format='cdr'))
+    while reader.has_next():
+        topic_name, data, timestamp = reader.read_next()
+        if topic_name in pose_topics:
+            yield [(topic_name, data, timestamp)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size-gb", type=float, default=2.0, help="Approximate bag size to generate")
+    parser.add_argument("--bag", type=Path, help="Reuse an existing synthetic bag instead of generating one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bag_path = args.bag
+        if bag_path is None:
+            duration = args.size_gb * 1e9 / (IMAGE_RATE * IMAGE_BYTES)
+            bag_path = write_synthetic_bag(Path(tmp) / 'synthetic.db3', duration=duration, pose_rate=100.0,
+                                           extra_topics={IMAGE_TOPIC: (IMAGE_RATE, IMAGE_BYTES)})
+
+        reader = SqliteBagReader(bag_path)
+        pose_topics = [t.name for t in reader.get_all_topics_and_types() if t.type == POSE_TYPE]
+        results = {"bag_bytes": bag_path.stat().st_size}
+        results["sqlite_all_topics"] = time_reader(lambda: reader.read_batches())
+        results["sqlite_pose_topics"] = time_reader(lambda: reader.read_batches(topics=pose_topics))
+        reader.close()
+        try:
+            results["rosbag2_sequential"] = time_reader(lambda: read_sequential(bag_path, pose_topics))
+        except ImportError:
+            results["rosbag2_sequential"] = None
+        print(json.dumps(results, indent=4))
+
+if __name__ == "__main__":
+    main()
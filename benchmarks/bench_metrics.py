@@ -0,0 +1,66 @@
+"""
+Benchmark APE/RPE computation.
+
+Compares the fused metric engine against four separate evo metric objects
+with repeated get_all_statistics() calls, as analyze_segment used to do.
+
+Usage:
+    python3 -m benchmarks.bench_metrics [--poses N]
+"""
+import argparse
+import json
+import time
+from evo.core import metrics
+from src.evo_analyser.evo_analyser import trajectory_from_poses
+from src.evo_analyser.metric_engine import compute_errors
+from src.utils.synthetic import make_trajectory, perturb_trajectory
+
+def run_evo(traj_ref, traj_est) -> float:
+    """
+    Time the four evo metrics including the statistics lookups.
+
+    Returns:
+        float: Elapsed seconds
+    """
+    start = time.perf_counter()
+    for relation in (metrics.PoseRelation.translation_part, metrics.PoseRelation.rotation_angle_deg):
+        ape = metrics.APE(relation)
+        ape.process_data((traj_ref, traj_est))
+        rpe = metrics.RPE(relation, delta=1, delta_unit=metrics.Unit.frames, all_pairs=False)
+        rpe.process_data((traj_ref, traj_est))
+        for metric in (ape, rpe):
+            for key in ("rmse", "mean", "median"):
+                metric.get_all_statistics()[key]
+    return time.perf_counter() - start
+
+def run_engine(traj_ref, traj_est) -> float:
+    """
+    Time the fused engine including statistics.
+
+    Returns:
+        float: Elapsed seconds
+    """
+    start = time.perf_counter()
+    compute_errors(traj_ref.positions_xyz, traj_ref.orientations_quat_wxyz,
+                   traj_est.positions_xyz, traj_est.orientations_quat_wxyz).statistics()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--poses", type=int, default=60_000)
+    args = parser.parse_args()
+
+    reference = make_trajectory(args.poses / 100.0, 100.0)
+    traj_ref = trajectory_from_poses(reference)
+    traj_est = trajectory_from_poses(perturb_trajectory(reference))
+    # Build evo's cached SE(3) matrices outside the timed region
+    traj_ref.poses_se3, traj_est.poses_se3
+
+    results = {"poses": len(reference)}
+    results["engine_s"] = run_engine(traj_ref, traj_est)
+    results["evo_s"] = run_evo(traj_ref, traj_est)
+    results["speedup"] = results["evo_s"] / results["engine_s"]
+    print(json.dumps(results, indent=4))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark PoseStamped decoding and TUM writing.
+
+Compares the batched NumPy decoder used by PoseFile against the previous
+per-message path (rclpy deserialize_message plus an f-string per pose).
+The rclpy path is skipped when ROS2 is not available.
+
+Usage:
+    python3 -m benchmarks.bench_pose_decoding [--messages N]
+"""
+import argparse
+import io
+import json
+import time
+import numpy as np
+from src.utils.pose_decoder import encode_pose_stamped, decode_pose_stamped_batch
+from src.utils.extract_poses import POSE_BATCH_SIZE
+
+def make_messages(count: int) -> tuple:
+    """
+    Build serialised PoseStamped messages with random poses.
+
+    Args:
+        count (int): Number of messages
+
+    Returns:
+        tuple: (list of serialised messages, list of bag timestamps in ns)
+    """
+    rng = np.random.default_rng(0)
+    poses = rng.normal(size=(count, 7))
+    start = 1733136910 * 1_000_000_000
+    timestamps = [start + i * 10_000_000 for i in range(count)]
+    messages = [
+        encode_pose_stamped(ts // 1_000_000_000, ts % 1_000_000_000, 'map', pose)
+        for ts, pose in zip(timestamps, poses)
+    ]
+    return messages, timestamps
+
+def run_rclpy_path(messages, timestamps) -> float:
+    """
+    Time per-message deserialisation and formatting as done before batching.
+
+    Returns:
+        float: Elapsed seconds
+    """
+    from rclpy.serialization import deserialize_message
+    from geometry_msgs.msg import PoseStamped
+
+    out = io.StringIO()
+    start = time.perf_counter()
+    for data, timestamp in zip(messages, timestamps):
+        msg = deserialize_message(data, PoseStamped)
+        pos = msg.pose.position
+        ori = msg.pose.orientation
+        timestamp_seconds = timestamp / 1e9
+        out.write(
+            f'{timestamp_seconds:.4f} {pos.x:.4f} {pos.y:.4f} {pos.z:.4f} '
+            f'{ori.x:.4f} {ori.y:.4f} {ori.z:.4f} {ori.w:.4f}\n'
+        )
+    return time.perf_counter() - start
+
+def run_batched_path(messages, timestamps, write: bool) -> float:
+    """
+    Time batched NumPy decoding, optionally including TUM formatting.
+
+    Returns:
+        float: Elapsed seconds
+    """
+    out = io.StringIO()
+    start = time.perf_counter()
+    for i in range(0, len(messages), POSE_BATCH_SIZE):
+        poses, _ = decode_pose_stamped_batch(messages[i:i + POSE_BATCH_SIZE])
+        if write:
+            seconds = np.asarray(timestamps[i:i + POSE_BATCH_SIZE], dtype=np.int64) / 1e9
+            np.savetxt(out, np.column_stack([seconds, poses]), fmt='%.4f')
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200_000)
+    args = parser.parse_args()
+
+    messages, timestamps = make_messages(args.messages)
+    results = {"messages": args.messages}
+    results["numpy_decode_s"] = run_batched_path(messages, timestamps, write=False)
+    results["numpy_decode_write_s"] = run_batched_path(messages, timestamps, write=True)
+    try:
+        results["rclpy_decode_write_s"] = run_rclpy_path(messages, timestamps)
+    except ImportError:
+        results["rclpy_decode_write_s"] = None
+
+    for key in [k for k in results if k.endswith('_s') and results[k]]:
+        results[key.replace('_s', '_msgs_per_s')] = args.messages / results[key]
+    print(json.dumps(results, indent=4))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Benchmark every pipeline stage on deterministic synthetic data.
+
+Generates a synthetic PoseStamped bag and trajectory pair of the requested
+length, rate, noise and drift, times each stage (best of --repeat runs) and
+writes the results as JSON. With --baseline the results are compared with a
+stored run and the exit status is 1 if any stage got slower than the
+tolerance allows.
+
+Stages: bag_reading, pose_decoding, pose_writing, tum_loading, association,
+alignment, metrics, plotting, bag_processor, evo_analyser and end_to_end.
+
+Usage:
+    python3 -m benchmarks.suite [--duration S] [--rate HZ] [--output results.json]
+    python3 -m benchmarks.suite --baseline benchmarks/baseline.json [--tolerance 0.25]
+    python3 -m benchmarks.suite --output benchmarks/baseline.json   # store a new baseline
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+from src.utils.config import Config
+from src.utils.synthetic import make_trajectory, perturb_trajectory, write_synthetic_bag, write_tum_trajectory
+
+STAGES = ('bag_reading', 'pose_decoding', 'pose_writing', 'tum_loading', 'association', 'alignment',
+          'metrics', 'plotting', 'bag_processor', 'evo_analyser', 'end_to_end')
+
+def best_time(fn, repeat: int) -> float:
+    """
+    Smallest wall time of repeated calls, which is the least noisy estimate.
+
+    Args:
+        fn: Callable to time
+        repeat (int): Number of calls
+
+    Returns:
+        float: Seconds of the fastest call
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+@contextmanager
+def benchmark_config():
+    """
+    Run the pipeline without caching or plotting and with virtual segments,
+    so repeats do the same work and plotting is measured on its own.
+    """
+    config = Config().config
+    saved = {
+        'mode': config['output']['segments']['mode'],
+        'plots': config['output']['plots']['mode'],
+        'online': config['analysis'].get('online'),
+    }
+    config['output']['segments']['mode'] = 'virtual'
+    config['output']['plots']['mode'] = 'none'
+    config['analysis']['online'] = dict(config['analysis'].get('online') or {}, enabled=False)
+    try:
+        yield
+    finally:
+        config['output']['segments']['mode'] = saved['mode']
+        config['output']['plots']['mode'] = saved['plots']
+        config['analysis']['online'] = saved['online']
+
+def run_suite(duration: float, rate: float, noise: float, drift: float, segment_duration: int,
+              repeat: int, stages: tuple = STAGES, work_dir: Path = None) -> dict:
+    """
+    Time the selected stages.
+
+    Args:
+        duration (float): Length of the synthetic recording in seconds
+        rate (float): Pose rate of both topics in Hz
+        noise (float): Position noise of the estimate in metres
+        drift (float): Position drift of the estimate in metres per second
+        segment_duration (int): Segment length for the pipeline stages
+        repeat (int): Timed runs per stage; the fastest is reported
+        stages (tuple): Names of the stages to run
+        work_dir (Path, optional): Directory for generated files. Defaults to a temporary one.
+
+    Returns:
+        dict: {"meta": parameters and environment, "stages": {name: {"seconds",
+               "items", "items_per_s"}}}
+    """
+    from evo.tools import file_interface
+    from src.bag_processor.bag_processor import BagProcessor
+    from src.bag_processor.bag_reader import SqliteBagReader
+    from src.evo_analyser.alignment import align_positions
+    from src.evo_analyser.association import associate
+    from src.evo_analyser.evo_analyser import EvoAnalyser
+    from src.evo_analyser.metric_engine import compute_errors
+    from src.evo_analyser.parallel import analyze_segments
+    from src.evo_analyser.plot_renderer import make_plot_job, render_plots
+    from src.utils.extract_poses import PoseFile
+    from src.utils.pose_decoder import decode_pose_stamped_batch
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(work_dir or tmp)
+        bag = write_synthetic_bag(work_dir / "bench.db3", duration=duration, pose_rate=rate,
+                                  noise=noise, drift=drift)
+        reference = make_trajectory(duration, rate)
+        estimate = perturb_trajectory(reference, noise=noise, drift=drift, time_offset=0.001)
+        poses = len(reference)
+        results = {}
+
+        def record(name, seconds, items):
+            results[name] = {"seconds": seconds, "items": items, "items_per_s": items / seconds}
+
+        reader = SqliteBagReader(bag)
+        messages = [message for batch in reader.read_batches() for message in batch]
+        if 'bag_reading' in stages:
+            record('bag_reading', best_time(lambda: sum(len(b) for b in reader.read_batches()), repeat),
+                   len(messages))
+        reader.close()
+
+        payloads = [data for _, data, _ in messages]
+        if 'pose_decoding' in stages:
+            record('pose_decoding', best_time(lambda: decode_pose_stamped_batch(payloads), repeat),
+                   len(payloads))
+
+        def write_poses():
+            pose_file = PoseFile(work_dir / "poses.npy")
+            for _, data, timestamp in messages:
+                pose_file.append(data, timestamp)
+            pose_file.close()
+        if 'pose_writing' in stages:
+            record('pose_writing', best_time(write_poses, repeat), len(messages))
+
+        # TUM text is the fallback format of EvoAnalyser._load_trajectory
+        if 'tum_loading' in stages:
+            tum_path = write_tum_trajectory(work_dir / "estimate.txt", estimate)
+            record('tum_loading', best_time(
+                lambda: file_interface.read_tum_trajectory_file(str(tum_path)), repeat), poses)
+
+        if 'association' in stages:
+            record('association', best_time(
+                lambda: associate(reference[:, 0], estimate[:, 0], 0.01), repeat), poses)
+
+        ref_ids, est_ids = associate(reference[:, 0], estimate[:, 0], 0.01)
+        ref, est = reference[ref_ids], estimate[est_ids]
+        if 'alignment' in stages:
+            record('alignment', best_time(lambda: align_positions(est[:, 1:4], ref[:, 1:4]), repeat),
+                   len(ref))
+
+        transform = align_positions(est[:, 1:4], ref[:, 1:4])
+        aligned = est.copy()
+        aligned[:, 1:4] = transform.apply_positions(est[:, 1:4])
+        ref_wxyz, est_wxyz = ref[:, [7, 4, 5, 6]], est[:, [7, 4, 5, 6]]
+
+        def metrics():
+            return compute_errors(ref[:, 1:4], ref_wxyz, est[:, 1:4], est_wxyz, aligned[:, 1:4],
+                                  transform.apply_orientations(est_wxyz)).statistics()
+        if 'metrics' in stages:
+            record('metrics', best_time(metrics, repeat), len(ref))
+
+        if 'plotting' in stages:
+            errors = compute_errors(ref[:, 1:4], ref_wxyz, est[:, 1:4], est_wxyz, aligned[:, 1:4])
+            stats = errors.statistics()
+            job = make_plot_job("bench", work_dir / "plots", ref, est, aligned, errors.ape_trans,
+                                errors.rpe_trans, stats["ape_trans"], stats["rpe_trans"],
+                                Config().get('output', 'plots', 'max_points'))
+            record('plotting', best_time(lambda: render_plots(job), repeat), len(ref))
+
+        with benchmark_config():
+            output_dir = work_dir / "output"
+            if 'bag_processor' in stages:
+                record('bag_processor', best_time(
+                    lambda: BagProcessor(bag, output_dir).process_bag(segment_duration), repeat),
+                    len(messages))
+            segment_paths = BagProcessor(bag, output_dir).process_bag(segment_duration)
+            if 'evo_analyser' in stages:
+                analyser = EvoAnalyser(output_dir)
+                record('evo_analyser', best_time(
+                    lambda: [analyser.analyze_segment(path) for path in segment_paths], repeat), poses)
+
+            def end_to_end():
+                paths = BagProcessor(bag, output_dir).process_bag(segment_duration)
+                return analyze_segments(output_dir, paths, workers=1)
+            if 'end_to_end' in stages:
+                record('end_to_end', best_time(end_to_end, repeat), len(messages))
+
+    return {
+        "meta": {
+            "duration": duration, "rate": rate, "noise": noise, "drift": drift,
+            "segment_duration": segment_duration, "repeat": repeat, "poses": poses,
+            "python": platform.python_version(), "numpy": np.__version__,
+            "machine": platform.machine(), "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        "stages": results,
+    }
+
+def compare(results: dict, baseline: dict, tolerance: float) -> dict:
+    """
+    Compare stage timings against a baseline run.
+
+    Args:
+        results (dict): Output of run_suite
+        baseline (dict): Stored output of run_suite
+        tolerance (float): Allowed relative slowdown, e.g. 0.25 for 25 %
+
+    Returns:
+        dict: {"regressions", "improvements", "unchanged"} lists of
+              {"stage", "baseline_s", "current_s", "ratio"}; stages missing
+              from either run are skipped
+    """
+    report = {"regressions": [], "improvements": [], "unchanged": []}
+    for stage, current in results["stages"].items():
+        if stage not in baseline.get("stages", {}):
+            continue
+        before = baseline["stages"][stage]["seconds"]
+        ratio = current["seconds"] / before
+        entry = {"stage": stage, "baseline_s": before, "current_s": current["seconds"], "ratio": ratio}
+        if ratio > 1 + tolerance:
+            report["regressions"].append(entry)
+        elif ratio < 1 / (1 + tolerance):
+            report["improvements"].append(entry)
+        else:
+            report["unchanged"].append(entry)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=600.0, help="Recording length in seconds")
+    parser.add_argument("--rate", type=float, default=50.0, help="Pose rate in Hz")
+    parser.add_argument("--noise", type=float, default=0.05, help="Estimate position noise in metres")
+    parser.add_argument("--drift", type=float, default=0.001, help="Estimate drift in metres per second")
+    parser.add_argument("--segment-duration", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--output", type=Path, help="Write the results JSON here")
+    parser.add_argument("--baseline", type=Path, help="Compare against this results JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative slowdown before a stage counts as a regression")
+    args = parser.parse_args()
+
+    results = run_suite(args.duration, args.rate, args.noise, args.drift, args.segment_duration,
+                        args.repeat, tuple(args.stages))
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        sizes = ("duration", "rate", "segment_duration")
+        if any(baseline["meta"].get(key) != results["meta"][key] for key in sizes):
+            print(f"Warning: baseline was measured with different {', '.join(sizes)}", file=sys.stderr)
+        results["comparison"] = compare(results, baseline, args.tolerance)
+
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+    print(json.dumps(results, indent=4))
+
+    if results.get("comparison", {}).get("regressions"):
+        for entry in results["comparison"]["regressions"]:
+            print(f"Regression in {entry['stage']}: {entry['baseline_s']:.4f}s -> "
+                  f"{entry['current_s']:.4f}s ({entry['ratio']:.2f}x)", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
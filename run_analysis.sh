@@ -2,4 +2,4 @@
 
 # Build and run inside Docker container
 docker-compose build
-docker-compose run opteran_analyser python3 /workspace/scripts/analyse_localisation.py
+docker-compose run opteran_analyser python3 -m src.cli run
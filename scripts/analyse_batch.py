@@ -0,0 +1,82 @@
+import argparse
+import time
+from pathlib import Path
+from src.batch_runner.batch_runner import BatchRunner, discover_bags
+from src.utils.config import Config
+from src.utils.logging_config import setup_logging
+from src.utils.performance import export_prometheus
+
+def parse_args():
+    """
+    Parse command line options for batch analysis.
+
+    Returns:
+        Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Analyse many bags into per-bag output directories")
+    parser.add_argument(
+        "inputs", nargs="+",
+        help="Bag files, rosbag2 directories, directories to search or glob patterns (quote globs)"
+    )
+    parser.add_argument(
+        "--output-root", type=Path,
+        help="Directory receiving one output directory per bag (default data/output/batch)"
+    )
+    parser.add_argument(
+        "--workers", type=int,
+        default=Config().get('analysis', 'workers', default=1),
+        help="Total worker budget shared by the bags (default from config)"
+    )
+    parser.add_argument(
+        "--segment-duration", type=int,
+        default=Config().get('analysis', 'segment_duration', default=60),
+        help="Segment duration in seconds (default from config)"
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="Analyse bags again even if their outputs are complete"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Recompute every segment instead of reusing cached results"
+    )
+    return parser.parse_args()
+
+def main():
+    """
+    Analyse every bag found in the inputs and write a fleet summary.
+
+    Each bag gets <output root>/<parent>_<bag name>/ with the same layout as a
+    single-bag run, plus run_complete.json once its analysis finished. Bags
+    with a complete output are skipped unless --force is given, and
+    fleet_summary.json in the output root merges the results of all bags.
+    """
+    args = parse_args()
+    logger = setup_logging()
+    started_at = time.time()
+    script_dir = Path(__file__).parent.parent
+    output_root = args.output_root or script_dir / "data" / "output" / "batch"
+
+    bags = discover_bags(args.inputs)
+    logger.info(f"Found {len(bags)} bags")
+    if not bags:
+        return
+
+    cache_dir = None
+    if Config().get('cache', 'enabled', default=False) and not args.no_cache:
+        cache_dir = str(script_dir / Config().get('cache', 'dir', default='data/cache'))
+
+    results_db = None
+    if Config().get('results_store', 'enabled', default=False):
+        results_db = str(script_dir / Config().get('results_store', 'path', default='data/results.sqlite'))
+
+    runner = BatchRunner(output_root, args.workers, args.segment_duration, cache_dir, args.force,
+                         results_db)
+    summary = runner.run(bags)
+    totals = summary["totals"]
+    logger.info(f"Batch complete: {totals['analysed']} analysed, {totals['skipped']} skipped, "
+                f"{totals['failed']} failed. Fleet summary in {output_root}")
+    export_prometheus(started_at)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import argparse
+from pathlib import Path
+from src.live.live_evaluator import LiveEvaluator
+from src.live.sinks import open_sink
+from src.live.sources import FakePosePublisher, Ros2PoseSource, bag_messages, synthetic_messages
+from src.utils.config import Config
+from src.utils.logging_config import setup_logging
+
+def parse_args():
+    """
+    Parse command line options for live evaluation.
+
+    Returns:
+        Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Sliding-window ATE/RPE of live pose topics")
+    parser.add_argument(
+        "--source", choices=["ros2", "bag", "synthetic"], default="ros2",
+        help="Subscribe to ROS2 topics, or replay a bag or a synthetic trajectory without ROS2"
+    )
+    parser.add_argument("--bag", type=Path, help="Bag replayed with --source bag")
+    parser.add_argument(
+        "--speed", type=float, default=1.0,
+        help="Replay speed relative to real time for bag and synthetic sources, 0 for unpaced"
+    )
+    parser.add_argument(
+        "--duration", type=float,
+        help="Stop after this many seconds (default: until the source ends or Ctrl-C)"
+    )
+    parser.add_argument(
+        "--output", action="append",
+        help="Metrics file or udp://host:port; may be repeated (default from config)"
+    )
+    parser.add_argument("--window", type=float, help="Window length in seconds (default from config)")
+    parser.add_argument("--rate", type=float, help="Evaluations per second (default from config)")
+    return parser.parse_args()
+
+def main():
+    """
+    Evaluate the estimated pose topic against the reference while it runs.
+
+    Results are appended as JSON lines to the configured metrics file or sent
+    as UDP datagrams. The bag and synthetic sources replay messages in place
+    of a ROS2 graph, so the mode can be tried without a robot.
+    """
+    args = parse_args()
+    logger = setup_logging()
+    script_dir = Path(__file__).parent.parent
+
+    targets = args.output or [Config().get('live', 'output', default='data/output/live_metrics.jsonl')]
+    sinks = [open_sink(t if t.startswith('udp://') else str(script_dir / t)) for t in targets]
+
+    speed = args.speed or None
+    if args.source == "bag":
+        source = FakePosePublisher(bag_messages(args.bag), speed)
+    elif args.source == "synthetic":
+        source = FakePosePublisher(synthetic_messages(
+            Config().get('topics', 'estimated'), Config().get('topics', 'reference'),
+            duration=args.duration or 60.0
+        ), speed)
+    else:
+        source = Ros2PoseSource()
+
+    evaluator = LiveEvaluator(sinks, window_duration=args.window, rate=args.rate)
+    logger.info(f"Live evaluation from {args.source} source, writing to {', '.join(targets)}")
+    try:
+        evaluator.run(source, args.duration)
+    except KeyboardInterrupt:
+        logger.info("Interrupted")
+    finally:
+        for sink in sinks:
+            sink.close()
+    logger.info(f"Published {evaluator.evaluations} window results")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import argparse
+from pathlib import Path
+from src.bag_processor.segment_manifest import materialize_segment
+from src.utils.logging_config import setup_logging
+
+def main():
+    """
+    Write physical bags for virtual segments on request.
+    
+    Reads each segment's manifest.json and copies its time range from the
+    source bag into segment_X/bag/, optionally limited to the pose topics.
+    """
+    parser = argparse.ArgumentParser(description="Materialize virtual segments as bags")
+    parser.add_argument("segments", nargs="+", type=Path, help="Segment directories")
+    parser.add_argument("--pose-only", action="store_true", help="Copy only the pose topics")
+    args = parser.parse_args()
+    
+    logger = setup_logging()
+    for segment_path in args.segments:
+        bag_uri = materialize_segment(segment_path, pose_only=args.pose_only)
+        logger.info(f"Wrote {bag_uri}")
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,72 @@
 # Copyright 2024
 # Author: Usamah Zaheer
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import rosbag2_py # Because it uses the efficient SequentialReader and SequentialWriter plus more...
 import logging
+import time
+from src.utils.config import Config
 from src.utils.prepare_directories import prepare_directories
 from src.utils.extract_poses import write_pose_message, open_pose_files, close_pose_files
+from src.utils.pose_store import DEFAULT_CHUNK_POSES, budget_chunk_poses
+from src.bag_processor.segment import SegmentData
+from src.bag_processor.segment_quality import SegmentQuality
+from src.bag_processor.segment_manifest import write_manifest
+from src.bag_processor.bag_reader import DEFAULT_BATCH_SIZE, open_bag_reader
+from src.evo_analyser.association import DEFAULT_MAX_ASSOCIATION_DIFF
+from src.evo_analyser.online_metrics import OnlineEvaluator, save_online_metrics
+from src.utils.performance import emit, span, timed_batches
+
+# Time shards per ingestion worker, so uneven shards still balance out
+SHARDS_PER_WORKER = 2
 
 class BagProcessor:
     """
     A class to process ROS2 bag files and extract pose data into segments.
     
+    Segments are fixed time windows of segment_duration seconds aligned to
+    the first message read; segment_N covers window N.
+    
+    With a memory budget, decoded poses are spilled to scratch files instead
+    of being kept in memory until their segment closes, so memory use stays
+    bounded however long the segments are.
+    
     Attributes:
         bag_path (Path): Path to the input ROS2 bag file
         output_dir (Path): Directory where processed segments will be stored
         logger (Logger): Logger for general messages
         perf_logger (Logger): Logger for performance-related messages
+        config (Config): Configuration instance
         storage_options_base (dict): Base storage options for ROS2 bag
-        converter_options (ConverterOptions): Options for ROS2 bag conversion
+        memory_budget_mb (float): Memory budget in MiB, None to keep poses in memory
     """
 
-    def __init__(self, bag_path: str, output_dir: str):
+    def __init__(self, bag_path: str, output_dir: str, memory_budget_mb: float = None):
         self.bag_path = Path(bag_path)
         self.output_dir = Path(output_dir)
         self.logger = logging.getLogger(__name__)
         self.perf_logger = logging.getLogger('performance')
+        self.config = Config()
+        self.memory_budget_mb = (memory_budget_mb if memory_budget_mb is not None
+                                 else self.config.get('memory', 'budget_mb'))
         
         self.logger.info(f"Initializing BagProcessor with bag: {bag_path}")
         self.logger.info(f"Output directory set to: {output_dir}")
         
         self.storage_options_base = {
-            'storage_id': 'sqlite3'
+            'storage_id': self.config.get('ros2', 'storage', 'id', default='sqlite3')
         }
-        self.converter_options = rosbag2_py.ConverterOptions(
-            input_serialization_format='cdr',
-            output_serialization_format='cdr'
-        )
 
-    def process_bag(self, segment_duration: int = 60) -> list:
+    def process_bag(self, segment_duration: int = 60, workers: int = 1) -> list:
         """
         Process the ROS2 bag file and split it into time-based segments.
         
+        With more than one worker the bag's time range is split into shards
+        of whole segments, each ingested by its own process and reader. The
+        resulting segments and validation match the serial path.
+        
         Args:
             segment_duration (int): Duration of each segment in seconds. Defaults to 60.
+            workers (int): Number of ingestion processes. Defaults to 1.
             
         Returns:
             list: List of Path objects pointing to valid segment directories
@@ -49,103 +74,355 @@ class BagProcessor:
         Raises:
             Various exceptions related to bag reading/writing operations
         """
+        if workers > 1:
+            return self._process_bag_sharded(segment_duration, workers)
+        return [segment.path for segment in self.iter_segments(segment_duration, write_artifacts=True)]
+    
+    def iter_segments(self, segment_duration: int = 60, write_artifacts: bool = None):
+        """
+        Read the bag once and yield each valid segment as soon as it closes.
+        
+        Segment N is yielded before any message of segment N+1 beyond the first
+        is read, so a consumer can analyse it while reading continues.
+        
+        Args:
+            segment_duration (int): Duration of each segment in seconds. Defaults to 60.
+            write_artifacts (bool): Write segment bags and pose stores to disk.
+                Defaults to output.write_segment_artifacts from the config.
+                Segment bags are only written in 'physical' output.segments.mode;
+                every segment also gets a manifest.json over the source bag.
+                
+        Yields:
+            SegmentData: Closed segment with its pose arrays held in memory
+            
+        Raises:
+            Various exceptions related to bag reading/writing operations
+        """
+        if write_artifacts is None:
+            write_artifacts = self.config.get('output', 'write_segment_artifacts', default=True)
         prepare_directories(self.output_dir)  # Initial setup
         
-        storage_options = rosbag2_py.StorageOptions(
-            uri=str(self.bag_path),
-            **self.storage_options_base
-        )
+        reader = self._open_reader()
+        try:
+            yield from self._iter_window_segments(reader, segment_duration, write_artifacts)
+        finally:
+            reader.close()
+    
+    def ingest_shard(self, segment_duration: int, origin: int, start_time: int, end_time: int) -> list:
+        """
+        Ingest the segments of one time shard into an already prepared output directory.
         
-        reader = rosbag2_py.SequentialReader()
-        reader.open(storage_options, self.converter_options)
+        Args:
+            segment_duration (int): Duration of each segment in seconds
+            origin (int): Timestamp in nanoseconds that segment windows are aligned to
+            start_time (int): Shard start in nanoseconds (inclusive), on a segment boundary
+            end_time (int): Shard end in nanoseconds (exclusive), on a segment boundary
+            
+        Returns:
+            list: Paths of the valid segments in the shard
+        """
+        reader = self._open_reader()
+        try:
+            return [
+                segment.path for segment in self._iter_window_segments(
+                    reader, segment_duration, True, origin, start_time, end_time)
+            ]
+        finally:
+            reader.close()
+    
+    def _process_bag_sharded(self, segment_duration: int, workers: int) -> list:
+        """
+        Ingest the bag with one process per time shard.
+        
+        Args:
+            segment_duration (int): Duration of each segment in seconds
+            workers (int): Number of ingestion processes
+            
+        Returns:
+            list: Paths of the valid segments in segment order
+        """
+        prepare_directories(self.output_dir)  # Initial setup
+        
+        reader = self._open_reader()
+        try:
+            read_topics = self._plan_topics(reader, write_artifacts=True)[3]
+            origin, last = reader.time_bounds(read_topics)
+        finally:
+            reader.close()
+        if origin is None:
+            return []
         
+        # Shards are runs of whole segment windows, a few per worker for load balancing
+        duration_ns = int(segment_duration * 1e9)
+        window_count = (last - origin) // duration_ns + 1
+        shard_count = min(window_count, workers * SHARDS_PER_WORKER)
+        bounds = [window_count * i // shard_count for i in range(shard_count + 1)]
+        self.logger.info(f"Ingesting {window_count} segments in {shard_count} shards with {workers} workers")
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_ingest_shard, str(self.bag_path), str(self.output_dir), segment_duration,
+                                origin, origin + lo * duration_ns, origin + hi * duration_ns,
+                                self.memory_budget_mb)
+                for lo, hi in zip(bounds[:-1], bounds[1:])
+            ]
+            return [path for future in futures for path in future.result()]
+    
+    def _open_reader(self):
+        batch_size = self.config.get('ros2', 'reader', 'batch_size', default=DEFAULT_BATCH_SIZE)
+        if self.memory_budget_mb is not None:
+            # Fetched messages count against the budget too
+            batch_size = min(batch_size, self._spill_settings()[1])
+        with span('bag_open', bag=self.bag_path.name):
+            return open_bag_reader(self.bag_path, self.storage_options_base['storage_id'], batch_size)
+    
+    def _plan_topics(self, reader, write_artifacts: bool) -> tuple:
+        """
+        Decide which topics are decoded, copied into segment bags and read.
+        
+        Args:
+            reader: Bag reader from open_bag_reader
+            write_artifacts (bool): Whether segment artefacts are written
+            
+        Returns:
+            tuple: (pose topic names, {topic: type} for all topics,
+                    {topic: type} copied into segment bags, topics to read or None for all)
+        """
         topic_types = reader.get_all_topics_and_types()
         
         pose_topics = [
             topic.name for topic in topic_types 
             if topic.type == 'geometry_msgs/msg/PoseStamped'
         ]
+        all_topics = {topic.name: topic.type for topic in topic_types}
         
+        # Topics copied into physical segment bags; virtual segments copy nothing
+        segments_mode = self.config.get('output', 'segments', 'mode', default='physical')
+        if write_artifacts and segments_mode == 'physical':
+            if self.config.get('output', 'segments', 'bag_topics', default='all') == 'pose':
+                bag_topics = {topic: all_topics[topic] for topic in pose_topics}
+            else:
+                bag_topics = all_topics
+        else:
+            bag_topics = {}
+        
+        # Skip reading messages that are neither decoded nor copied
+        read_topics = pose_topics if set(bag_topics) <= set(pose_topics) else None
+        return pose_topics, all_topics, bag_topics, read_topics
+    
+    def _iter_window_segments(self, reader, segment_duration: int, write_artifacts: bool,
+                              origin: int = None, start_time: int = None, end_time: int = None):
+        """
+        Split the messages read into segment windows and yield the valid segments.
+        
+        Args:
+            reader: Bag reader from open_bag_reader
+            segment_duration (int): Duration of each segment in seconds
+            write_artifacts (bool): Write segment bags and pose stores to disk
+            origin (int, optional): Window alignment in nanoseconds. Defaults to
+                the first message read.
+            start_time (int, optional): Read from this timestamp in nanoseconds
+            end_time (int, optional): Stop reading at this timestamp in nanoseconds
+            
+        Yields:
+            SegmentData: Closed segment with its pose arrays held in memory
+        """
+        pose_topics, all_topics, bag_topics, read_topics = self._plan_topics(reader, write_artifacts)
+        
+        duration_ns = int(segment_duration * 1e9)
+        segment_index = None
         segment_start_time = None
-        segment_paths = []
+        segment_path = None
+        segment_quality = None
+        segment_opened = None
         current_segment_poses = {}
         current_segment = None
         
-        topic_last_timestamp = {topic: None for topic in pose_topics}
+        write_tum = self.config.get('output', 'poses', 'write_tum', default=False)
+        dropout_gap = self.config.get('analysis', 'quality', 'dropout_gap', default=0.5)
+        online = self._create_online_evaluator()
+        flush_interval_ns = int(self.config.get('analysis', 'online', 'flush_interval', default=1.0) * 1e9)
+        next_flush = None
+        spill_dir, chunk_poses = self._spill_settings()
         
-        while reader.has_next():
-            topic_name, data, timestamp = reader.read_next()
-            
-            current_segment_end = (segment_start_time or 0) + segment_duration * 1e9
-            if segment_start_time is None or timestamp >= current_segment_end:
-                if current_segment_poses:
-                    close_pose_files(current_segment_poses)
-                
-                segment_start_time = current_segment_end if segment_start_time is not None else timestamp
-                segment_path, current_segment = self._create_new_segment(len(segment_paths))
-                segment_paths.append(segment_path)
+        batches = reader.read_batches(topics=read_topics, start_time=start_time, end_time=end_time)
+        for batch in timed_batches(batches, 'read', bag=self.bag_path.name):
+            for topic_name, data, timestamp in batch:
+                if origin is None:
+                    origin = timestamp
+                window = (timestamp - origin) // duration_ns
+                if window != segment_index:
+                    if current_segment_poses:
+                        segment = self._close_segment(segment_index, segment_path, segment_start_time,
+                                                      segment_start_time + duration_ns, segment_quality,
+                                                      current_segment_poses, online, segment_opened)
+                        if segment is not None:
+                            yield segment
+                            # Free the poses, e.g. spilled scratch files, once the consumer has
+                            del segment
+                    
+                    segment_opened = time.perf_counter()
+                    segment_index = window
+                    segment_start_time = origin + window * duration_ns
+                    segment_path, current_segment = self._create_new_segment(segment_index, bag_topics)
+                    write_manifest(segment_path, self.bag_path, self.storage_options_base['storage_id'],
+                                   segment_start_time, segment_start_time + duration_ns,
+                                   all_topics, pose_topics)
+                    
+                    # Per-topic statistics are filled in while the pose batches are decoded
+                    segment_quality = SegmentQuality(
+                        segment_path.name, segment_start_time / 1e9,
+                        (segment_start_time + duration_ns) / 1e9,
+                        pose_topics, dropout_gap
+                    )
+                    current_segment_poses = open_pose_files(segment_path, pose_topics, write_tum,
+                                                            write_store=write_artifacts,
+                                                            quality=segment_quality, online=online,
+                                                            spill_dir=spill_dir, chunk_poses=chunk_poses)
+                    next_flush = segment_start_time + flush_interval_ns
                 
-                current_segment_poses = open_pose_files(segment_path, pose_topics)
+                # Decode all topics up to the same time so the online evaluator's buffers stay short
+                if online is not None and timestamp >= next_flush:
+                    for pose_file in current_segment_poses.values():
+                        pose_file.flush()
+                    next_flush = timestamp + flush_interval_ns
                 
-                for topic in pose_topics:
-                    topic_metadata = rosbag2_py.TopicMetadata(
-                        name=topic,
-                        type='geometry_msgs/msg/PoseStamped',
-                        serialization_format='cdr'
-                    )
-                    current_segment.create_topic(topic_metadata)
-            
-            write_pose_message(
-                topic_name, data, timestamp,
-                current_segment, current_segment_poses
-            )
-            
-            if topic_name in pose_topics:
-                topic_last_timestamp[topic_name] = timestamp
+                write_pose_message(
+                    topic_name, data, timestamp,
+                    current_segment if topic_name in bag_topics else None,
+                    current_segment_poses
+                )
         
         if current_segment_poses:
-            close_pose_files(current_segment_poses)
+            segment = self._close_segment(segment_index, segment_path, segment_start_time,
+                                          segment_start_time + duration_ns,
+                                          segment_quality, current_segment_poses, online,
+                                          segment_opened)
+            if segment is not None:
+                yield segment
+    
+    def _spill_settings(self) -> tuple:
+        """
+        Where decoded poses are spilled and in what chunks, under the memory budget.
         
-        valid_segments = []
-        for segment_path in segment_paths:
-            pose_files = list((segment_path / "poses").glob('*.txt'))
-            if len(pose_files) < 2:
-                continue
-            
-            pose_counts = []
-            for pose_file in pose_files:
-                with open(pose_file, 'r') as f:
-                    pose_counts.append(sum(1 for _ in f))
-            
-            max_diff = max(pose_counts) - min(pose_counts)
-            if max_diff > 500:
-                self.logger.warning(
-                    f"Skipping segment {segment_path.name}: Pose count difference too large "
-                    f"(max: {max(pose_counts)}, min: {min(pose_counts)})"
-                )
-                continue
+        Returns:
+            tuple: (scratch directory or None to keep poses in memory, rows per chunk)
+        """
+        if self.memory_budget_mb is None:
+            return None, DEFAULT_CHUNK_POSES
+        scratch_dir = self.config.get('memory', 'scratch_dir') or self.output_dir / '.scratch'
+        return Path(scratch_dir), budget_chunk_poses(self.memory_budget_mb)
+    
+    def _create_online_evaluator(self):
+        """
+        Create the evaluator computing ATE/RPE while reading, if enabled.
+        
+        Returns:
+            OnlineEvaluator: Evaluator of the configured topics, or None
+        """
+        if not self.config.get('analysis', 'online', 'enabled', default=False):
+            return None
+        return OnlineEvaluator(
+            self.config.get('topics', 'estimated', default='/casestudy/predicted_pose'),
+            self.config.get('topics', 'reference', default='/casestudy/reference_pose'),
+            self.config.get('analysis', 'trajectory', 'max_association_diff', default=DEFAULT_MAX_ASSOCIATION_DIFF),
+            self.config.get('analysis', 'online', 'buffer_duration', default=5.0)
+        )
+    
+    def _close_segment(self, segment_index: int, segment_path: Path, start_time: float,
+                       end_time: float, quality: SegmentQuality, pose_files: dict,
+                       online: OnlineEvaluator = None, opened_at: float = None):
+        """
+        Close a segment's pose writers and apply the validity gate.
+        
+        The gate uses the statistics gathered while reading, and the result
+        is written to the segment's metrics/quality.json. Streaming metrics
+        are written to metrics/online_metrics.json.
+        
+        Args:
+            segment_index (int): Index number for the segment
+            segment_path (Path): Segment directory
+            start_time (float): Segment start in nanoseconds
+            end_time (float): Segment end in nanoseconds
+            quality (SegmentQuality): Statistics collected for the segment
+            pose_files (dict): Open PoseFile writers of the segment
+            online (OnlineEvaluator, optional): Evaluator fed by the pose writers
+            opened_at (float, optional): time.perf_counter() when the segment was
+                opened, for the segment's ingestion latency span
             
-            valid_segments.append(segment_path)
-        return valid_segments
+        Returns:
+            SegmentData: The closed segment, or None if it failed validation
+        """
+        poses = close_pose_files(pose_files)
+        online_metrics = None
+        if online is not None:
+            online_metrics = online.close_segment(segment_path.name)
+            save_online_metrics(segment_path, online_metrics)
+            self.logger.info(f"Online metrics for {segment_path.name}: "
+                             f"ATE RMSE {online_metrics['ate_rmse']:.3f} m (unaligned), "
+                             f"{online_metrics['aligned_ate_rmse']:.3f} m (aligned)")
+        with span('validation', segment=segment_path.name):
+            quality.evaluate(
+                self.config.get('analysis', 'trajectory', 'max_pose_count_diff', default=500),
+                self.config.get('analysis', 'quality', 'max_gap')
+            )
+            quality.save(segment_path)
+        if opened_at is not None:
+            emit('segment_ingest', time.perf_counter() - opened_at,
+                 sum(len(p) for p in poses.values()), segment=segment_path.name)
+        if not quality.valid:
+            self.logger.warning(f"Skipping segment {segment_path.name}: {'; '.join(quality.reasons)}")
+            return None
+        
+        return SegmentData(segment_index, segment_path, int(start_time), int(end_time),
+                           poses, quality.to_dict(), online_metrics)
     
-    def _create_new_segment(self, segment_index: int) -> tuple:
+    def _create_new_segment(self, segment_index: int, bag_topics: dict) -> tuple:
         """
         Create a new bag segment with necessary directory structure.
         
         Args:
             segment_index (int): Index number for the segment
+            bag_topics (dict): Topic name mapped to message type for the topics
+                copied into the segment bag. Empty to skip writing a bag.
             
         Returns:
-            tuple: (Path to segment directory, SequentialWriter instance)
+            tuple: (Path to segment directory, SequentialWriter instance or None)
         """
         segment_dir = prepare_directories(self.output_dir, segment_index)
+        if not bag_topics:
+            return segment_dir, None
+        
+        # Only needed for physical segment bags
+        import rosbag2_py
         
         storage_options = rosbag2_py.StorageOptions(
             uri=str(segment_dir / 'bag' / str('segment_' + str(segment_index))),
             **self.storage_options_base
         )
+        converter_options = rosbag2_py.ConverterOptions(
+            input_serialization_format='cdr',
+            output_serialization_format='cdr'
+        )
         
         writer = rosbag2_py.SequentialWriter()
-        writer.open(storage_options, self.converter_options)
+        writer.open(storage_options, converter_options)
         
-        return segment_dir, writer
\ No newline at end of file
+        for topic, topic_type in bag_topics.items():
+            writer.create_topic(rosbag2_py.TopicMetadata(
+                name=topic,
+                type=topic_type,
+                serialization_format='cdr'
+            ))
+        
+        return segment_dir, writer
+
+def _ingest_shard(bag_path: str, output_dir: str, segment_duration: int, origin: int,
+                  start_time: int, end_time: int, memory_budget_mb: float = None) -> list:
+    """
+    Process pool entry point ingesting one time shard with its own reader.
+    
+    Returns:
+        list: Paths of the valid segments in the shard
+    """
+    return BagProcessor(bag_path, output_dir, memory_budget_mb).ingest_shard(segment_duration, origin, start_time, end_time)
@@ -0,0 +1,244 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+from collections import namedtuple
+from pathlib import Path
+import logging
+import re
+import sqlite3
+import yaml
+
+TopicInfo = namedtuple('TopicInfo', ['name', 'type', 'serialization_format'])
+
+# Rows fetched from SQLite per round trip
+DEFAULT_BATCH_SIZE = 10000
+
+def split_files(bag_dir: Path) -> list:
+    """
+    The .db3 split files of a rosbag2 directory in recording order.
+    
+    The order comes from relative_file_paths in metadata.yaml. Without
+    metadata the files are sorted by their numeric split index, so bag_10.db3
+    follows bag_9.db3 rather than bag_1.db3.
+    
+    Args:
+        bag_dir (Path): rosbag2 bag directory
+    
+    Returns:
+        list: Paths of the split files
+    """
+    bag_dir = Path(bag_dir)
+    metadata_path = bag_dir / 'metadata.yaml'
+    if metadata_path.exists():
+        with open(metadata_path) as f:
+            info = (yaml.safe_load(f) or {}).get('rosbag2_bagfile_information', {})
+        paths = [bag_dir / Path(name).name for name in info.get('relative_file_paths') or []]
+        paths = [path for path in paths if path.suffix == '.db3' and path.exists()]
+        if paths:
+            return paths
+    
+    def split_index(path):
+        match = re.search(r'_(\d+)$', path.stem)
+        return (int(match.group(1)) if match else -1, path.name)
+    return sorted(bag_dir.glob('*.db3'), key=split_index)
+
+class SqliteBagReader:
+    """
+    Bulk reader for rosbag2 sqlite3 storage that queries the .db3 files directly.
+    
+    Topic and time predicates are pushed into the SQL query so unwanted
+    messages are never loaded, and rows are fetched in large batches with
+    fetchmany instead of one read_next() call per message.
+    
+    Attributes:
+        db_paths (list): .db3 files of the bag in playback order
+        batch_size (int): Rows fetched per batch
+    """
+
+    def __init__(self, bag_path: str, batch_size: int = DEFAULT_BATCH_SIZE):
+        bag_path = Path(bag_path)
+        self.db_paths = split_files(bag_path) if bag_path.is_dir() else [bag_path]
+        if not self.db_paths:
+            raise FileNotFoundError(f"No .db3 files found in {bag_path}")
+        self.batch_size = batch_size
+        self.logger = logging.getLogger(__name__)
+        self._connections = [
+            sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) for db_path in self.db_paths
+        ]
+
+    def get_all_topics_and_types(self) -> list:
+        """
+        List the topics stored in the bag.
+        
+        Returns:
+            list: TopicInfo tuples with name, type and serialization_format
+        """
+        topics = {}
+        for conn in self._connections:
+            for name, msg_type, fmt in conn.execute(
+                    "SELECT name, type, serialization_format FROM topics ORDER BY id"):
+                topics.setdefault(name, TopicInfo(name, msg_type, fmt))
+        return list(topics.values())
+
+    def time_bounds(self, topics: list = None) -> tuple:
+        """
+        First and last message timestamps, optionally restricted to topics.
+        
+        Args:
+            topics (list, optional): Topic names to consider
+        
+        Returns:
+            tuple: (start, end) in nanoseconds, or (None, None) for an empty bag
+        """
+        starts, ends = [], []
+        for conn in self._connections:
+            where, params = self._topic_predicate(conn, topics)
+            start, end = conn.execute(
+                f"SELECT MIN(timestamp), MAX(timestamp) FROM messages{where}", params).fetchone()
+            if start is not None:
+                starts.append(start)
+                ends.append(end)
+        if not starts:
+            return None, None
+        return min(starts), max(ends)
+
+    def read_batches(self, topics: list = None, start_time: int = None, end_time: int = None):
+        """
+        Stream messages in timestamp order as batches of raw rows.
+        
+        Args:
+            topics (list, optional): Topic names to read. Defaults to all topics
+            start_time (int, optional): Inclusive lower bound in nanoseconds
+            end_time (int, optional): Exclusive upper bound in nanoseconds
+        
+        Yields:
+            list: Up to batch_size (topic name, serialized data, timestamp) tuples
+        """
+        for conn in self._connections:
+            topic_names = dict(conn.execute("SELECT id, name FROM topics"))
+            where, params = self._topic_predicate(conn, topics)
+            clauses = [where[len(" WHERE "):]] if where else []
+            if start_time is not None:
+                clauses.append("timestamp >= ?")
+                params.append(int(start_time))
+            if end_time is not None:
+                clauses.append("timestamp < ?")
+                params.append(int(end_time))
+            query = "SELECT topic_id, data, timestamp FROM messages"
+            if clauses:
+                query += " WHERE " + " AND ".join(clauses)
+            cursor = conn.execute(query + " ORDER BY timestamp, id", params)
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                yield [(topic_names[topic_id], data, timestamp) for topic_id, data, timestamp in rows]
+
+    def close(self):
+        for conn in self._connections:
+            conn.close()
+        self._connections = []
+
+    @staticmethod
+    def _topic_predicate(conn, topics: list) -> tuple:
+        """
+        Build a topic_id IN (...) predicate for the given topic names.
+        
+        Returns:
+            tuple: (" WHERE ..." clause or empty string, list of parameters)
+        """
+        if topics is None:
+            return "", []
+        names = set(topics)
+        ids = [
+            topic_id for topic_id, name in conn.execute("SELECT id, name FROM topics")
+            if name in names
+        ]
+        if not ids:
+            return " WHERE 0", []
+        return f" WHERE topic_id IN ({', '.join('?' * len(ids))})", ids
+
+class SequentialBagReader:
+    """
+    rosbag2_py.SequentialReader behind the SqliteBagReader interface.
+    
+    Used for storage plugins other than sqlite3 (e.g. mcap).
+    
+    Attributes:
+        batch_size (int): Messages grouped per yielded batch
+    """
+
+    def __init__(self, bag_path: str, storage_id: str, batch_size: int = DEFAULT_BATCH_SIZE):
+        import rosbag2_py
+
+        self._rosbag2_py = rosbag2_py
+        self.batch_size = batch_size
+        self._reader = rosbag2_py.SequentialReader()
+        self._reader.open(
+            rosbag2_py.StorageOptions(uri=str(bag_path), storage_id=storage_id),
+            rosbag2_py.ConverterOptions(input_serialization_format='cdr',
+                                        output_serialization_format='cdr')
+        )
+
+    def get_all_topics_and_types(self) -> list:
+        return [
+            TopicInfo(topic.name, topic.type, topic.serialization_format)
+            for topic in self._reader.get_all_topics_and_types()
+        ]
+
+    def time_bounds(self, topics: list = None) -> tuple:
+        """
+        Bag start and end from the bag metadata.
+        
+        The metadata covers all topics. When topics are given the start is the
+        first message on those topics; the end stays the bag end.
+        """
+        metadata = self._reader.get_metadata()
+        # pybind11 maps the chrono types to datetime/timedelta
+        start = int(round(metadata.starting_time.timestamp() * 1e9))
+        duration = int(round(metadata.duration.total_seconds() * 1e9))
+        end = start + duration
+        if topics is not None:
+            self._reader.set_filter(self._rosbag2_py.StorageFilter(topics=list(topics)))
+            if not self._reader.has_next():
+                return None, None
+            start = self._reader.read_next()[2]
+            self._reader.reset_filter()
+            self._reader.seek(0)
+        return start, end
+
+    def read_batches(self, topics: list = None, start_time: int = None, end_time: int = None):
+        if topics is not None:
+            self._reader.set_filter(self._rosbag2_py.StorageFilter(topics=list(topics)))
+        if start_time is not None:
+            self._reader.seek(int(start_time))
+        batch = []
+        while self._reader.has_next():
+            topic_name, data, timestamp = self._reader.read_next()
+            if end_time is not None and timestamp >= end_time:
+                break
+            batch.append((topic_name, data, timestamp))
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def close(self):
+        self._reader = None
+
+def open_bag_reader(bag_path: str, storage_id: str = 'sqlite3',
+                    batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Open the fastest available reader for a bag.
+    
+    Args:
+        bag_path (str): Bag directory or .db3 file
+        storage_id (str): rosbag2 storage plugin id
+        batch_size (int): Messages per yielded batch
+    
+    Returns:
+        SqliteBagReader for sqlite3 storage, SequentialBagReader otherwise
+    """
+    if storage_id == 'sqlite3':
+        return SqliteBagReader(bag_path, batch_size)
+    return SequentialBagReader(bag_path, storage_id, batch_size)
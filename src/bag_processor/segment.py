@@ -0,0 +1,30 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+from dataclasses import dataclass, field
+from pathlib import Path
+
+@dataclass
+class SegmentData:
+    """
+    Poses of one closed segment, as yielded by BagProcessor.iter_segments.
+    
+    Attributes:
+        index (int): Segment index within the bag
+        path (Path): Segment directory for metrics, plots and artefacts
+        start_time (int): Segment start in nanoseconds since epoch
+        end_time (int): Segment end (exclusive) in nanoseconds since epoch
+        poses (dict): Topic name mapped to an Nx8 pose array in TUM column order
+        quality (dict): Per-topic statistics, as written to metrics/quality.json
+        online_metrics (dict): ATE/RPE computed while reading, or None if disabled
+    """
+    index: int
+    path: Path
+    start_time: int
+    end_time: int
+    poses: dict = field(default_factory=dict)
+    quality: dict = None
+    online_metrics: dict = None
+
+    @property
+    def name(self) -> str:
+        return self.path.name
@@ -0,0 +1,130 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+import json
+import logging
+from pathlib import Path
+
+MANIFEST_FILENAME = 'manifest.json'
+
+def write_manifest(segment_path: Path, source_bag: Path, storage_id: str, start_time: int,
+                   end_time: int, topics: dict, pose_topics: list) -> Path:
+    """
+    Describe a segment as a time range over the source bag.
+    
+    Args:
+        segment_path (Path): Segment directory
+        source_bag (Path): Path of the original bag
+        storage_id (str): rosbag2 storage plugin of the source bag
+        start_time (int): Segment start in nanoseconds (inclusive)
+        end_time (int): Segment end in nanoseconds (exclusive)
+        topics (dict): Topic name mapped to message type for all topics in the bag
+        pose_topics (list): Names of the PoseStamped topics
+    
+    Returns:
+        Path: Path of the written manifest
+    """
+    manifest = {
+        "segment_id": Path(segment_path).name,
+        "source_bag": str(Path(source_bag).resolve()),
+        "storage_id": storage_id,
+        "start_time": int(start_time),
+        "end_time": int(end_time),
+        "topics": topics,
+        "pose_topics": list(pose_topics),
+    }
+    manifest_path = Path(segment_path) / MANIFEST_FILENAME
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=4)
+    return manifest_path
+
+def load_manifest(segment_path: Path) -> dict:
+    """
+    Read a segment manifest.
+    
+    Args:
+        segment_path (Path): Segment directory or path to its manifest.json
+    
+    Returns:
+        dict: Manifest contents
+    
+    Raises:
+        FileNotFoundError: If the segment has no manifest
+    """
+    manifest_path = Path(segment_path)
+    if manifest_path.is_dir():
+        manifest_path = manifest_path / MANIFEST_FILENAME
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def read_segment_messages(manifest: dict, topics: list = None):
+    """
+    Read the messages of a virtual segment from its source bag.
+    
+    Only the requested topics are read, starting from a seek to the segment
+    start, and reading stops at the segment end.
+    
+    Args:
+        manifest (dict): Segment manifest from load_manifest
+        topics (list, optional): Topics to read. Defaults to all manifest topics
+    
+    Yields:
+        tuple: (topic name, serialized data, timestamp in nanoseconds)
+    """
+    import rosbag2_py
+
+    reader = rosbag2_py.SequentialReader()
+    reader.open(
+        rosbag2_py.StorageOptions(uri=manifest["source_bag"], storage_id=manifest["storage_id"]),
+        rosbag2_py.ConverterOptions(input_serialization_format='cdr',
+                                    output_serialization_format='cdr')
+    )
+    reader.set_filter(rosbag2_py.StorageFilter(topics=list(topics or manifest["topics"])))
+    reader.seek(manifest["start_time"])
+
+    while reader.has_next():
+        topic_name, data, timestamp = reader.read_next()
+        if timestamp >= manifest["end_time"]:
+            break
+        if timestamp >= manifest["start_time"]:
+            yield topic_name, data, timestamp
+
+def materialize_segment(segment_path: Path, pose_only: bool = False) -> Path:
+    """
+    Write a physical bag for a virtual segment.
+    
+    Args:
+        segment_path (Path): Segment directory containing manifest.json
+        pose_only (bool): Copy only the pose topics. Defaults to False.
+    
+    Returns:
+        Path: URI of the written segment bag
+    """
+    import rosbag2_py
+
+    logger = logging.getLogger(__name__)
+    segment_path = Path(segment_path)
+    manifest = load_manifest(segment_path)
+    topics = manifest["pose_topics"] if pose_only else list(manifest["topics"])
+
+    bag_uri = segment_path / 'bag' / manifest["segment_id"]
+    bag_uri.parent.mkdir(parents=True, exist_ok=True)
+    writer = rosbag2_py.SequentialWriter()
+    writer.open(
+        rosbag2_py.StorageOptions(uri=str(bag_uri), storage_id=manifest["storage_id"]),
+        rosbag2_py.ConverterOptions(input_serialization_format='cdr',
+                                    output_serialization_format='cdr')
+    )
+    for topic in topics:
+        writer.create_topic(rosbag2_py.TopicMetadata(
+            name=topic,
+            type=manifest["topics"][topic],
+            serialization_format='cdr'
+        ))
+
+    message_count = 0
+    for topic_name, data, timestamp in read_segment_messages(manifest, topics):
+        writer.write(topic_name, data, timestamp)
+        message_count += 1
+
+    logger.info(f"Materialized {manifest['segment_id']} with {message_count} messages to {bag_uri}")
+    return bag_uri
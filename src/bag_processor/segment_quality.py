@@ -0,0 +1,169 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+import json
+from pathlib import Path
+import numpy as np
+
+QUALITY_FILENAME = 'quality.json'
+
+class TopicStats:
+    """
+    Running message statistics for one pose topic within a segment.
+    
+    Timestamps can be fed in any number of sorted batches; gaps spanning
+    two batches are still accounted for.
+    
+    Attributes:
+        dropout_gap (float): Gap in seconds above which an interval is a dropout
+        count (int): Number of messages seen
+        first_time (float): First timestamp in seconds, None if no messages
+        last_time (float): Last timestamp in seconds, None if no messages
+        max_gap (float): Largest interval between consecutive messages in seconds
+        dropouts (list): [start, end] pairs of intervals longer than dropout_gap
+    """
+
+    def __init__(self, dropout_gap: float):
+        self.dropout_gap = dropout_gap
+        self.count = 0
+        self.first_time = None
+        self.last_time = None
+        self.max_gap = 0.0
+        self.dropouts = []
+
+    def update(self, timestamps: np.ndarray):
+        """
+        Add a batch of message timestamps.
+        
+        Args:
+            timestamps (np.ndarray): Sorted timestamps in seconds
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        batch_count = timestamps.size
+        if batch_count == 0:
+            return
+        if self.last_time is not None:
+            timestamps = np.concatenate([[self.last_time], timestamps])
+        else:
+            self.first_time = float(timestamps[0])
+        gaps = np.diff(timestamps)
+        if gaps.size:
+            self.max_gap = max(self.max_gap, float(gaps.max()))
+            for i in np.flatnonzero(gaps > self.dropout_gap):
+                self.dropouts.append([float(timestamps[i]), float(timestamps[i + 1])])
+        self.count += batch_count
+        self.last_time = float(timestamps[-1])
+
+    @property
+    def message_rate(self) -> float:
+        """
+        Average message rate in Hz over the observed span.
+        """
+        if self.count < 2 or self.last_time <= self.first_time:
+            return 0.0
+        return (self.count - 1) / (self.last_time - self.first_time)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "first_time": self.first_time,
+            "last_time": self.last_time,
+            "message_rate": self.message_rate,
+            "max_gap": self.max_gap,
+            "dropouts": self.dropouts,
+        }
+
+class SegmentQuality:
+    """
+    Per-topic statistics of a segment and the validity gate derived from them.
+    
+    Attributes:
+        segment_id (str): Segment name, e.g. segment_0
+        start_time (float): Segment start in seconds
+        end_time (float): Segment end in seconds
+        topics (dict): Topic name mapped to TopicStats
+        valid (bool): Result of the last evaluate() call
+        reasons (list): Why the segment was rejected, empty if valid
+    """
+
+    def __init__(self, segment_id: str, start_time: float, end_time: float,
+                 pose_topics: list, dropout_gap: float):
+        self.segment_id = segment_id
+        self.start_time = start_time
+        self.end_time = end_time
+        self.topics = {topic: TopicStats(dropout_gap) for topic in pose_topics}
+        self.valid = True
+        self.reasons = []
+
+    def update(self, topic: str, timestamps: np.ndarray):
+        """
+        Add a batch of timestamps (seconds) for a pose topic.
+        """
+        self.topics[topic].update(timestamps)
+
+    def evaluate(self, max_pose_count_diff: int, max_gap: float = None) -> bool:
+        """
+        Apply the validity gate to the collected statistics.
+        
+        Args:
+            max_pose_count_diff (int): Largest allowed difference in pose counts between topics
+            max_gap (float, optional): Largest allowed gap in seconds on any topic
+        
+        Returns:
+            bool: True if the segment should be analysed
+        """
+        self.reasons = []
+        counts = [stats.count for stats in self.topics.values()]
+        if len(counts) < 2:
+            self.reasons.append(f"Need at least 2 pose topics, found {len(counts)}")
+        elif max(counts) - min(counts) > max_pose_count_diff:
+            self.reasons.append(
+                f"Pose count difference too large (max: {max(counts)}, min: {min(counts)})"
+            )
+        if max_gap is not None:
+            for topic, stats in self.topics.items():
+                if stats.max_gap > max_gap:
+                    self.reasons.append(f"Gap of {stats.max_gap:.3f}s on {topic}")
+        self.valid = not self.reasons
+        return self.valid
+
+    def to_dict(self) -> dict:
+        return {
+            "segment_id": self.segment_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "valid": self.valid,
+            "reasons": self.reasons,
+            "topics": {topic: stats.to_dict() for topic, stats in self.topics.items()},
+        }
+
+    def save(self, segment_path: Path) -> Path:
+        """
+        Write the statistics to metrics/quality.json inside the segment.
+        
+        Args:
+            segment_path (Path): Segment directory
+        
+        Returns:
+            Path: Path of the written file
+        """
+        quality_path = Path(segment_path) / 'metrics' / QUALITY_FILENAME
+        quality_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(quality_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4)
+        return quality_path
+
+def load_quality(segment_path: Path) -> dict:
+    """
+    Read a segment's quality report if one was written.
+    
+    Args:
+        segment_path (Path): Segment directory
+    
+    Returns:
+        dict: Quality report, or None if the segment has none
+    """
+    quality_path = Path(segment_path) / 'metrics' / QUALITY_FILENAME
+    if not quality_path.exists():
+        return None
+    with open(quality_path) as f:
+        return json.load(f)
@@ -0,0 +1,285 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from pathlib import Path
+import json
+import logging
+import os
+import time
+import numpy as np
+from src.utils.config import Config
+
+COMPLETE_FILENAME = 'run_complete.json'
+SUMMARY_FILENAME = 'analysis_summary.json'
+FLEET_SUMMARY_FILENAME = 'fleet_summary.json'
+
+def discover_bags(inputs: list) -> list:
+    """
+    Find the bags named by directories, glob patterns or paths.
+
+    A directory holding a metadata.yaml is one rosbag2 bag; other directories
+    are searched recursively for bag directories and loose .db3 files.
+
+    Args:
+        inputs (list): Directories, glob patterns or bag paths
+
+    Returns:
+        list: Sorted unique bag paths (.db3 files or rosbag2 directories)
+    """
+    bags = set()
+    for item in inputs:
+        paths = [Path(p) for p in sorted(glob(str(item), recursive=True))] or [Path(item)]
+        for path in paths:
+            if path.is_dir() and not (path / 'metadata.yaml').exists():
+                candidates = path.rglob('*.db3')
+            else:
+                candidates = [path]
+            for candidate in candidates:
+                if candidate.suffix == '.db3' and (candidate.parent / 'metadata.yaml').exists():
+                    candidate = candidate.parent
+                if candidate.exists():
+                    bags.add(candidate.resolve())
+    return sorted(bags)
+
+def bag_output_dir(output_root: Path, bag_path: Path) -> Path:
+    """
+    Output directory of a bag: the bag's name, prefixed with its parent
+    directory so nightly bags with the same file name do not collide.
+    """
+    bag_path = Path(bag_path)
+    name = bag_path.stem if bag_path.suffix == '.db3' else bag_path.name
+    return Path(output_root) / f"{bag_path.parent.name}_{name}"
+
+def bag_fingerprint(bag_path: Path) -> dict:
+    """
+    Size and modification time of the bag's storage files, to detect changed bags.
+    """
+    bag_path = Path(bag_path)
+    files = sorted(bag_path.glob('*.db3')) if bag_path.is_dir() else [bag_path]
+    stats = [f.stat() for f in files]
+    return {
+        "size": sum(s.st_size for s in stats),
+        "mtime_ns": max((s.st_mtime_ns for s in stats), default=0),
+    }
+
+def run_settings(segment_duration: int) -> dict:
+    """
+    Settings a completed bag's results depend on.
+    """
+    from src.evo_analyser.evo_analyser import ANALYSER_VERSION
+    return {
+        "segment_duration": segment_duration,
+        "analyser_version": ANALYSER_VERSION,
+        "trajectory": Config().get('analysis', 'trajectory', default={}),
+        "rpe": Config().get('analysis', 'rpe', default={}),
+    }
+
+def load_completed(output_dir: Path, bag_path: Path, settings: dict) -> dict:
+    """
+    Summary of a previous complete run of the same bag with the same settings.
+
+    Returns:
+        dict: The bag's summary entry, or None if the bag must be analysed
+    """
+    try:
+        with open(Path(output_dir) / COMPLETE_FILENAME) as f:
+            marker = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if marker.get("fingerprint") != bag_fingerprint(bag_path) or marker.get("settings") != settings:
+        return None
+    return marker["summary"]
+
+def analyse_bag(bag_path: str, output_dir: str, settings: dict, workers: int = 1,
+                cache_dir: str = None, results_db: str = None) -> dict:
+    """
+    Ingest and analyse one bag into its own output directory.
+
+    A run_complete.json marker is written last, so an interrupted bag is
+    analysed again by the next batch run. Errors are reported in the
+    returned entry instead of raised, so one bad bag does not stop a batch.
+
+    Args:
+        bag_path (str): Bag .db3 file or rosbag2 directory
+        output_dir (str): Output directory of the bag
+        settings (dict): Result of run_settings
+        workers (int): Processes used for ingestion and for analysis of this bag
+        cache_dir (str, optional): Result cache directory
+        results_db (str, optional): ResultsStore database receiving the run
+
+    Returns:
+        dict: Summary entry of the bag
+    """
+    from src.bag_processor.bag_processor import BagProcessor
+    from src.evo_analyser.parallel import analyze_segments
+    from src.results_store.results_store import ResultsStore
+
+    logger = logging.getLogger(__name__)
+    output_dir = Path(output_dir)
+    started = time.perf_counter()
+    started_at = time.time()
+    try:
+        (output_dir / COMPLETE_FILENAME).unlink(missing_ok=True)
+        fingerprint = bag_fingerprint(bag_path)
+        segment_paths = BagProcessor(bag_path, output_dir).process_bag(
+            segment_duration=settings["segment_duration"], workers=workers)
+        all_metrics, failures = analyze_segments(output_dir, segment_paths, workers, cache_dir=cache_dir)
+        with open(output_dir / SUMMARY_FILENAME, 'w') as f:
+            json.dump(all_metrics, f, indent=4)
+        if results_db is not None:
+            ResultsStore(results_db).record_run(bag_path, settings, all_metrics, failures,
+                                                output_dir, started_at)
+    except Exception as e:
+        logger.error(f"Analysis of bag {bag_path} failed: {type(e).__name__}: {e}")
+        return {"bag": str(bag_path), "output_dir": str(output_dir), "status": "failed",
+                "error": f"{type(e).__name__}: {e}", "elapsed_s": time.perf_counter() - started}
+
+    summary = summarise_bag(bag_path, output_dir, all_metrics, failures)
+    summary["elapsed_s"] = time.perf_counter() - started
+    marker_path = output_dir / COMPLETE_FILENAME
+    with open(marker_path.with_suffix('.tmp'), 'w') as f:
+        json.dump({"fingerprint": fingerprint, "settings": settings, "summary": summary}, f, indent=4)
+    os.replace(marker_path.with_suffix('.tmp'), marker_path)
+    logger.info(f"Analysed bag {bag_path}: {summary['segments']} segments in {summary['elapsed_s']:.1f}s")
+    return summary
+
+def summarise_bag(bag_path: Path, output_dir: Path, all_metrics: list, failures: list) -> dict:
+    """
+    Condense a bag's segment metrics into one fleet summary entry.
+
+    RMSE values are combined as the duration-weighted root mean square of the
+    segment RMSEs, which equals the RMSE over the bag for evenly sampled poses.
+
+    Returns:
+        dict: Bag path, status, segment counts, totals and error aggregates
+    """
+    durations = np.array([m["duration"] for m in all_metrics], dtype=np.float64)
+
+    def pooled_rmse(key):
+        values = np.array([m[key] for m in all_metrics], dtype=np.float64)
+        return float(np.sqrt(np.sum(values ** 2 * durations) / durations.sum())) if durations.sum() > 0 else None
+
+    return {
+        "bag": str(bag_path),
+        "output_dir": str(output_dir),
+        "status": "analysed",
+        "segments": len(all_metrics),
+        "failed_segments": len(failures),
+        "duration": float(durations.sum()),
+        "trajectory_length": float(sum(m["trajectory_length"] for m in all_metrics)),
+        "ate_rmse": pooled_rmse("ate_rmse"),
+        "ate_max": max((m["ate_max"] for m in all_metrics), default=None),
+        "rpe_rmse": pooled_rmse("rpe_rmse"),
+        "scale_drift_max": max((m["scale_drift"] for m in all_metrics), default=None),
+    }
+
+def fleet_summary(entries: list) -> dict:
+    """
+    Merge per-bag summary entries into fleet totals and error distributions.
+
+    Args:
+        entries (list): Entries from analyse_bag or load_completed
+
+    Returns:
+        dict: {"bags": entries, "totals": counts and sums, "ate_rmse": distribution over bags}
+    """
+    done = [e for e in entries if e["status"] != "failed"]
+    ate = [(e["ate_rmse"], e["bag"]) for e in done if e.get("ate_rmse") is not None]
+    values = np.array([value for value, _ in ate])
+    summary = {
+        "bags": entries,
+        "totals": {
+            "bags": len(entries),
+            "analysed": sum(e["status"] == "analysed" for e in entries),
+            "skipped": sum(e["status"] == "skipped" for e in entries),
+            "failed": sum(e["status"] == "failed" for e in entries),
+            "segments": sum(e["segments"] for e in done),
+            "failed_segments": sum(e["failed_segments"] for e in done),
+            "duration": sum(e["duration"] for e in done),
+            "trajectory_length": sum(e["trajectory_length"] for e in done),
+        },
+        "ate_rmse": None,
+    }
+    if ate:
+        summary["ate_rmse"] = {
+            "mean": float(values.mean()),
+            "median": float(np.median(values)),
+            "p95": float(np.percentile(values, 95)),
+            "max": float(values.max()),
+            "worst_bag": max(ate)[1],
+        }
+    return summary
+
+class BatchRunner:
+    """
+    Ingests and analyses many bags within one worker budget.
+
+    Bags are analysed concurrently, one process per bag, with up to
+    `workers` bags at once. When there are fewer bags than workers, the
+    spare workers are split between the bags for their own ingestion and
+    analysis pools, so the process count stays around the budget. Bags
+    with a complete output for the same bag file and settings are skipped.
+
+    Attributes:
+        output_root (Path): Directory holding one output directory per bag
+        workers (int): Total worker budget
+        segment_duration (int): Segment duration in seconds
+        cache_dir (str): Result cache directory, None to disable caching
+        force (bool): Analyse complete bags again
+        results_db (str): ResultsStore database receiving each run, None to skip
+    """
+
+    def __init__(self, output_root: str, workers: int = 1, segment_duration: int = 60,
+                 cache_dir: str = None, force: bool = False, results_db: str = None):
+        self.output_root = Path(output_root)
+        self.workers = max(1, workers)
+        self.segment_duration = segment_duration
+        self.cache_dir = cache_dir
+        self.force = force
+        self.results_db = results_db
+        self.logger = logging.getLogger(__name__)
+
+    def run(self, bags: list) -> dict:
+        """
+        Analyse the bags and write the fleet summary.
+
+        Args:
+            bags (list): Bag paths, e.g. from discover_bags
+
+        Returns:
+            dict: Fleet summary, also written to fleet_summary.json in output_root
+        """
+        self.output_root.mkdir(parents=True, exist_ok=True)
+        settings = run_settings(self.segment_duration)
+        entries = {}
+        pending = []
+        for bag in bags:
+            output_dir = bag_output_dir(self.output_root, bag)
+            completed = None if self.force else load_completed(output_dir, bag, settings)
+            if completed is not None:
+                self.logger.info(f"Skipping complete bag {bag}")
+                entries[str(bag)] = dict(completed, status="skipped")
+            else:
+                pending.append((bag, output_dir))
+
+        concurrent = min(self.workers, len(pending))
+        if pending:
+            per_bag = max(1, self.workers // concurrent)
+            self.logger.info(f"Analysing {len(pending)} bags, {concurrent} at a time "
+                             f"with {per_bag} worker(s) each ({len(entries)} skipped)")
+            if concurrent <= 1:
+                results = [analyse_bag(str(bag), str(out), settings, per_bag, self.cache_dir,
+                                       self.results_db) for bag, out in pending]
+            else:
+                with ProcessPoolExecutor(max_workers=concurrent) as executor:
+                    futures = [executor.submit(analyse_bag, str(bag), str(out), settings,
+                                               per_bag, self.cache_dir, self.results_db)
+                               for bag, out in pending]
+                    results = [future.result() for future in futures]
+            entries.update((result["bag"], result) for result in results)
+
+        summary = fleet_summary([entries[str(bag)] for bag in bags])
+        with open(self.output_root / FLEET_SUMMARY_FILENAME, 'w') as f:
+            json.dump(summary, f, indent=4)
+        return summary
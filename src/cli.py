@@ -0,0 +1,422 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+"""
+Command line interface of the trajectory analyser.
+
+Usage:
+    python3 -m src.cli ingest    [--bag BAG] [--output-dir DIR] [--segment-duration S] [--workers N]
+    python3 -m src.cli analyse   [--output-dir DIR] [--workers N] [--no-cache]
+    python3 -m src.cli run       [--bag BAG] [--output-dir DIR] [--workers N] [--stream]
+    python3 -m src.cli summarise [--output-dir DIR] [--segments] [--json]
+    python3 -m src.cli plot      [--output-dir DIR] [segment_X ...]
+    python3 -m src.cli multiscale [--output-dir DIR] [--windows 10 30 60] [--overlap 0.5]
+    python3 -m src.cli rpe       [--output-dir DIR] [--distance-deltas 100 200] [--time-deltas 10]
+    python3 -m src.cli run-metrics [--output-dir DIR] [--memory-budget MB]
+
+Only the standard library and the config are imported at startup. Each
+command imports what it needs when it runs, so summarise never loads numpy,
+evo, matplotlib or rosbag2_py, and ingest never loads matplotlib.
+"""
+from pathlib import Path
+import argparse
+import json
+import logging
+import math
+import sys
+import time
+from src.utils.config import Config
+from src.utils.prepare_directories import segment_dirs
+
+ROOT_DIR = Path(__file__).parent.parent
+DEFAULT_BAG = ROOT_DIR / "data" / "input" / "casestudy_data_0.db3"
+DEFAULT_OUTPUT_DIR = ROOT_DIR / "data" / "output"
+SUMMARY_FILENAME = "analysis_summary.json"
+RPE_DELTAS_FILENAME = "rpe_deltas.json"
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Build the argument parser with one subparser per command.
+
+    Returns:
+        ArgumentParser: Parser whose result carries the command's handler
+    """
+    parser = argparse.ArgumentParser(prog="trajectory-analyzer",
+                                     description="Localisation analysis of ROS2 pose bags")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_command(name, handler, help_text, bag=False, workers=False, analysis=False, memory=False):
+        sub = subparsers.add_parser(name, help=help_text, description=help_text)
+        sub.set_defaults(handler=handler)
+        sub.add_argument("--output-dir", type=Path, default=DEFAULT_OUTPUT_DIR,
+                         help="Directory holding the segments and summary (default data/output)")
+        if name != "summarise":
+            sub.add_argument("--log-dir", default="logs", help="Directory receiving the log file")
+        if bag:
+            sub.add_argument("--bag", type=Path, default=DEFAULT_BAG,
+                             help="Bag file or rosbag2 directory (default data/input/casestudy_data_0.db3)")
+            sub.add_argument("--segment-duration", type=int,
+                             default=Config().get('analysis', 'segment_duration', default=60),
+                             help="Segment duration in seconds (default from config)")
+            sub.add_argument("--ingest-workers", type=int,
+                             default=Config().get('analysis', 'ingest_workers', default=1),
+                             help="Processes splitting the bag into segments (default from config)")
+        if bag or memory:
+            sub.add_argument("--memory-budget", type=float, default=Config().get('memory', 'budget_mb'),
+                             help="Process poses out of core in chunks of this many MiB (default from config)")
+        if workers:
+            sub.add_argument("--workers", type=int, default=Config().get('analysis', 'workers', default=1),
+                             help="Processes analysing segments (default from config)")
+        if analysis:
+            sub.add_argument("--no-cache", action="store_true",
+                             help="Recompute every segment instead of reusing cached results")
+        return sub
+
+    add_command("ingest", cmd_ingest, "Split a bag into segments with their pose stores", bag=True)
+    add_command("analyse", cmd_analyse, "Analyse the segments of an output directory",
+                workers=True, analysis=True)
+    run = add_command("run", cmd_run, "Ingest a bag and analyse its segments",
+                      bag=True, workers=True, analysis=True)
+    run.add_argument("--stream", action="store_true",
+                     help="Analyse each segment in memory as soon as it is read from the bag, "
+                          "reading it in a single process")
+    summarise = add_command("summarise", cmd_summarise, "Print the totals of an analysis summary")
+    summarise.add_argument("--segments", action="store_true", help="Also print one line per segment")
+    summarise.add_argument("--json", action="store_true", help="Print the totals as JSON")
+    plot = add_command("plot", cmd_plot, "Render the plots of analysed segments")
+    plot.add_argument("segments", nargs="*", help="Segment names, e.g. segment_3 (default all)")
+    multiscale = add_command("multiscale", cmd_multiscale,
+                             "Evaluate overlapping windows of several lengths over the whole run")
+    multiscale.add_argument("--windows", type=float, nargs="+",
+                            default=Config().get('analysis', 'multiscale', 'windows', default=[10, 30, 60]),
+                            help="Window lengths in seconds (default from config)")
+    multiscale.add_argument("--overlap", type=float,
+                            default=Config().get('analysis', 'multiscale', 'overlap', default=0.5),
+                            help="Fraction of a window shared with the next one (default from config)")
+    multiscale.add_argument("--metric",
+                            default=Config().get('analysis', 'multiscale', 'heatmap_metric', default='ate_rmse'),
+                            help="Window metric drawn in the heatmap (default from config)")
+    rpe = add_command("rpe", cmd_rpe, "Evaluate RPE over distance and time deltas on the whole run")
+    rpe.add_argument("--distance-deltas", type=float, nargs="*",
+                     default=Config().get('analysis', 'rpe', 'distance_deltas', default=[]),
+                     help="Deltas in metres of reference path length (default from config)")
+    rpe.add_argument("--time-deltas", type=float, nargs="*",
+                     default=Config().get('analysis', 'rpe', 'time_deltas', default=[]),
+                     help="Deltas in seconds (default from config)")
+    rpe.add_argument("--stride", type=int, default=Config().get('analysis', 'rpe', 'stride', default=1),
+                     help="Every Nth pose starts a pair (default from config)")
+    add_command("run-metrics", cmd_run_metrics,
+                "Evaluate the whole run across segment boundaries within a memory budget", memory=True)
+    return parser
+
+def main(argv: list = None) -> int:
+    """
+    Parse the command line and run the chosen command.
+
+    Args:
+        argv (list, optional): Arguments without the program name. Defaults to sys.argv[1:].
+
+    Returns:
+        int: Exit status
+    """
+    args = build_parser().parse_args(argv)
+    if args.command != "summarise":
+        from src.utils.logging_config import setup_logging
+        setup_logging(log_dir=args.log_dir)
+    return args.handler(args) or 0
+
+def cmd_ingest(args) -> int:
+    """
+    Split the bag into segments without analysing them.
+    """
+    from src.bag_processor.bag_processor import BagProcessor
+
+    logger = logging.getLogger(__name__)
+    logger.info(f"Ingesting {args.bag} into {args.output_dir}")
+    segment_paths = BagProcessor(args.bag, args.output_dir, args.memory_budget).process_bag(
+        segment_duration=args.segment_duration, workers=args.ingest_workers)
+    logger.info(f"Wrote {len(segment_paths)} valid segments to {args.output_dir}")
+    return 0
+
+def cmd_analyse(args) -> int:
+    """
+    Analyse the valid segments already ingested into the output directory.
+    """
+    from src.bag_processor.segment_manifest import load_manifest
+    from src.bag_processor.segment_quality import load_quality
+    from src.evo_analyser.parallel import analyze_segments
+
+    logger = logging.getLogger(__name__)
+    started_at = time.time()
+    segment_paths = [path for path in segment_dirs(args.output_dir)
+                     if (load_quality(path) or {"valid": True})["valid"]]
+    if not segment_paths:
+        logger.error(f"No valid segments in {args.output_dir}; run the ingest command first")
+        return 1
+
+    plot_renderer = _plot_renderer()
+    logger.info(f"Analyzing {len(segment_paths)} segments with {args.workers} worker(s)...")
+    all_metrics, failures = analyze_segments(args.output_dir, segment_paths, args.workers,
+                                             plot_renderer=plot_renderer, cache_dir=_cache_dir(args))
+    manifest = load_manifest(segment_paths[0])
+    segment_duration = round((manifest["end_time"] - manifest["start_time"]) / 1e9)
+    _finish_run(args.output_dir, manifest["source_bag"], segment_duration, all_metrics, failures,
+                plot_renderer, started_at)
+    return 0
+
+def cmd_run(args) -> int:
+    """
+    Ingest the bag and analyse its segments, optionally in one streamed pass.
+    """
+    from src.bag_processor.bag_processor import BagProcessor
+    from src.evo_analyser.parallel import analyze_segments, analyze_stream
+
+    logger = logging.getLogger(__name__)
+    logger.info("Starting localisation analysis pipeline")
+    started_at = time.time()
+    logger.info(f"Using bag file: {args.bag}")
+    processor = BagProcessor(args.bag, args.output_dir, args.memory_budget)
+    cache_dir = _cache_dir(args)
+
+    # Plots are rendered by their own process pool while analysis continues
+    plot_renderer = _plot_renderer()
+    if args.stream:
+        # Single pass: segments go straight from the reader to the analysers
+        if args.ingest_workers > 1:
+            logger.warning(f"--stream reads the bag in a single process; ignoring "
+                           f"--ingest-workers {args.ingest_workers}")
+        logger.info(f"Streaming segments to {args.workers} analysis worker(s)...")
+        all_metrics, failures = analyze_stream(
+            args.output_dir, processor.iter_segments(args.segment_duration), args.workers,
+            plot_renderer=plot_renderer, cache_dir=cache_dir
+        )
+    else:
+        logger.info("Processing bag file and extracting poses...")
+        segment_paths = processor.process_bag(segment_duration=args.segment_duration,
+                                              workers=args.ingest_workers)
+        logger.info(f"Analyzing segments with {args.workers} worker(s)...")
+        all_metrics, failures = analyze_segments(args.output_dir, segment_paths, args.workers,
+                                                 plot_renderer=plot_renderer, cache_dir=cache_dir)
+    _finish_run(args.output_dir, args.bag, args.segment_duration, all_metrics, failures,
+                plot_renderer, started_at)
+    return 0
+
+def cmd_summarise(args) -> int:
+    """
+    Print the totals of analysis_summary.json, reading nothing else.
+    """
+    summary_path = Path(args.output_dir) / SUMMARY_FILENAME
+    try:
+        with open(summary_path) as f:
+            all_metrics = json.load(f)
+    except FileNotFoundError:
+        print(f"No {SUMMARY_FILENAME} in {args.output_dir}", file=sys.stderr)
+        return 1
+
+    totals = summarise_metrics(all_metrics)
+    if args.json:
+        print(json.dumps(totals, indent=4))
+        return 0
+    if args.segments:
+        print(f"{'segment':<14}{'duration s':>12}{'length m':>12}{'ATE RMSE':>12}{'RPE RMSE':>12}{'rot RMSE':>12}")
+        for m in all_metrics:
+            print(f"{m['segment_id']:<14}{m['duration']:>12.1f}{m['trajectory_length']:>12.1f}"
+                  f"{m['ate_rmse']:>12.3f}{m['rpe_rmse']:>12.3f}{m['ate_rot_rmse']:>12.3f}")
+        print()
+    print(f"Segments:          {totals['segments']}")
+    print(f"Duration:          {totals['duration']:.1f} s")
+    print(f"Trajectory length: {totals['trajectory_length']:.1f} m")
+    if totals['segments']:
+        print(f"ATE RMSE:          {totals['ate_rmse']:.3f} m (max {totals['ate_max']:.3f} m "
+              f"in {totals['worst_segment']})")
+        print(f"RPE RMSE:          {totals['rpe_rmse']:.3f} m")
+        print(f"Rotation RMSE:     {totals['ate_rot_rmse']:.3f} deg")
+    return 0
+
+def cmd_plot(args) -> int:
+    """
+    Render the plots of analysed segments again, e.g. after a metrics-only run.
+    """
+    from src.evo_analyser.evo_analyser import EvoAnalyser
+
+    logger = logging.getLogger(__name__)
+    paths = segment_dirs(args.output_dir)
+    if args.segments:
+        paths = [path for path in paths if path.name in set(args.segments)]
+    analyser = EvoAnalyser(args.output_dir)
+    failed = 0
+    for path in paths:
+        try:
+            analyser.plot_segment(path)
+            logger.info(f"Plotted {path.name}")
+        except Exception as e:
+            failed += 1
+            logger.error(f"Plotting segment {path.name} failed: {type(e).__name__}: {e}")
+    return 1 if failed or not paths else 0
+
+def cmd_multiscale(args) -> int:
+    """
+    Evaluate sliding windows at several lengths over the poses of all
+    segments and write their statistics and a heatmap to the output directory.
+    """
+    from src.evo_analyser.association import DEFAULT_MAX_ASSOCIATION_DIFF
+    from src.evo_analyser.multiscale import (HEATMAP_FILENAME, WINDOW_METRICS, MultiScaleAnalysis,
+                                             load_run_poses, plot_heatmap, save_multiscale)
+
+    logger = logging.getLogger(__name__)
+    if args.metric not in WINDOW_METRICS:
+        logger.error(f"Unknown window metric {args.metric}; choose from {', '.join(WINDOW_METRICS)}")
+        return 1
+    est_poses = load_run_poses(args.output_dir, Config().get('topics', 'estimated'))
+    ref_poses = load_run_poses(args.output_dir, Config().get('topics', 'reference'))
+    if not len(est_poses) or not len(ref_poses):
+        logger.error(f"No pose stores in {args.output_dir}; run the ingest command first")
+        return 1
+
+    trajectory_config = Config().get('analysis', 'trajectory', default={})
+    analysis = MultiScaleAnalysis(est_poses, ref_poses,
+                                  trajectory_config.get('max_association_diff', DEFAULT_MAX_ASSOCIATION_DIFF),
+                                  trajectory_config.get('time_offset', 0.0))
+    results = analysis.evaluate_scales(args.windows, args.overlap)
+    logger.info(f"Window statistics saved to {save_multiscale(args.output_dir, results)}")
+    if any(len(result["start"]) for result in results):
+        heatmap_path = Path(args.output_dir) / HEATMAP_FILENAME
+        plot_heatmap(results, args.metric, heatmap_path)
+        logger.info(f"Heatmap saved to {heatmap_path}")
+    else:
+        logger.warning("Every window is longer than the run; no heatmap written")
+    return 0
+
+def cmd_rpe(args) -> int:
+    """
+    Evaluate RPE over distance and time deltas on the poses of all segments,
+    for deltas longer than a segment.
+    """
+    from src.evo_analyser.association import DEFAULT_MAX_ASSOCIATION_DIFF, associate
+    from src.evo_analyser.metric_engine import delta_rpe
+    from src.evo_analyser.multiscale import load_run_poses
+
+    logger = logging.getLogger(__name__)
+    est = load_run_poses(args.output_dir, Config().get('topics', 'estimated'))
+    ref = load_run_poses(args.output_dir, Config().get('topics', 'reference'))
+    if not len(est) or not len(ref):
+        logger.error(f"No pose stores in {args.output_dir}; run the ingest command first")
+        return 1
+
+    trajectory_config = Config().get('analysis', 'trajectory', default={})
+    ref_ids, est_ids = associate(ref[:, 0], est[:, 0],
+                                 trajectory_config.get('max_association_diff', DEFAULT_MAX_ASSOCIATION_DIFF),
+                                 offset_2=trajectory_config.get('time_offset', 0.0))
+    ref, est = ref[ref_ids], est[est_ids]
+    deltas = delta_rpe(ref[:, 1:4], ref[:, [7, 4, 5, 6]], est[:, 1:4], est[:, [7, 4, 5, 6]], ref[:, 0],
+                       args.distance_deltas, args.time_deltas, args.stride)
+    for label, entry in deltas.items():
+        drift = (f", drift {entry['trans_drift_pct']:.2f} % / {entry['rot_drift_deg_per_100m']:.3f} deg/100m"
+                 if "trans_drift_pct" in entry else "")
+        logger.info(f"RPE {label}: {entry['pairs']} pairs, RMSE {entry['trans_rmse']:.3f} m / "
+                    f"{entry['rot_rmse']:.3f} deg{drift}")
+
+    results_path = Path(args.output_dir) / RPE_DELTAS_FILENAME
+    with open(results_path, 'w') as f:
+        json.dump(deltas, f, indent=4)
+    logger.info(f"RPE over deltas saved to {results_path}")
+    return 0
+
+def cmd_run_metrics(args) -> int:
+    """
+    Evaluate the poses of all segments as one run, chunk by chunk, and write
+    run_metrics.json to the output directory.
+    """
+    from src.evo_analyser.evo_analyser import EvoAnalyser
+
+    logger = logging.getLogger(__name__)
+    if not segment_dirs(args.output_dir):
+        logger.error(f"No segments in {args.output_dir}; run the ingest command first")
+        return 1
+    metrics = EvoAnalyser(args.output_dir).analyze_run(args.memory_budget)
+    logger.info(f"Run ATE RMSE {metrics['ate_rmse']:.3f} m, RPE RMSE {metrics['rpe_rmse']:.3f} m "
+                f"over {metrics['matched_poses']} poses and {metrics['trajectory_length']:.1f} m")
+    return 0
+
+def summarise_metrics(all_metrics: list) -> dict:
+    """
+    Totals of a run's segment metrics.
+
+    RMSE values are combined as the duration-weighted root mean square of
+    the segment RMSEs, as in the fleet summary.
+
+    Args:
+        all_metrics (list): Segment metrics dicts from analysis_summary.json
+
+    Returns:
+        dict: Segment count, duration, length, pooled RMSEs and the worst segment
+    """
+    duration = sum(m["duration"] for m in all_metrics)
+
+    def pooled(key):
+        if duration <= 0:
+            return None
+        return math.sqrt(sum(m[key] ** 2 * m["duration"] for m in all_metrics) / duration)
+
+    worst = max(all_metrics, key=lambda m: m["ate_max"], default=None)
+    return {
+        "segments": len(all_metrics),
+        "duration": duration,
+        "trajectory_length": sum(m["trajectory_length"] for m in all_metrics),
+        "ate_rmse": pooled("ate_rmse"),
+        "ate_max": worst["ate_max"] if worst else None,
+        "worst_segment": worst["segment_id"] if worst else None,
+        "rpe_rmse": pooled("rpe_rmse"),
+        "ate_rot_rmse": pooled("ate_rot_rmse"),
+    }
+
+def _cache_dir(args) -> str:
+    if Config().get('cache', 'enabled', default=False) and not args.no_cache:
+        cache_dir = str(ROOT_DIR / Config().get('cache', 'dir', default='data/cache'))
+        logging.getLogger(__name__).info(f"Using result cache: {cache_dir}")
+        return cache_dir
+    return None
+
+def _plot_renderer():
+    if Config().get('output', 'plots', 'mode', default='inline') != 'background':
+        return None
+    from src.evo_analyser.plot_renderer import PlotRenderer
+    return PlotRenderer(Config().get('output', 'plots', 'workers', default=1),
+                        Config().get('output', 'plots', 'max_pending'))
+
+def _finish_run(output_dir: Path, bag_path: Path, segment_duration: float, all_metrics: list,
+                failures: list, plot_renderer, started_at: float):
+    """
+    Write the summary, record the run in the results store, wait for the
+    plots and export the stage timings.
+    """
+    from src.batch_runner.batch_runner import run_settings
+    from src.utils.performance import export_prometheus
+
+    logger = logging.getLogger(__name__)
+    if failures:
+        logger.warning(f"{len(failures)} segments failed analysis")
+
+    results_path = Path(output_dir) / SUMMARY_FILENAME
+    with open(results_path, 'w') as f:
+        json.dump(all_metrics, f, indent=4)
+    logger.info(f"Metrics saved to {results_path}")
+
+    # Append the run to the cross-run results database
+    if Config().get('results_store', 'enabled', default=False):
+        from src.results_store.results_store import ResultsStore
+        results_db = ROOT_DIR / Config().get('results_store', 'path', default='data/results.sqlite')
+        ResultsStore(results_db).record_run(bag_path, run_settings(segment_duration), all_metrics,
+                                            failures, output_dir, started_at)
+
+    if plot_renderer is not None:
+        logger.info("Waiting for plot rendering to finish...")
+        plot_failures = plot_renderer.close()
+        if plot_failures:
+            logger.warning(f"{len(plot_failures)} segments failed plotting")
+
+    # Stage timings of this run, including those of worker processes
+    export_prometheus(started_at, {"bag": Path(bag_path).name})
+    logger.info(f"Analysis complete. Results saved to {output_dir}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,54 +1,92 @@
+from pathlib import Path
 import streamlit as st
-import json
-import pandas as pd
 import plotly.express as px
-from pathlib import Path
-import logging
+from src.dashboard.data_layer import SummaryStore
+from src.results_store.results_store import ResultsStore
+from src.utils.config import Config
 from src.utils.logging_config import setup_logging
 
 logger = setup_logging(log_dir="dashboard_logs")
 logger.info("Starting analysis dashboard")
 
-def load_metrics(output_dir: str):
-    metrics_file = Path(output_dir) / "analysis_summary.json"
-    with open(metrics_file) as f:
-        return json.load(f)
+OUTPUT_DIR = Config().get('dashboard', 'output_dir', default="data/output")
+RESULTS_DB = Config().get('results_store', 'path', default="data/results.sqlite")
+
+@st.cache_resource
+def get_store(output_dir: str) -> SummaryStore:
+    # One store per server process; it keeps the partition metadata between reruns
+    return SummaryStore(output_dir)
+
+@st.cache_data
+def load_columns(output_dir: str, columns: tuple, version: tuple):
+    # version is part of the cache key, so data is reloaded only when a summary changed
+    return get_store(output_dir).columns(list(columns))
+
+@st.cache_data
+def load_trend(results_db: str, metric: str, last_runs: int, version: tuple):
+    return ResultsStore(results_db).metric_trend(metric, last_runs)
+
+def results_db_version(results_db: str) -> tuple:
+    # Committed writes land in the write-ahead log before the database file
+    return tuple(p.stat().st_mtime_ns for p in (Path(results_db), Path(f"{results_db}-wal")) if p.exists())
+
+@st.cache_data
+def load_aggregates(output_dir: str, column: str, version: tuple):
+    return get_store(output_dir).aggregates(column)
 
 def main():
     st.title("Localisation Analysis Dashboard")
-    
-    # Load metrics
-    metrics_data = load_metrics("data/output")
-    df = pd.DataFrame(metrics_data)
-    
-    # Overall statistics
+
+    # Only stats the summary files; changed summaries are converted incrementally
+    version = get_store(OUTPUT_DIR).refresh()
+    if not version:
+        st.warning(f"No analysis summaries found in {OUTPUT_DIR}")
+        return
+
+    # Overall statistics, from the precomputed aggregates
     st.header("Overall Performance Metrics")
     col1, col2, col3 = st.columns(3)
-    
+
     with col1:
-        st.metric("Avg ATE RMSE", f"{df['ate_rmse'].mean():.3f}")
+        st.metric("Avg ATE RMSE", f"{load_aggregates(OUTPUT_DIR, 'ate_rmse', version).loc['fleet', 'mean']:.3f}")
     with col2:
-        st.metric("Avg RPE RMSE", f"{df['rpe_rmse'].mean():.3f}")
+        st.metric("Avg RPE RMSE", f"{load_aggregates(OUTPUT_DIR, 'rpe_rmse', version).loc['fleet', 'mean']:.3f}")
     with col3:
-        st.metric("Avg Rotation Error", f"{df['ate_rot_rmse'].mean():.3f}°")
-    
-    # Detailed plots
+        st.metric("Avg Rotation Error", f"{load_aggregates(OUTPUT_DIR, 'ate_rot_rmse', version).loc['fleet', 'mean']:.3f}°")
+
+    if len(version) > 1:
+        st.subheader("Per Run ATE RMSE")
+        st.dataframe(load_aggregates(OUTPUT_DIR, 'ate_rmse', version))
+
+    # Detailed plots, each loading only the columns it draws
     st.header("Detailed Analysis")
-    
+
     # ATE over segments
-    fig_ate = px.line(df, x='segment_id', y=['ate_rmse', 'ate_mean', 'ate_median'],
+    df = load_columns(OUTPUT_DIR, ('segment_index', 'ate_rmse', 'ate_mean', 'ate_median'), version)
+    fig_ate = px.line(df, x='segment_index', y=['ate_rmse', 'ate_mean', 'ate_median'], line_group='run',
                       title="Absolute Trajectory Error Over Segments")
     st.plotly_chart(fig_ate)
-    
+
     # RPE analysis
-    fig_rpe = px.line(df, x='segment_id', y=['rpe_rmse', 'rpe_mean', 'rpe_median'],
+    df = load_columns(OUTPUT_DIR, ('segment_index', 'rpe_rmse', 'rpe_mean', 'rpe_median'), version)
+    fig_rpe = px.line(df, x='segment_index', y=['rpe_rmse', 'rpe_mean', 'rpe_median'], line_group='run',
                       title="Relative Pose Error Over Segments")
     st.plotly_chart(fig_rpe)
-    
+
     # Rotation error analysis
-    fig_rot = px.line(df, x='segment_id', y=['ate_rot_rmse', 'ate_rot_mean'],
+    df = load_columns(OUTPUT_DIR, ('segment_index', 'ate_rot_rmse', 'ate_rot_mean'), version)
+    fig_rot = px.line(df, x='segment_index', y=['ate_rot_rmse', 'ate_rot_mean'], line_group='run',
                       title="Rotation Error Over Segments")
     st.plotly_chart(fig_rot)
 
+    # Trend across runs from the results database
+    if Path(RESULTS_DB).exists():
+        st.header("ATE Trend Across Runs")
+        last_runs = st.slider("Runs", min_value=10, max_value=1000, value=200, step=10)
+        trend = load_trend(RESULTS_DB, 'ate_rmse', last_runs, results_db_version(RESULTS_DB))
+        fig_trend = px.line(trend, x='started_at', y=['rms', 'max'], hover_data=['bag', 'segments'],
+                            title="ATE RMSE per Run")
+        st.plotly_chart(fig_trend)
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,193 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+from pathlib import Path
+import hashlib
+import json
+import logging
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+SUMMARY_FILENAME = 'analysis_summary.json'
+STORE_DIRNAME = '.dashboard'
+PARTITION_META = 'meta.json'
+
+class SummaryStore:
+    """
+    Columnar copy of the analysis summaries of an output directory.
+
+    Each summary is converted once into a partition directory holding one
+    .npy file per column plus meta.json, which records the source's size and
+    modification time and precomputed aggregates of every numeric column.
+    refresh() only stats the sources and rebuilds partitions whose source
+    changed, and columns() memory-maps just the requested columns, so a
+    dashboard rerun does not parse JSON at all once the store is current.
+
+    Attributes:
+        output_dir (Path): Single run output directory or batch output root,
+            whose bag directories each hold an analysis summary
+        store_dir (Path): Directory holding the partitions
+    """
+
+    def __init__(self, output_dir: str, store_dir: str = None):
+        self.output_dir = Path(output_dir)
+        self.store_dir = Path(store_dir) if store_dir is not None else self.output_dir / STORE_DIRNAME
+        self.logger = logging.getLogger(__name__)
+        self._meta = {}
+
+    def refresh(self) -> tuple:
+        """
+        Bring the partitions in line with the summaries on disk.
+
+        Returns:
+            tuple: Version token of (run, size, mtime) per source; it changes
+                exactly when the store's contents change
+        """
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        # A single run's summary, or one per bag directory of a batch output root
+        candidates = [self.output_dir / SUMMARY_FILENAME, *self.output_dir.glob(f"*/{SUMMARY_FILENAME}")]
+        sources = {self._run_name(path): path for path in candidates if path.is_file()}
+        meta = {}
+        for run, source in sorted(sources.items()):
+            stat = source.stat()
+            partition = self.store_dir / _partition_name(run)
+            current = self._meta.get(run) or _read_meta(partition)
+            if current is None or (current["size"], current["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+                current = _build_partition(source, partition, run, stat)
+                self.logger.info(f"Rebuilt dashboard data for {run} ({current['rows']} segments)")
+            meta[run] = current
+
+        # Drop partitions whose summary disappeared
+        live = {_partition_name(run) for run in meta}
+        for partition in self.store_dir.iterdir():
+            if partition.is_dir() and not partition.name.startswith('.') and partition.name not in live:
+                shutil.rmtree(partition, ignore_errors=True)
+        self._meta = meta
+        return self.version()
+
+    def version(self) -> tuple:
+        return tuple((run, m["size"], m["mtime_ns"]) for run, m in sorted(self._meta.items()))
+
+    def runs(self) -> list:
+        return sorted(self._meta)
+
+    def available_columns(self) -> list:
+        """
+        Columns present in at least one run.
+        """
+        return sorted({column for m in self._meta.values() for column in m["columns"]})
+
+    def columns(self, names: list, runs: list = None) -> pd.DataFrame:
+        """
+        Load selected columns of selected runs.
+
+        Args:
+            names (list): Column names, e.g. ['segment_index', 'ate_rmse']
+            runs (list, optional): Runs to include. Defaults to all runs.
+
+        Returns:
+            pd.DataFrame: One row per segment with a 'run' column and the
+                requested columns; columns missing from a run are NaN
+        """
+        frames = []
+        for run in runs or self.runs():
+            meta = self._meta[run]
+            partition = self.store_dir / _partition_name(run)
+            data = {"run": np.full(meta["rows"], run)}
+            for name in names:
+                if name in meta["columns"]:
+                    data[name] = np.load(partition / f"{name}.npy", mmap_mode='r', allow_pickle=False)
+                else:
+                    data[name] = np.full(meta["rows"], np.nan)
+            frames.append(pd.DataFrame(data))
+        if not frames:
+            return pd.DataFrame(columns=["run"] + list(names))
+        return pd.concat(frames, ignore_index=True)
+
+    def aggregates(self, column: str) -> pd.DataFrame:
+        """
+        Precomputed statistics of a numeric column per run and over the fleet.
+
+        The fleet row combines the run aggregates without loading any segment:
+        mean and RMS are weighted by segment count, min and max are exact.
+
+        Args:
+            column (str): Numeric column name
+
+        Returns:
+            pd.DataFrame: Indexed by run, plus a 'fleet' row, with count,
+                mean, rms, min and max
+        """
+        rows = {run: m["aggregates"][column] for run, m in self._meta.items() if column in m["aggregates"]}
+        table = pd.DataFrame.from_dict(rows, orient='index', columns=["count", "mean", "rms", "min", "max"])
+        if len(table):
+            counts = table["count"].to_numpy(dtype=np.float64)
+            total = counts.sum()
+            table.loc["fleet"] = [
+                total,
+                float(np.dot(counts, table["mean"]) / total) if total else np.nan,
+                float(np.sqrt(np.dot(counts, table["rms"] ** 2) / total)) if total else np.nan,
+                table["min"].min(),
+                table["max"].max(),
+            ]
+        return table
+
+    def _run_name(self, summary_path: Path) -> str:
+        run = summary_path.parent.relative_to(self.output_dir).as_posix()
+        return run if run != '.' else self.output_dir.name
+
+def _partition_name(run: str) -> str:
+    return hashlib.blake2b(run.encode(), digest_size=8).hexdigest()
+
+def _read_meta(partition: Path) -> dict:
+    try:
+        with open(partition / PARTITION_META) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def _build_partition(source: Path, partition: Path, run: str, stat) -> dict:
+    """
+    Convert one analysis summary into column files and aggregates.
+
+    The partition is written to a temporary directory and renamed into place,
+    so a concurrently running dashboard never reads a half-written partition.
+    """
+    with open(source) as f:
+        records = json.load(f)
+    frame = pd.DataFrame(records)
+    if "segment_id" in frame:
+        frame["segment_index"] = pd.to_numeric(
+            frame["segment_id"].str.extract(r'(\d+)$')[0], errors='coerce')
+        frame = frame.sort_values("segment_index", kind='stable').reset_index(drop=True)
+
+    staging = partition.with_name(f".{partition.name}.{os.getpid()}")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    columns, aggregates = [], {}
+    for name in frame.columns:
+        series = frame[name]
+        if pd.api.types.is_numeric_dtype(series):
+            values = series.to_numpy(dtype=np.float64)
+            finite = values[np.isfinite(values)]
+            if finite.size:
+                aggregates[name] = {
+                    "count": int(finite.size),
+                    "mean": float(finite.mean()),
+                    "rms": float(np.sqrt(np.mean(finite ** 2))),
+                    "min": float(finite.min()),
+                    "max": float(finite.max()),
+                }
+        else:
+            values = series.astype(str).to_numpy(dtype=str)
+        np.save(staging / f"{name}.npy", values, allow_pickle=False)
+        columns.append(name)
+
+    meta = {"run": run, "source": str(source), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "rows": len(frame), "columns": columns, "aggregates": aggregates}
+    with open(staging / PARTITION_META, 'w') as f:
+        json.dump(meta, f, indent=4)
+    shutil.rmtree(partition, ignore_errors=True)
+    staging.rename(partition)
+    return meta
@@ -0,0 +1,89 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+from dataclasses import dataclass
+import numpy as np
+from evo.core.geometry import umeyama_alignment
+from evo.core.transformations import quaternion_from_matrix
+from src.evo_analyser.metric_engine import quaternion_multiply
+
+@dataclass(frozen=True)
+class AlignmentTransform:
+    """
+    Similarity transform p' = scale * rotation @ p + translation.
+
+    Holds only the Umeyama parameters; aligned positions and orientations are
+    computed on demand instead of transforming a copy of the trajectory.
+
+    Attributes:
+        rotation (np.ndarray): 3x3 rotation matrix
+        translation (np.ndarray): Translation vector of length 3
+        scale (float): Scale factor, 1.0 without scale correction
+    """
+    rotation: np.ndarray
+    translation: np.ndarray
+    scale: float = 1.0
+
+    @property
+    def scale_drift(self) -> float:
+        """
+        Deviation of the recovered scale from 1.
+        """
+        return abs(self.scale - 1.0)
+
+    def apply_positions(self, positions_xyz: np.ndarray) -> np.ndarray:
+        """
+        Transform Nx3 positions.
+
+        Args:
+            positions_xyz (np.ndarray): Nx3 positions
+
+        Returns:
+            np.ndarray: New Nx3 array of aligned positions
+        """
+        return self.scale * (np.asarray(positions_xyz) @ self.rotation.T) + self.translation
+
+    def apply_orientations(self, orientations_wxyz: np.ndarray) -> np.ndarray:
+        """
+        Rotate Nx4 (w, x, y, z) orientations; scale does not affect them.
+
+        Args:
+            orientations_wxyz (np.ndarray): Nx4 quaternions
+
+        Returns:
+            np.ndarray: New Nx4 array of aligned quaternions
+        """
+        orientations_wxyz = np.asarray(orientations_wxyz, dtype=np.float64)
+        matrix = np.eye(4)
+        matrix[:3, :3] = self.rotation
+        rotation_q = np.broadcast_to(quaternion_from_matrix(matrix), orientations_wxyz.shape)
+        return quaternion_multiply(rotation_q, orientations_wxyz)
+
+    def to_dict(self) -> dict:
+        return {
+            "rotation": self.rotation.tolist(),
+            "translation": self.translation.tolist(),
+            "scale": float(self.scale),
+        }
+
+def align_positions(est_xyz: np.ndarray, ref_xyz: np.ndarray, correct_scale: bool = True,
+                    n: int = -1) -> AlignmentTransform:
+    """
+    Estimate the Umeyama alignment of an estimate onto its reference.
+
+    Equivalent to evo's PosePath3D.align() with correct_scale, but the
+    trajectories are left untouched.
+
+    Args:
+        est_xyz (np.ndarray): Nx3 estimated positions, associated with the reference
+        ref_xyz (np.ndarray): Nx3 reference positions
+        correct_scale (bool): Also estimate a scale factor. Defaults to True.
+        n (int): Number of poses used from the start, -1 for all
+
+    Returns:
+        AlignmentTransform: Transform mapping the estimate onto the reference
+    """
+    if n != -1:
+        est_xyz, ref_xyz = est_xyz[:n], ref_xyz[:n]
+    rotation, translation, scale = umeyama_alignment(np.asarray(est_xyz).T, np.asarray(ref_xyz).T,
+                                                     correct_scale)
+    return AlignmentTransform(rotation, translation, float(scale))
@@ -0,0 +1,154 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+import numpy as np
+
+# Fallback for analysis.trajectory.max_association_diff, as in config.yaml
+DEFAULT_MAX_ASSOCIATION_DIFF = 1.0
+
+def associate(stamps_1: np.ndarray, stamps_2: np.ndarray, max_diff: float,
+              offset_2: float = 0.0) -> tuple:
+    """
+    Match two timestamp vectors by nearest neighbour within a tolerance.
+
+    Like evo's sync.matching_time_indices, every stamp of the shorter vector
+    is matched to its nearest stamp in the longer one, but all stamps are
+    searched at once with np.searchsorted. Matching is one-to-one: when
+    several stamps pick the same partner, only the closest pair is kept.
+
+    Args:
+        stamps_1 (np.ndarray): First timestamps in seconds
+        stamps_2 (np.ndarray): Second timestamps in seconds
+        max_diff (float): Largest allowed absolute time difference in seconds
+        offset_2 (float): Time offset added to stamps_2 before matching
+
+    Returns:
+        tuple: (indices into stamps_1, indices into stamps_2) of the matched
+            pairs, ordered by the stamps_1 index
+    """
+    stamps_1 = np.asarray(stamps_1, dtype=np.float64)
+    stamps_2 = np.asarray(stamps_2, dtype=np.float64) + offset_2
+    # Search from the shorter vector so none of its stamps are lost, as evo does
+    swap = len(stamps_2) < len(stamps_1)
+    query, target = (stamps_2, stamps_1) if swap else (stamps_1, stamps_2)
+    query_idx, target_idx = match_nearest(query, target, max_diff)
+    idx_1, idx_2 = (target_idx, query_idx) if swap else (query_idx, target_idx)
+    order = np.argsort(idx_1, kind='stable')
+    return idx_1[order], idx_2[order]
+
+def match_nearest(query: np.ndarray, target: np.ndarray, max_diff: float) -> tuple:
+    """
+    One-to-one nearest-neighbour matching of query stamps into target stamps.
+
+    Every query stamp takes its nearest target stamp within max_diff, ties
+    going to the earlier target; when several query stamps take the same
+    target, the closest one keeps it, the earliest one on ties.
+
+    Args:
+        query (np.ndarray): Query timestamps in seconds
+        target (np.ndarray): Target timestamps in seconds
+        max_diff (float): Largest allowed absolute time difference in seconds
+
+    Returns:
+        tuple: (query indices, target indices) of the matched pairs
+    """
+    empty = np.empty(0, dtype=np.intp)
+    if query.size == 0 or target.size == 0:
+        return empty, empty
+
+    sort_order = None
+    if np.any(np.diff(target) < 0):
+        sort_order = np.argsort(target, kind='stable')
+        target = target[sort_order]
+
+    # Candidates either side of each insertion point; ties go to the earlier stamp
+    upper = np.searchsorted(target, query, side='right')
+    lower = upper - 1
+    diff_upper = np.full(query.shape, np.inf)
+    diff_lower = np.full(query.shape, np.inf)
+    has_upper = upper < target.size
+    has_lower = lower >= 0
+    diff_upper[has_upper] = target[upper[has_upper]] - query[has_upper]
+    diff_lower[has_lower] = query[has_lower] - target[lower[has_lower]]
+    use_upper = diff_upper < diff_lower
+    nearest = np.where(use_upper, upper, lower)
+    diffs = np.where(use_upper, diff_upper, diff_lower)
+
+    query_idx = np.flatnonzero(diffs <= max_diff)
+    target_idx = nearest[query_idx]
+    diffs = diffs[query_idx]
+
+    # Keep the closest query per target stamp
+    by_target = np.lexsort((query_idx, diffs, target_idx))
+    _, first = np.unique(target_idx[by_target], return_index=True)
+    keep = by_target[first]
+    query_idx, target_idx = query_idx[keep], target_idx[keep]
+
+    if sort_order is not None:
+        target_idx = sort_order[target_idx]
+    return query_idx.astype(np.intp), target_idx.astype(np.intp)
+
+def estimate_time_offset(ref_stamps: np.ndarray, ref_positions: np.ndarray,
+                         est_stamps: np.ndarray, est_positions: np.ndarray,
+                         max_offset: float = 1.0, resolution: float = 0.01) -> float:
+    """
+    Estimate a constant clock offset between an estimate and its reference.
+
+    Speed is independent of the (unknown) alignment between the two frames,
+    so both speed profiles are resampled on a common grid and the lag with the
+    highest normalised cross-correlation within +/- max_offset is returned.
+
+    Args:
+        ref_stamps (np.ndarray): Reference timestamps in seconds
+        ref_positions (np.ndarray): Nx3 reference positions
+        est_stamps (np.ndarray): Estimate timestamps in seconds
+        est_positions (np.ndarray): Mx3 estimate positions
+        max_offset (float): Largest offset searched in seconds
+        resolution (float): Grid spacing and offset resolution in seconds
+
+    Returns:
+        float: Offset to add to the estimate stamps (offset_2 of associate),
+            0.0 if the trajectories are too short or do not overlap
+    """
+    ref_t, ref_speed = _speed_profile(ref_stamps, ref_positions)
+    est_t, est_speed = _speed_profile(est_stamps, est_positions)
+    if ref_t.size < 2 or est_t.size < 2:
+        return 0.0
+    start = max(ref_t[0], est_t[0]) - max_offset
+    end = min(ref_t[-1], est_t[-1]) + max_offset
+    if end - start <= 2 * max_offset:
+        return 0.0
+
+    grid = np.arange(start, end, resolution)
+    ref_signal = _normalise(np.interp(grid, ref_t, ref_speed, left=np.nan, right=np.nan))
+    est_signal = _normalise(np.interp(grid, est_t, est_speed, left=np.nan, right=np.nan))
+
+    # est(t) ~ ref(t + offset), so the best lag shifts the estimate onto the reference
+    max_lag = int(round(max_offset / resolution))
+    correlation = np.correlate(ref_signal, est_signal, mode='full')
+    lags = np.arange(-(est_signal.size - 1), ref_signal.size)
+    window = np.abs(lags) <= max_lag
+    return float(lags[window][np.argmax(correlation[window])] * resolution)
+
+def _speed_profile(stamps: np.ndarray, positions: np.ndarray) -> tuple:
+    """
+    Speed at the midpoints between consecutive poses.
+
+    Returns:
+        tuple: (midpoint timestamps, speeds)
+    """
+    stamps = np.asarray(stamps, dtype=np.float64)
+    positions = np.asarray(positions, dtype=np.float64)
+    dt = np.diff(stamps)
+    valid = dt > 0
+    speed = np.linalg.norm(np.diff(positions, axis=0), axis=1)[valid] / dt[valid]
+    midpoints = (stamps[:-1] + stamps[1:])[valid] / 2
+    return midpoints, speed
+
+def _normalise(signal: np.ndarray) -> np.ndarray:
+    """
+    Zero-mean, unit-variance signal with samples outside the data set to zero.
+    """
+    valid = ~np.isnan(signal)
+    signal = np.where(valid, signal - np.nanmean(signal), 0.0)
+    std = signal[valid].std()
+    return signal / std if std > 0 else signal
@@ -0,0 +1,79 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+import numpy as np
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Select points of a time series with largest-triangle-three-buckets.
+
+    The first and last points are always kept. The remaining points are split
+    into max_points - 2 buckets and from each bucket the point forming the
+    largest triangle with the previously kept point and the next bucket's
+    average is kept, which preserves peaks and the visual shape.
+
+    Args:
+        x (np.ndarray): Sorted x values, e.g. seconds from start
+        y (np.ndarray): Values to plot
+        max_points (int): Number of points to keep, None to keep all
+
+    Returns:
+        np.ndarray: Sorted indices of the kept points
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if max_points is None or max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    # Bucket i holds points [edges[i], edges[i + 1]); the last point is its own bucket
+    edges = (np.arange(max_points - 1) * (n - 2) / (max_points - 2)).astype(np.intp) + 1
+    edges[-1] = n - 1
+    kept = np.empty(max_points, dtype=np.intp)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        next_lo, next_hi = hi, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        ax, ay = x[previous], y[previous]
+        area = np.abs((ax - avg_x) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (avg_y - ay))
+        previous = lo + int(np.argmax(area))
+        kept[bucket + 1] = previous
+    return kept
+
+def minmax_indices(values: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Select points of a path keeping the extremes of every column per bucket.
+
+    The path is split into consecutive buckets and, in each, the points with
+    the minimum and maximum of every column (e.g. x, y, z or an error value)
+    are kept, so the drawn extent and any excursions survive decimation.
+    Budgets too small for one bucket (fewer than 2 + 2 * D points) fall back
+    to evenly spaced points including both endpoints.
+
+    Args:
+        values (np.ndarray): NxD array, one row per point
+        max_points (int): Upper bound on the number of points kept, None to keep all
+
+    Returns:
+        np.ndarray: Sorted indices of the kept points
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    n, columns = values.shape
+    if max_points is None or max_points >= n:
+        return np.arange(n)
+
+    # Two extremes per column per bucket, plus the endpoints
+    bucket_count = (max_points - 2) // (2 * columns)
+    if bucket_count < 1:
+        return np.unique(np.linspace(0, n - 1, max(max_points, 0)).round().astype(np.intp))
+    buckets = np.arange(n) * bucket_count // n
+    starts = np.searchsorted(buckets, np.arange(bucket_count))
+    ends = np.append(starts[1:], n)
+    kept = [np.array([0, n - 1])]
+    for column in values.T:
+        order = np.lexsort((column, buckets))
+        kept += [order[starts], order[ends - 1]]
+    return np.unique(np.concatenate(kept))
@@ -1,21 +1,26 @@
 # Copyright 2024
 # Author: Usamah Zaheer
-import evo
-from evo.core import metrics, sync
-from evo.core.trajectory import PosePath3D
-from evo.tools import file_interface
+from evo.core.trajectory import PoseTrajectory3D
 import json
 import numpy as np
 from pathlib import Path
 import logging
-import copy
-import matplotlib
-import matplotlib.pyplot as plt
-matplotlib.use('Agg') 
-from evo.tools.settings import SETTINGS
-SETTINGS.plot_backend = 'Agg' 
-from evo.tools import plot
 from src.utils.config import Config
+from src.bag_processor.segment_quality import load_quality
+from src.utils.pose_store import POSE_STORE_SUFFIX, load_poses, pose_filename
+from src.evo_analyser.association import DEFAULT_MAX_ASSOCIATION_DIFF, associate, estimate_time_offset
+from src.evo_analyser.metric_engine import compute_errors, delta_rpe, error_statistics
+from src.evo_analyser.alignment import align_positions
+from src.evo_analyser.out_of_core import RUN_METRICS_FILENAME, evaluate_run
+from src.evo_analyser.plot_renderer import make_plot_job, render_plots
+from src.evo_analyser.result_cache import ResultCache, cache_key, hash_arrays
+from src.utils.performance import span
+
+# Part of every cache key; bump when metrics or plots change for the same inputs
+ANALYSER_VERSION = '3'
+
+# analysis.trajectory settings that affect the metrics
+CACHED_TRAJECTORY_SETTINGS = ('max_association_diff', 'time_offset', 'estimate_time_offset', 'max_time_offset')
 
 class EvoAnalyser:
     """
@@ -26,13 +31,24 @@ class EvoAnalyser:
         logger (Logger): General purpose logger
         perf_logger (Logger): Performance metrics logger
         config (Config): Configuration instance
+        plot_mode (str): output.plots.mode; 'none' skips plotting (metrics only)
+        defer_plots (bool): Queue plots in pending_plots instead of rendering them
+        pending_plots (list): PlotJob objects waiting for a PlotRenderer
+        cache (ResultCache): Cache of results keyed by their inputs, None if disabled
     """
 
-    def __init__(self, output_dir: str):
+    def __init__(self, output_dir: str, defer_plots: bool = False, cache_dir: str = None):
         self.output_dir = Path(output_dir)
         self.logger = logging.getLogger(__name__)
         self.perf_logger = logging.getLogger('performance')
         self.config = Config()
+        self.plot_mode = self.config.get('output', 'plots', 'mode', default='inline')
+        self.defer_plots = defer_plots
+        self.pending_plots = []
+        self.cache = None
+        if cache_dir is not None:
+            max_size_mb = self.config.get('cache', 'max_size_mb')
+            self.cache = ResultCache(cache_dir, None if max_size_mb is None else int(max_size_mb * 2**20))
         
         self.logger.info(f"Initialising EvoAnalyser with output dir: {output_dir}")
         
@@ -48,202 +64,389 @@ class EvoAnalyser:
                  and trajectory statistics
                  
         Raises:
+            ValueError: If the segment failed the ingestion quality gate or
+                no valid pose pairs are found
+        """
+        # Skip segments rejected during ingestion before loading any poses
+        quality = load_quality(segment_path)
+        if quality is not None and not quality["valid"]:
+            raise ValueError(
+                f"Segment {segment_path.name} failed quality checks: {'; '.join(quality['reasons'])}"
+            )
+        
+        with span('segment_analysis', segment=segment_path.name) as segment_span:
+            traj_ref, traj_est = self._load_trajectories(segment_path)
+            segment_span.add(traj_est.num_poses + traj_ref.num_poses)
+            return self._analyze_trajectories(segment_path, traj_ref, traj_est)
+    
+    def plot_segment(self, segment_path: Path):
+        """
+        Render the plots of an analysed segment, e.g. after a metrics-only run.
+        
+        The trajectories are associated and aligned again to recover the
+        aligned poses and per-pose errors, but the APE statistics come from
+        the saved metrics, which are left unchanged.
+        
+        Args:
+            segment_path (Path): Path to the analysed segment directory
+            
+        Raises:
+            FileNotFoundError: If the segment has not been analysed
             ValueError: If no valid pose pairs are found
         """
-        # Load trajectories
-        traj_est = file_interface.read_tum_trajectory_file(
-            str(segment_path / 'poses' / "casestudy_predicted_pose.txt"))
-        traj_ref = file_interface.read_tum_trajectory_file(
-            str(segment_path / 'poses' / "casestudy_reference_pose.txt"))
-   
-        # Associate trajectories using evo's sync module
-        max_diff = self.config.get('analysis', 'trajectory', 'max_association_diff')
-        traj_ref, traj_est = sync.associate_trajectories(traj_ref, traj_est, max_diff)
+        segment_path = Path(segment_path)
+        with open(segment_path / 'metrics' / f"{segment_path.name}_metrics.json") as f:
+            metrics_dict = json.load(f)
+        traj_ref, traj_est = self._load_trajectories(segment_path)
+        job = self._replot_job(segment_path, traj_ref, traj_est, metrics_dict)
+        with span('plotting', traj_ref.num_poses, segment=segment_path.name):
+            render_plots(job)
+    
+    def analyze_poses(self, segment_path: Path, est_poses: np.ndarray,
+                      ref_poses: np.ndarray) -> dict:
+        """
+        Analyze in-memory pose arrays without reading pose files.
         
-        # Log trajectory information
-        self.logger.info(f"Reference trajectory: {len(traj_ref.positions_xyz)} poses")
-        self.logger.info(f"Estimated trajectory: {len(traj_est.positions_xyz)} poses")
+        Args:
+            segment_path (Path): Segment directory receiving metrics and plots
+            est_poses (np.ndarray): Nx8 estimated poses in TUM column order
+            ref_poses (np.ndarray): Nx8 reference poses in TUM column order
+            
+        Returns:
+            dict: Same metrics as analyze_segment
+            
+        Raises:
+            ValueError: If no valid pose pairs are found
+        """
+        with span('segment_analysis', len(est_poses) + len(ref_poses), segment=Path(segment_path).name):
+            return self._analyze_trajectories(
+                Path(segment_path), trajectory_from_poses(ref_poses), trajectory_from_poses(est_poses))
+    
+    def analyze_run(self, memory_budget_mb: float = None) -> dict:
+        """
+        Evaluate the whole run across segment boundaries within a memory budget.
         
-        if len(traj_ref.positions_xyz) == 0 or len(traj_est.positions_xyz) == 0:
-            raise ValueError("No valid pose pairs found after association")
-
-        # Create aligned copy for APE calculation
-        traj_est_aligned = copy.deepcopy(traj_est)
-        traj_est_aligned.align(traj_ref, 
-                              correct_scale=True,  # Enable scale correction
-                              correct_only_scale=False,  # Allow rotation and translation too
-                              n=-1)
-        plots_dir = segment_path / "plots"
-        plots_dir.mkdir(parents=True, exist_ok=True)  # Ensure the directory exists
+        The segments' pose stores are associated, aligned and evaluated chunk
+        by chunk with evaluate_run, so memory use does not grow with the
+        length of the bag. The metrics are written to run_metrics.json in the
+        output directory.
         
-        # Calculate APE metrics using aligned trajectory
-        ate = metrics.APE(metrics.PoseRelation.translation_part)
-        ate.process_data((traj_ref, traj_est_aligned))
-
-        # Calculate APE rotation metrics
-        ate_rot = metrics.APE(metrics.PoseRelation.rotation_angle_deg)
-        ate_rot.process_data((traj_ref, traj_est_aligned))
-        
-        # Calculate RPE metrics
-        rpe = metrics.RPE(
-            pose_relation=metrics.PoseRelation.translation_part,
-            delta=1,  # 1 frame delta
-            delta_unit=metrics.Unit.frames,
-            all_pairs=False
-        )
-        rpe.process_data((traj_ref, traj_est))
-        
-        # Calculate RPE rotation metrics
-        rpe_rot = metrics.RPE(
-            pose_relation=metrics.PoseRelation.rotation_angle_deg,
-            delta=1,
-            delta_unit=metrics.Unit.frames,
-            all_pairs=False
+        Args:
+            memory_budget_mb (float, optional): Memory budget in MiB. Defaults to
+                memory.budget_mb from the config.
+            
+        Returns:
+            dict: Run metrics with the ATE and RPE keys of the segment metrics
+            
+        Raises:
+            ValueError: If too few pose pairs are associated
+        """
+        if memory_budget_mb is None:
+            memory_budget_mb = self.config.get('memory', 'budget_mb')
+        trajectory_config = self.config.get('analysis', 'trajectory', default={})
+        if trajectory_config.get('estimate_time_offset', False):
+            # Estimating needs the speed profiles of the whole run in memory
+            self.logger.warning("Offset estimation is not available chunk by chunk; "
+                                "using analysis.trajectory.time_offset")
+        metrics_dict = evaluate_run(
+            self.output_dir, self.config.get('topics', 'estimated'), self.config.get('topics', 'reference'),
+            trajectory_config.get('max_association_diff', DEFAULT_MAX_ASSOCIATION_DIFF),
+            trajectory_config.get('time_offset', 0.0),
+            memory_budget_mb, self.config.get('memory', 'scratch_dir')
         )
-        rpe_rot.process_data((traj_ref, traj_est))
+        
+        metrics_path = self.output_dir / RUN_METRICS_FILENAME
+        with open(metrics_path, 'w') as f:
+            json.dump(metrics_dict, f, indent=4)
+        self.logger.info(f"Run metrics saved to {metrics_path}")
+        return metrics_dict
+    
+    def _analyze_trajectories(self, segment_path: Path, traj_ref: PoseTrajectory3D,
+                              traj_est: PoseTrajectory3D) -> dict:
+        """
+        Associate, align and evaluate a reference/estimate trajectory pair.
+        
+        Args:
+            segment_path (Path): Segment directory receiving metrics and plots
+            traj_ref (PoseTrajectory3D): Reference trajectory
+            traj_est (PoseTrajectory3D): Estimated trajectory
+            
+        Returns:
+            dict: Analysis metrics for the segment
+        """
+        # Unchanged inputs and settings come straight from the cache; when only
+        # the plot settings changed, the cached metrics are kept and only the plots are made
+        result_key = plot_key = None
+        if self.cache is not None:
+            result_key, plot_key = self._cache_keys(traj_ref, traj_est)
+            metrics_dict, plots_missing = self._restore_cached(segment_path, result_key, plot_key)
+            if metrics_dict is not None:
+                if plots_missing:
+                    job = self._replot_job(segment_path, traj_ref, traj_est, metrics_dict)
+                    self._submit_plots(job, traj_ref.num_poses, result_key, plot_key)
+                return metrics_dict
+        
+        alignment, aligned_xyz, aligned_wxyz = self._associate_and_align(segment_path, traj_ref, traj_est)
+        plots_dir = segment_path / "plots"
+        
+        # All four error series in one pass, statistics computed once per series
+        with span('metric_errors', traj_ref.num_poses, segment=segment_path.name):
+            errors = compute_errors(traj_ref.positions_xyz, traj_ref.orientations_quat_wxyz,
+                                    traj_est.positions_xyz, traj_est.orientations_quat_wxyz,
+                                    aligned_xyz, aligned_wxyz)
+        stats = {}
+        for name in ("ape_trans", "ape_rot", "rpe_trans", "rpe_rot"):
+            series = getattr(errors, name)
+            with span(f'metric_{name}', len(series), segment=segment_path.name):
+                stats[name] = error_statistics(series)
+        ate, ate_rot, rpe, rpe_rot = (stats["ape_trans"], stats["ape_rot"],
+                                      stats["rpe_trans"], stats["rpe_rot"])
         metrics_dict = {
             "segment_id": segment_path.name,
             # APE translation metrics
-            "ate_rmse": float(ate.get_all_statistics()["rmse"]),
-            "ate_mean": float(ate.get_all_statistics()["mean"]),
-            "ate_median": float(ate.get_all_statistics()["median"]),
-            "ate_std": float(ate.get_all_statistics()["std"]),
-            "ate_min": float(ate.get_all_statistics()["min"]),
-            "ate_max": float(ate.get_all_statistics()["max"]),
+            "ate_rmse": ate["rmse"],
+            "ate_mean": ate["mean"],
+            "ate_median": ate["median"],
+            "ate_std": ate["std"],
+            "ate_min": ate["min"],
+            "ate_max": ate["max"],
             # APE rotation metrics
-            "ate_rot_rmse": float(ate_rot.get_all_statistics()["rmse"]),
-            "ate_rot_mean": float(ate_rot.get_all_statistics()["mean"]),
-            "ate_rot_median": float(ate_rot.get_all_statistics()["median"]),
+            "ate_rot_rmse": ate_rot["rmse"],
+            "ate_rot_mean": ate_rot["mean"],
+            "ate_rot_median": ate_rot["median"],
             # RPE translation metrics
-            "rpe_rmse": float(rpe.get_all_statistics()["rmse"]),
-            "rpe_mean": float(rpe.get_all_statistics()["mean"]),
-            "rpe_median": float(rpe.get_all_statistics()["median"]),
+            "rpe_rmse": rpe["rmse"],
+            "rpe_mean": rpe["mean"],
+            "rpe_median": rpe["median"],
             # RPE rotation metrics
-            "rpe_rot_rmse": float(rpe_rot.get_all_statistics()["rmse"]),
-            "rpe_rot_mean": float(rpe_rot.get_all_statistics()["mean"]),
-            "rpe_rot_median": float(rpe_rot.get_all_statistics()["median"]),
+            "rpe_rot_rmse": rpe_rot["rmse"],
+            "rpe_rot_mean": rpe_rot["mean"],
+            "rpe_rot_median": rpe_rot["median"],
             # Additional metrics
             "trajectory_length": float(traj_ref.path_length),
             "duration": float(traj_ref.timestamps[-1] - traj_ref.timestamps[0]),
             "average_speed": float(traj_ref.path_length / (traj_ref.timestamps[-1] - traj_ref.timestamps[0])),
-            "translation_error_percent": float((ate.get_all_statistics()["mean"] / traj_ref.path_length) * 100),
+            "translation_error_percent": float((ate["mean"] / traj_ref.path_length) * 100),
             # Scale error (if using scale-aware alignment)
-            "scale_drift": float(np.linalg.norm(traj_est_aligned.scale_ratio - 1.0)) if hasattr(traj_est_aligned, 'scale_ratio') else 0.0,
+            "scale_drift": alignment.scale_drift,
+            "alignment_scale": alignment.scale,
             # Success rate
             "tracking_success_rate": float(len(traj_est.positions_xyz) / len(traj_ref.positions_xyz)),
         }
         
+        # RPE over configured distance and time deltas, flattened to rpe_<delta>_<statistic>;
+        # deltas longer than the segment have no pairs and are left out
+        rpe_config = self.config.get('analysis', 'rpe', default={}) or {}
+        with span('metric_rpe_deltas', traj_ref.num_poses, segment=segment_path.name):
+            deltas = delta_rpe(traj_ref.positions_xyz, traj_ref.orientations_quat_wxyz,
+                               traj_est.positions_xyz, traj_est.orientations_quat_wxyz,
+                               traj_ref.timestamps, rpe_config.get('distance_deltas') or [],
+                               rpe_config.get('time_deltas') or [], rpe_config.get('stride', 1))
+        for label, entry in deltas.items():
+            if entry["pairs"]:
+                metrics_dict.update({f"rpe_{label}_{key}": value for key, value in entry.items()})
+        
         # Save metrics
+        self._save_metrics(segment_path, metrics_dict)
+        if self.cache is not None:
+            self.cache.put_metrics(result_key, metrics_dict)
+        
+        # Hand plots to the rendering stage, or render them here
+        if self.plot_mode != 'none':
+            job = make_plot_job(
+                segment_path.name, plots_dir,
+                _tum_poses(traj_ref.timestamps, traj_ref.positions_xyz, traj_ref.orientations_quat_wxyz),
+                _tum_poses(traj_est.timestamps, traj_est.positions_xyz, traj_est.orientations_quat_wxyz),
+                _tum_poses(traj_est.timestamps, aligned_xyz, aligned_wxyz),
+                errors.ape_trans, errors.rpe_trans, ate, rpe,
+                max_points=self.config.get('output', 'plots', 'max_points')
+            )
+            self._submit_plots(job, traj_ref.num_poses, result_key, plot_key)
+        
+        return metrics_dict
+    
+    def _replot_job(self, segment_path: Path, traj_ref: PoseTrajectory3D,
+                    traj_est: PoseTrajectory3D, metrics_dict: dict):
+        """
+        Build the plot job of a segment whose metrics are already known.
+        
+        Only association and alignment run again to recover the aligned poses
+        and per-pose errors; the APE statistics come from the metrics.
+        
+        Returns:
+            PlotJob: Plot data of the segment
+        """
+        aligned_xyz, aligned_wxyz = self._associate_and_align(segment_path, traj_ref, traj_est)[1:]
+        errors = compute_errors(traj_ref.positions_xyz, traj_ref.orientations_quat_wxyz,
+                                traj_est.positions_xyz, traj_est.orientations_quat_wxyz,
+                                aligned_xyz, aligned_wxyz)
+        ate = {key: metrics_dict[f"ate_{key}"] for key in ("rmse", "mean", "median", "std", "min", "max")}
+        # The saved metrics keep only part of the RPE statistics shown in the plot
+        return make_plot_job(
+            segment_path.name, segment_path / "plots",
+            _tum_poses(traj_ref.timestamps, traj_ref.positions_xyz, traj_ref.orientations_quat_wxyz),
+            _tum_poses(traj_est.timestamps, traj_est.positions_xyz, traj_est.orientations_quat_wxyz),
+            _tum_poses(traj_est.timestamps, aligned_xyz, aligned_wxyz),
+            errors.ape_trans, errors.rpe_trans, ate, error_statistics(errors.rpe_trans),
+            max_points=self.config.get('output', 'plots', 'max_points')
+        )
+    
+    def _submit_plots(self, job, pose_count: int, result_key: str, plot_key: str):
+        """
+        Hand a plot job to the rendering stage, or render it here and store
+        the plots in the result cache.
+        """
+        if self.cache is not None:
+            job.cache_dir, job.cache_key, job.plot_key = self.cache.cache_dir, result_key, plot_key
+            job.cache_max_bytes = self.cache.max_bytes
+        if self.defer_plots:
+            self.pending_plots.append(job)
+            return
+        with span('plotting', pose_count, segment=job.segment_name):
+            render_plots(job)
+        if self.cache is not None:
+            self.cache.put_plots(result_key, plot_key, job.plots_dir, f"{job.segment_name}_plots")
+    
+    def _associate_and_align(self, segment_path: Path, traj_ref: PoseTrajectory3D,
+                             traj_est: PoseTrajectory3D) -> tuple:
+        """
+        Associate the trajectories in place and align the estimate to the reference.
+        
+        Returns:
+            tuple: (AlignmentTransform, aligned Nx3 positions, aligned Nx4 wxyz orientations)
+            
+        Raises:
+            ValueError: If no valid pose pairs are found
+        """
+        # Associate trajectories by index, reducing them in place without copies
+        trajectory_config = self.config.get('analysis', 'trajectory', default={})
+        time_offset = trajectory_config.get('time_offset', 0.0)
+        if trajectory_config.get('estimate_time_offset', False):
+            time_offset = estimate_time_offset(
+                traj_ref.timestamps, traj_ref.positions_xyz,
+                traj_est.timestamps, traj_est.positions_xyz,
+                max_offset=trajectory_config.get('max_time_offset', 1.0)
+            )
+            self.logger.info(f"Estimated time offset: {time_offset:.3f}s")
+        with span('association', traj_ref.num_poses + traj_est.num_poses, segment=segment_path.name):
+            ref_ids, est_ids = associate(traj_ref.timestamps, traj_est.timestamps,
+                                         trajectory_config.get('max_association_diff', DEFAULT_MAX_ASSOCIATION_DIFF),
+                                         offset_2=time_offset)
+        
+        # Log trajectory information
+        self.logger.info(f"Reference trajectory: {len(ref_ids)} of {traj_ref.num_poses} poses associated")
+        self.logger.info(f"Estimated trajectory: {len(est_ids)} of {traj_est.num_poses} poses associated")
+        
+        if len(ref_ids) == 0:
+            raise ValueError("No valid pose pairs found after association")
+        traj_ref.reduce_to_ids(ref_ids)
+        traj_est.reduce_to_ids(est_ids)
+
+        # Umeyama alignment with scale correction, applied to the arrays APE needs
+        with span('alignment', len(ref_ids), segment=segment_path.name):
+            alignment = align_positions(traj_est.positions_xyz, traj_ref.positions_xyz,
+                                        correct_scale=True, n=-1)
+            aligned_xyz = alignment.apply_positions(traj_est.positions_xyz)
+            aligned_wxyz = alignment.apply_orientations(traj_est.orientations_quat_wxyz)
+        return alignment, aligned_xyz, aligned_wxyz
+    
+    def _cache_keys(self, traj_ref: PoseTrajectory3D, traj_est: PoseTrajectory3D) -> tuple:
+        """
+        Cache keys of the metrics and of the plots of a trajectory pair.
+        
+        Returns:
+            tuple: (result key over poses, trajectory settings and version,
+                    plot key over the plot settings)
+        """
+        data_digest = hash_arrays(traj_ref.timestamps, traj_ref.positions_xyz, traj_ref.orientations_quat_wxyz,
+                                  traj_est.timestamps, traj_est.positions_xyz, traj_est.orientations_quat_wxyz)
+        trajectory_config = self.config.get('analysis', 'trajectory', default={})
+        settings = {key: trajectory_config.get(key) for key in CACHED_TRAJECTORY_SETTINGS}
+        settings["rpe"] = self.config.get('analysis', 'rpe')
+        plot_settings = {"max_points": self.config.get('output', 'plots', 'max_points')}
+        return (cache_key(data_digest, settings, ANALYSER_VERSION),
+                cache_key('', plot_settings, ANALYSER_VERSION))
+    
+    def _restore_cached(self, segment_path: Path, result_key: str, plot_key: str) -> dict:
+        """
+        Write a cached result into the segment.
+        
+        Returns:
+            tuple: (metrics for the segment, or None if the result is not
+                cached; True if plotting and the plots are not cached)
+        """
+        metrics_dict = self.cache.get_metrics(result_key)
+        if metrics_dict is None:
+            return None, False
+        plots_missing = False
+        if self.plot_mode != 'none':
+            plots_prefix = f"{segment_path.name}_plots"
+            plots_missing = not (self.cache.has_plots(result_key, plot_key) and
+                                 self.cache.restore_plots(result_key, plot_key, segment_path / 'plots',
+                                                          plots_prefix))
+        metrics_dict["segment_id"] = segment_path.name
+        self._save_metrics(segment_path, metrics_dict)
+        self.logger.info(f"Restored {segment_path.name} from cache entry {result_key}")
+        return metrics_dict, plots_missing
+    
+    def _save_metrics(self, segment_path: Path, metrics_dict: dict):
+        (segment_path / 'metrics').mkdir(parents=True, exist_ok=True)
         metrics_path = segment_path / 'metrics' /f"{segment_path.name}_metrics.json"
         with open(metrics_path, 'w') as f:
             json.dump(metrics_dict, f, indent=4)
+    
+    def _load_trajectories(self, segment_path: Path) -> tuple:
+        """
+        Load the reference and estimated trajectories of a segment.
         
-        # Generate plots with error colormapping
-        self._generate_plots(traj_ref, traj_est, traj_est_aligned, 
-                            ate, rpe, segment_path.name, plots_dir)
-        
-        return metrics_dict
+        Returns:
+            tuple: (reference, estimate) as PoseTrajectory3D
+        """
+        poses_dir = segment_path / 'poses'
+        with span('load', segment=segment_path.name) as load_span:
+            traj_est = self._load_trajectory(
+                poses_dir / pose_filename(self.config.get('topics', 'estimated'), suffix=''))
+            traj_ref = self._load_trajectory(
+                poses_dir / pose_filename(self.config.get('topics', 'reference'), suffix=''))
+            load_span.add(traj_est.num_poses + traj_ref.num_poses)
+        return traj_ref, traj_est
     
-    def _generate_plots(self, traj_ref, traj_est, traj_est_aligned, 
-                       ate_metric, rpe_metric, segment_name: str, plots_dir: Path):
+    def _load_trajectory(self, pose_path: Path) -> PoseTrajectory3D:
         """
-        Generate and save visualization plots with error colormapping.
+        Load a trajectory from its binary pose store, or from TUM text.
         
         Args:
-            traj_ref: Reference trajectory
-            traj_est: Estimated trajectory
-            traj_est_aligned: Aligned estimated trajectory
-            ate_metric: Absolute trajectory error metric
-            rpe_metric: Relative pose error metric
-            segment_name (str): Name of the segment
-            plots_dir (Path): Directory to save plots
-        """
-        plot_collection = evo.tools.plot.PlotCollection("Trajectory Analysis")
-        
-        # 3D trajectory plots
-        fig = plt.figure(figsize=(12, 8))
-        plot_mode = plot.PlotMode.xyz
-        
-        # Original trajectories
-        ax = plot.prepare_axis(fig, plot_mode, subplot_arg=221)
-        ax.set_title("Original Trajectories")
-        plot.traj(ax, plot_mode, traj_ref, '--', 'gray', 'reference')
-        plot.traj(ax, plot_mode, traj_est, '-', 'blue', 'estimated')
-        
-        # Aligned trajectories
-        ax = plot.prepare_axis(fig, plot_mode, subplot_arg=222)
-        ax.set_title("Aligned Trajectories")
-        plot.traj(ax, plot_mode, traj_ref, '--', 'gray', 'reference')
-        plot.traj(ax, plot_mode, traj_est_aligned, '-', 'blue', 'estimated (aligned)')
-        
-        plot_collection.add_figure("Trajectories Comparison", fig)
-        
-        # Top view with APE colormapping
-        fig_top = plt.figure()
-        ax = plot.prepare_axis(fig_top, plot.PlotMode.xy)
-        plot_collection.add_figure("Top View (APE)", fig_top)
-        plot.traj(ax, plot.PlotMode.xy, traj_ref, '--', 'gray', 'reference')
-        plot.traj_colormap(ax, traj_est_aligned, ate_metric.error, 
-                          plot.PlotMode.xy,
-                          min_map=ate_metric.get_all_statistics()["min"],
-                          max_map=ate_metric.get_all_statistics()["max"],
-                          title="APE Colormapping")
-        
-        # RPE plot
-        fig_rpe = plt.figure()
-        ax = fig_rpe.add_subplot(111)
-        plot_collection.add_figure("RPE Over Time", fig_rpe)
-        seconds_from_start = [t - traj_est.timestamps[0] for t in traj_est.timestamps[1:]]
-        plot.error_array(ax, rpe_metric.error, 
-                        x_array=seconds_from_start,
-                        statistics={s:v for s,v in rpe_metric.get_all_statistics().items() 
-                                  if s != "sse"},
-                        name="RPE", 
-                        title="RPE w.r.t. " + rpe_metric.pose_relation.value,
-                        xlabel="t (s)")
-        
-        # Add RMSE plot
-        fig_rmse = plt.figure(figsize=(10, 6))
-        ax = fig_rmse.add_subplot(111)
-        plot_collection.add_figure("RMSE Analysis", fig_rmse)
-        
-        # Calculate timestamps in seconds
-        timestamps = [t - traj_est.timestamps[0] for t in traj_est.timestamps]
-        
-        # Plot cumulative RMSE
-        cumulative_rmse = np.sqrt(np.cumsum(ate_metric.error ** 2) / 
-                                 np.arange(1, len(ate_metric.error) + 1))
-        
-        ax.plot(timestamps, cumulative_rmse, 
-                label=f'Cumulative RMSE (final: {cumulative_rmse[-1]:.3f}m)')
-        ax.set_xlabel('Time (s)')
-        ax.set_ylabel('RMSE (m)')
-        ax.set_title('Cumulative RMSE Over Time')
-        ax.grid(True)
-        ax.legend()
+            pose_path (Path): Pose file path without suffix
+            
+        Returns:
+            PoseTrajectory3D: Loaded trajectory
+        """
+        store_path = pose_path.with_suffix(POSE_STORE_SUFFIX)
+        if store_path.exists():
+            return trajectory_from_poses(load_poses(store_path))
+        # Only needed for TUM text pose files
+        from evo.tools import file_interface
+        return file_interface.read_tum_trajectory_file(str(pose_path.with_suffix('.txt')))
 
-        # Add ATE plot
-        fig_ate = plt.figure(figsize=(10, 6))
-        ax = fig_ate.add_subplot(111)
-        plot_collection.add_figure("ATE Analysis", fig_ate)
-        
-        # Plot ATE over time
-        timestamps = [t - traj_est.timestamps[0] for t in traj_est.timestamps]
-        ax.plot(timestamps, ate_metric.error, 'b-', label='ATE')
-        ax.set_xlabel('Time (s)')
-        ax.set_ylabel('ATE (m)')
-        ax.set_title('Absolute Trajectory Error Over Time')
-        
-        # Add horizontal line for mean ATE
-        mean_ate = ate_metric.get_all_statistics()["mean"]
-        ax.axhline(y=mean_ate, color='r', linestyle='--', 
-                   label=f'Mean ATE: {mean_ate:.3f}m')
-        
-        ax.grid(True)
-        ax.legend()
+def trajectory_from_poses(poses: np.ndarray) -> PoseTrajectory3D:
+    """
+    Build an evo trajectory from an Nx8 pose array in TUM column order.
+    
+    Args:
+        poses (np.ndarray): Columns timestamp, x, y, z, qx, qy, qz, qw
+        
+    Returns:
+        PoseTrajectory3D: Trajectory with evo's wxyz quaternion convention
+    """
+    return PoseTrajectory3D(
+        positions_xyz=np.array(poses[:, 1:4]),
+        orientations_quat_wxyz=np.array(poses[:, [7, 4, 5, 6]]),
+        timestamps=np.array(poses[:, 0])
+    )
 
-        # Save all plots
-        plot_collection.export(
-            plots_dir / f"{segment_name}_plots",
-            confirm_overwrite=True
-        )
\ No newline at end of file
+def _tum_poses(timestamps: np.ndarray, positions_xyz: np.ndarray,
+               orientations_wxyz: np.ndarray) -> np.ndarray:
+    """
+    Pack trajectory arrays into an Nx8 array in TUM column order.
+    """
+    return np.column_stack([timestamps, positions_xyz, orientations_wxyz[:, [1, 2, 3, 0]]])
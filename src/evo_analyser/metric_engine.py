@@ -0,0 +1,259 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+from dataclasses import dataclass
+import numpy as np
+
+@dataclass
+class TrajectoryErrors:
+    """
+    Per-pose error series of an associated trajectory pair.
+
+    Attributes:
+        ape_trans (np.ndarray): APE translation error per pose in metres
+        ape_rot (np.ndarray): APE rotation angle per pose in degrees
+        rpe_trans (np.ndarray): RPE translation error per pose pair in metres
+        rpe_rot (np.ndarray): RPE rotation angle per pose pair in degrees
+    """
+    ape_trans: np.ndarray
+    ape_rot: np.ndarray
+    rpe_trans: np.ndarray
+    rpe_rot: np.ndarray
+
+    def statistics(self) -> dict:
+        """
+        Summary statistics of every series, each computed once.
+
+        Returns:
+            dict: Series name mapped to its error_statistics dict
+        """
+        return {
+            "ape_trans": error_statistics(self.ape_trans),
+            "ape_rot": error_statistics(self.ape_rot),
+            "rpe_trans": error_statistics(self.rpe_trans),
+            "rpe_rot": error_statistics(self.rpe_rot),
+        }
+
+def compute_errors(ref_xyz: np.ndarray, ref_wxyz: np.ndarray, est_xyz: np.ndarray,
+                   est_wxyz: np.ndarray, aligned_xyz: np.ndarray = None,
+                   aligned_wxyz: np.ndarray = None, delta: int = 1) -> TrajectoryErrors:
+    """
+    Compute APE and RPE translation and rotation errors in one vectorised pass.
+
+    Matches evo's metrics.APE and metrics.RPE (frame delta, consecutive pairs)
+    with PoseRelation.translation_part and rotation_angle_deg, but works on
+    contiguous position and quaternion arrays instead of lists of SE(3)
+    matrices.
+
+    Args:
+        ref_xyz (np.ndarray): Nx3 reference positions
+        ref_wxyz (np.ndarray): Nx4 reference orientations (w, x, y, z)
+        est_xyz (np.ndarray): Nx3 estimated positions, associated with the reference
+        est_wxyz (np.ndarray): Nx4 estimated orientations (w, x, y, z)
+        aligned_xyz (np.ndarray, optional): Nx3 aligned estimate positions used
+            for APE. Defaults to est_xyz.
+        aligned_wxyz (np.ndarray, optional): Nx4 aligned estimate orientations
+            used for APE. Defaults to est_wxyz.
+        delta (int): RPE frame delta. Defaults to 1.
+
+    Returns:
+        TrajectoryErrors: APE series of length N and RPE series of length N - delta
+
+    Raises:
+        ValueError: If the arrays do not describe the same number of poses
+    """
+    ref_xyz = np.asarray(ref_xyz, dtype=np.float64)
+    est_xyz = np.asarray(est_xyz, dtype=np.float64)
+    ref_q = _normalise(ref_wxyz)
+    est_q = _normalise(est_wxyz)
+    aligned_xyz = est_xyz if aligned_xyz is None else np.asarray(aligned_xyz, dtype=np.float64)
+    aligned_q = est_q if aligned_wxyz is None else _normalise(aligned_wxyz)
+    if not (len(ref_xyz) == len(est_xyz) == len(aligned_xyz) == len(ref_q) == len(est_q) == len(aligned_q)):
+        raise ValueError("Reference and estimate must have the same number of poses")
+
+    # APE: E = inv(ref) * est; translation norm is rotation invariant
+    ape_trans = np.linalg.norm(aligned_xyz - ref_xyz, axis=1)
+    ape_rot = _angle_deg(quaternion_multiply(_quat_conjugate(ref_q), aligned_q))
+
+    # RPE: E = inv(inv(ref_i) * ref_j) * inv(est_i) * est_j
+    i, j = slice(None, -delta or None), slice(delta, None)
+    ref_rel_q, ref_rel_t = _relative(ref_q[i], ref_xyz[i], ref_q[j], ref_xyz[j])
+    est_rel_q, est_rel_t = _relative(est_q[i], est_xyz[i], est_q[j], est_xyz[j])
+    rpe_trans = np.linalg.norm(est_rel_t - ref_rel_t, axis=1)
+    rpe_rot = _angle_deg(quaternion_multiply(_quat_conjugate(ref_rel_q), est_rel_q))
+
+    return TrajectoryErrors(ape_trans, ape_rot, rpe_trans, rpe_rot)
+
+def path_distances(xyz: np.ndarray) -> np.ndarray:
+    """
+    Cumulative path length at every pose, starting at 0.
+
+    Args:
+        xyz (np.ndarray): Nx3 positions
+
+    Returns:
+        np.ndarray: Non-decreasing distances of length N
+    """
+    steps = np.linalg.norm(np.diff(np.asarray(xyz, dtype=np.float64), axis=0), axis=1)
+    return np.concatenate([[0.0], np.cumsum(steps)])
+
+def delta_pairs(values: np.ndarray, delta: float, stride: int = 1) -> tuple:
+    """
+    Pose pairs (i, j) where j is the first pose at least delta beyond i.
+
+    values is a non-decreasing axis such as path_distances or timestamps, so
+    each partner is found by binary search instead of comparing all pairs.
+
+    Args:
+        values (np.ndarray): Non-decreasing distance or time of every pose
+        delta (float): Required increase of values from i to j
+        stride (int): Use every stride-th pose as a pair start. Defaults to 1.
+
+    Returns:
+        tuple: (first indices, second indices) of the pairs whose second pose exists
+    """
+    values = np.asarray(values, dtype=np.float64)
+    first = np.arange(0, len(values), max(1, int(stride)))
+    second = np.searchsorted(values, values[first] + delta, side='left')
+    keep = second < len(values)
+    return first[keep], second[keep]
+
+def relative_pose_errors(ref_xyz: np.ndarray, ref_wxyz: np.ndarray, est_xyz: np.ndarray,
+                         est_wxyz: np.ndarray, first: np.ndarray, second: np.ndarray) -> tuple:
+    """
+    RPE translation and rotation errors of arbitrary pose pairs, in one batch.
+
+    Uses the same relation as compute_errors: E = inv(inv(ref_i) * ref_j) * inv(est_i) * est_j.
+
+    Args:
+        ref_xyz (np.ndarray): Nx3 reference positions
+        ref_wxyz (np.ndarray): Nx4 reference orientations (w, x, y, z)
+        est_xyz (np.ndarray): Nx3 estimated positions, associated with the reference
+        est_wxyz (np.ndarray): Nx4 estimated orientations (w, x, y, z)
+        first (np.ndarray): Indices of the first pose of each pair
+        second (np.ndarray): Indices of the second pose of each pair
+
+    Returns:
+        tuple: (translation errors in metres, rotation angles in degrees), one per pair
+    """
+    ref_xyz = np.asarray(ref_xyz, dtype=np.float64)
+    est_xyz = np.asarray(est_xyz, dtype=np.float64)
+    ref_q = _normalise(ref_wxyz)
+    est_q = _normalise(est_wxyz)
+    ref_rel_q, ref_rel_t = _relative(ref_q[first], ref_xyz[first], ref_q[second], ref_xyz[second])
+    est_rel_q, est_rel_t = _relative(est_q[first], est_xyz[first], est_q[second], est_xyz[second])
+    trans = np.linalg.norm(est_rel_t - ref_rel_t, axis=1)
+    rot = _angle_deg(quaternion_multiply(_quat_conjugate(ref_rel_q), est_rel_q))
+    return trans, rot
+
+def delta_rpe(ref_xyz: np.ndarray, ref_wxyz: np.ndarray, est_xyz: np.ndarray, est_wxyz: np.ndarray,
+              timestamps: np.ndarray, distance_deltas: list = (), time_deltas: list = (),
+              stride: int = 1) -> dict:
+    """
+    RPE over distance deltas (KITTI style) and time deltas.
+
+    Pairs start at every stride-th pose and end at the first pose whose
+    reference path length (or timestamp) is at least the delta further on.
+    Finding the pairs costs O(n log n) per delta instead of the O(n^2) of
+    evaluating all pairs. For distance deltas the drift is also reported
+    relative to the delta, as in the KITTI odometry benchmark.
+
+    Args:
+        ref_xyz (np.ndarray): Nx3 reference positions
+        ref_wxyz (np.ndarray): Nx4 reference orientations (w, x, y, z)
+        est_xyz (np.ndarray): Nx3 estimated positions, associated with the reference
+        est_wxyz (np.ndarray): Nx4 estimated orientations (w, x, y, z)
+        timestamps (np.ndarray): Timestamps of the associated pairs in seconds
+        distance_deltas (list): Deltas in metres of reference path length
+        time_deltas (list): Deltas in seconds
+        stride (int): Use every stride-th pose as a pair start. Defaults to 1.
+
+    Returns:
+        dict: Label such as '100m' or '10s' mapped to pairs, translation and
+              rotation error statistics, and for distance deltas
+              trans_drift_pct and rot_drift_deg_per_100m
+    """
+    results = {}
+    distances = path_distances(ref_xyz) if len(distance_deltas) else None
+    for delta, unit in [(d, 'm') for d in distance_deltas] + [(d, 's') for d in time_deltas]:
+        first, second = delta_pairs(distances if unit == 'm' else timestamps, delta, stride)
+        trans, rot = relative_pose_errors(ref_xyz, ref_wxyz, est_xyz, est_wxyz, first, second)
+        trans_stats, rot_stats = error_statistics(trans), error_statistics(rot)
+        entry = {
+            "pairs": int(len(first)),
+            "trans_rmse": trans_stats["rmse"],
+            "trans_mean": trans_stats["mean"],
+            "trans_median": trans_stats["median"],
+            "trans_max": trans_stats["max"],
+            "rot_rmse": rot_stats["rmse"],
+            "rot_mean": rot_stats["mean"],
+        }
+        if unit == 'm':
+            entry["trans_drift_pct"] = trans_stats["mean"] / delta * 100.0
+            entry["rot_drift_deg_per_100m"] = rot_stats["mean"] / delta * 100.0
+        results[f"{delta:g}{unit}"] = entry
+    return results
+
+def error_statistics(errors: np.ndarray) -> dict:
+    """
+    Statistics of an error series with the keys of evo's get_all_statistics().
+
+    Args:
+        errors (np.ndarray): Error values
+
+    Returns:
+        dict: rmse, mean, median, std, min, max and sse as floats
+    """
+    errors = np.asarray(errors, dtype=np.float64)
+    if errors.size == 0:
+        return {key: float('nan') for key in ("rmse", "mean", "median", "std", "min", "max", "sse")}
+    sse = float(np.dot(errors, errors))
+    return {
+        "rmse": float(np.sqrt(sse / errors.size)),
+        "mean": float(errors.mean()),
+        "median": float(np.median(errors)),
+        "std": float(errors.std()),
+        "min": float(errors.min()),
+        "max": float(errors.max()),
+        "sse": sse,
+    }
+
+def _normalise(quats: np.ndarray) -> np.ndarray:
+    quats = np.asarray(quats, dtype=np.float64)
+    return quats / np.linalg.norm(quats, axis=1, keepdims=True)
+
+def _quat_conjugate(q: np.ndarray) -> np.ndarray:
+    return q * np.array([1.0, -1.0, -1.0, -1.0])
+
+def quaternion_multiply(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Hamilton product of Nx4 (w, x, y, z) quaternion arrays.
+    """
+    aw, ax, ay, az = a.T
+    bw, bx, by, bz = b.T
+    return np.column_stack([
+        aw * bw - ax * bx - ay * by - az * bz,
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+    ])
+
+def _quat_rotate(q: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """
+    Rotate Nx3 vectors by Nx4 unit quaternions.
+    """
+    w, u = q[:, :1], q[:, 1:]
+    uv = np.cross(u, v)
+    return v + 2.0 * (w * uv + np.cross(u, uv))
+
+def _relative(q_i: np.ndarray, t_i: np.ndarray, q_j: np.ndarray, t_j: np.ndarray) -> tuple:
+    """
+    Relative poses inv(P_i) * P_j as (quaternions, translations).
+    """
+    q_i_inv = _quat_conjugate(q_i)
+    return quaternion_multiply(q_i_inv, q_j), _quat_rotate(q_i_inv, t_j - t_i)
+
+def _angle_deg(q: np.ndarray) -> np.ndarray:
+    """
+    Rotation angle of unit quaternions in degrees, in [0, 180].
+    """
+    return np.degrees(2.0 * np.arctan2(np.linalg.norm(q[:, 1:], axis=1), np.abs(q[:, 0])))
@@ -0,0 +1,351 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+from collections import deque
+from pathlib import Path
+import heapq
+import json
+import logging
+import numpy as np
+from src.evo_analyser.association import DEFAULT_MAX_ASSOCIATION_DIFF, associate
+from src.evo_analyser.metric_engine import compute_errors
+from src.utils.pose_store import POSE_STORE_SUFFIX, load_poses, pose_filename
+from src.utils.prepare_directories import segment_dirs
+
+MULTISCALE_FILENAME = 'multiscale_windows.json'
+HEATMAP_FILENAME = 'multiscale_heatmap.png'
+
+# Per-window metrics; all but the counts come from prefix sums or sliding heaps
+WINDOW_METRICS = ('poses', 'ate_rmse', 'alignment_scale', 'rpe_rmse', 'rpe_mean', 'rpe_median',
+                  'rpe_max', 'rpe_rot_rmse', 'trajectory_length')
+
+def load_run_poses(output_dir: Path, topic: str) -> np.ndarray:
+    """
+    Concatenate a topic's pose stores over all segments of a run.
+
+    Args:
+        output_dir (Path): Output directory holding the segment directories
+        topic (str): Pose topic name
+
+    Returns:
+        np.ndarray: Nx8 poses of the whole run in TUM column order
+    """
+    chunks = []
+    for segment_path in segment_dirs(output_dir):
+        store_path = segment_path / 'poses' / pose_filename(topic, suffix=POSE_STORE_SUFFIX)
+        if store_path.exists():
+            chunks.append(load_poses(store_path))
+    return np.concatenate(chunks) if chunks else np.empty((0, 8))
+
+class MultiScaleAnalysis:
+    """
+    Error statistics of sliding windows at several lengths over one associated run.
+
+    The run is associated once. Every per-window statistic is then read
+    from cumulative sums over the poses, so a scale costs O(n) plus one
+    batched 3x3 SVD per window, whatever the window length:
+
+    - ATE RMSE after a per-window Sim(3) Umeyama alignment, as in segment
+      analysis, from prefix sums of the alignment moments;
+    - RPE translation RMSE and mean, RPE rotation RMSE and path length, from
+      prefix sums of the consecutive-pair series;
+    - RPE median and maximum, from heaps that slide over the series.
+
+    Attributes:
+        timestamps (np.ndarray): Reference timestamps of the associated pairs
+        est_xyz (np.ndarray): Nx3 associated estimated positions
+        ref_xyz (np.ndarray): Nx3 associated reference positions
+        rpe_trans (np.ndarray): RPE translation error of consecutive pairs
+        rpe_rot (np.ndarray): RPE rotation angle of consecutive pairs in degrees
+    """
+
+    def __init__(self, est_poses: np.ndarray, ref_poses: np.ndarray,
+                 max_diff: float = DEFAULT_MAX_ASSOCIATION_DIFF, time_offset: float = 0.0):
+        ref_ids, est_ids = associate(ref_poses[:, 0], est_poses[:, 0], max_diff, offset_2=time_offset)
+        ref, est = ref_poses[ref_ids], est_poses[est_ids]
+        self.timestamps = ref[:, 0]
+        self.est_xyz = est[:, 1:4]
+        self.ref_xyz = ref[:, 1:4]
+        errors = compute_errors(ref[:, 1:4], ref[:, [7, 4, 5, 6]], est[:, 1:4], est[:, [7, 4, 5, 6]])
+        self.rpe_trans = errors.rpe_trans
+        self.rpe_rot = errors.rpe_rot
+        self.logger = logging.getLogger(__name__)
+        self._prefix = self._prefix_sums()
+
+    def _prefix_sums(self) -> dict:
+        """
+        Cumulative sums with a leading zero, so sum(x[lo:hi]) = p[hi] - p[lo].
+        """
+        def cumulative(values):
+            return np.concatenate([np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis=0)])
+
+        # Relative to the first pair, which keeps the second moments small on map coordinates
+        est = self.est_xyz - self.est_xyz[0] if len(self.est_xyz) else self.est_xyz
+        ref = self.ref_xyz - self.ref_xyz[0] if len(self.ref_xyz) else self.ref_xyz
+        steps = np.linalg.norm(np.diff(self.ref_xyz, axis=0), axis=1)
+        return {
+            "est": cumulative(est),
+            "ref": cumulative(ref),
+            "est_est": cumulative(np.einsum('ij,ij->i', est, est)),
+            "ref_ref": cumulative(np.einsum('ij,ij->i', ref, ref)),
+            "ref_est": cumulative(np.einsum('ij,ik->ijk', ref, est)),
+            "rpe": cumulative(self.rpe_trans),
+            "rpe_sq": cumulative(self.rpe_trans ** 2),
+            "rpe_rot_sq": cumulative(self.rpe_rot ** 2),
+            "length": cumulative(steps),
+        }
+
+    def window_bounds(self, window: float, stride: float) -> tuple:
+        """
+        Pose index ranges of full windows starting every stride seconds.
+
+        Args:
+            window (float): Window length in seconds
+            stride (float): Seconds between window starts
+
+        Returns:
+            tuple: (start times, end times, first pose indices, end pose indices)
+        """
+        if len(self.timestamps) == 0 or self.timestamps[-1] - self.timestamps[0] < window:
+            empty = np.empty(0)
+            return empty, empty, empty.astype(int), empty.astype(int)
+        count = int(np.floor((self.timestamps[-1] - self.timestamps[0] - window) / stride + 1e-9)) + 1
+        starts = self.timestamps[0] + stride * np.arange(count)
+        ends = starts + window
+        lo = np.searchsorted(self.timestamps, starts, side='left')
+        hi = np.searchsorted(self.timestamps, ends, side='left')
+        return starts, ends, lo, hi
+
+    def evaluate(self, window: float, stride: float) -> dict:
+        """
+        Statistics of every window of one length.
+
+        Args:
+            window (float): Window length in seconds
+            stride (float): Seconds between window starts
+
+        Returns:
+            dict: window, stride and one array per entry of WINDOW_METRICS,
+                  plus the window start and end times; windows with fewer than
+                  three pairs have NaN statistics
+        """
+        starts, ends, lo, hi = self.window_bounds(window, stride)
+        p = self._prefix
+        n = (hi - lo).astype(np.float64)
+        pairs = np.maximum(hi - lo - 1, 0)
+        pair_hi = lo + pairs
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # Umeyama moments of each window
+            mean_est = (p["est"][hi] - p["est"][lo]) / n[:, None]
+            mean_ref = (p["ref"][hi] - p["ref"][lo]) / n[:, None]
+            var_est = (p["est_est"][hi] - p["est_est"][lo]) / n - np.einsum('ij,ij->i', mean_est, mean_est)
+            var_ref = (p["ref_ref"][hi] - p["ref_ref"][lo]) / n - np.einsum('ij,ij->i', mean_ref, mean_ref)
+            cov = ((p["ref_est"][hi] - p["ref_est"][lo]) / n[:, None, None]
+                   - np.einsum('ij,ik->ijk', mean_ref, mean_est))
+            valid = n >= 3
+            trace_ds = np.full(len(n), np.nan)
+            if valid.any():
+                u, d, vt = np.linalg.svd(cov[valid])
+                # Reflection correction of the rotation, as in AlignmentAccumulator.solve
+                sign = np.sign(np.linalg.det(u) * np.linalg.det(vt))
+                trace_ds[valid] = d[:, 0] + d[:, 1] + sign * d[:, 2]
+            scale = trace_ds / var_est
+            # Minimum of mean |scale * R * x + t - y|^2 over the similarity transform
+            ate_mse = var_ref - trace_ds ** 2 / var_est
+
+            rpe_mean = (p["rpe"][pair_hi] - p["rpe"][lo]) / pairs
+            rpe_rmse = np.sqrt((p["rpe_sq"][pair_hi] - p["rpe_sq"][lo]) / pairs)
+            rpe_rot_rmse = np.sqrt((p["rpe_rot_sq"][pair_hi] - p["rpe_rot_sq"][lo]) / pairs)
+        rpe_median, rpe_max = sliding_median_max(self.rpe_trans, lo, pair_hi)
+
+        invalid = ~valid
+        result = {
+            "window": float(window),
+            "stride": float(stride),
+            "start": starts,
+            "end": ends,
+            "poses": hi - lo,
+            "ate_rmse": np.where(invalid, np.nan, np.sqrt(np.maximum(ate_mse, 0.0))),
+            "alignment_scale": np.where(invalid, np.nan, scale),
+            "rpe_rmse": np.where(invalid, np.nan, rpe_rmse),
+            "rpe_mean": np.where(invalid, np.nan, rpe_mean),
+            "rpe_median": np.where(invalid, np.nan, rpe_median),
+            "rpe_max": np.where(invalid, np.nan, rpe_max),
+            "rpe_rot_rmse": np.where(invalid, np.nan, rpe_rot_rmse),
+            "trajectory_length": p["length"][pair_hi] - p["length"][lo],
+        }
+        self.logger.info(f"Evaluated {len(starts)} windows of {window:g}s every {stride:g}s")
+        return result
+
+    def evaluate_scales(self, windows: list, overlap: float = 0.5) -> list:
+        """
+        Evaluate several window lengths with the same relative overlap.
+
+        Args:
+            windows (list): Window lengths in seconds
+            overlap (float): Fraction of a window shared with the next one, in [0, 1)
+
+        Returns:
+            list: Result of evaluate for each window length
+        """
+        if not 0 <= overlap < 1:
+            raise ValueError(f"overlap must be in [0, 1), got {overlap}")
+        return [self.evaluate(window, window * (1 - overlap)) for window in windows]
+
+def sliding_median_max(values: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> tuple:
+    """
+    Median and maximum of values[lo[k]:hi[k]] for windows moving forward.
+
+    The median comes from two heaps holding the lower and upper half of the
+    current window, and the maximum from a deque of decreasing values. Values
+    leaving the window are dropped from the heaps lazily once they reach the
+    top, so each value is pushed and popped a bounded number of times and a
+    whole scale costs O(n log n) rather than O(n * window).
+
+    Args:
+        values (np.ndarray): Series the windows slide over
+        lo (np.ndarray): Non-decreasing window starts
+        hi (np.ndarray): Non-decreasing window ends (exclusive)
+
+    Returns:
+        tuple: (medians, maxima) as arrays, NaN for empty windows
+    """
+    medians = np.full(len(lo), np.nan)
+    maxima = np.full(len(lo), np.nan)
+    values = values.tolist()
+    in_lower = [False] * len(values)
+    # Heap entries are (value, index); the lower half is a max-heap of negated values
+    lower, upper, decreasing = [], [], deque()
+    lower_size = upper_size = 0
+    start = end = 0
+
+    def prune(heap):
+        while heap and heap[0][1] < start:
+            heapq.heappop(heap)
+
+    def move(source, target, to_lower):
+        value, index = heapq.heappop(source)
+        heapq.heappush(target, (-value, index))
+        in_lower[index] = to_lower
+        prune(source)
+
+    for k, (a, b) in enumerate(zip(lo.tolist(), hi.tolist())):
+        if a >= end:
+            # No overlap with the previous window
+            lower, upper, decreasing = [], [], deque()
+            lower_size = upper_size = 0
+            start = end = a
+        while start < a:
+            if in_lower[start]:
+                lower_size -= 1
+            else:
+                upper_size -= 1
+            start += 1
+        prune(lower)
+        prune(upper)
+        while decreasing and decreasing[0] < start:
+            decreasing.popleft()
+
+        while end < b:
+            value = values[end]
+            if lower and value <= -lower[0][0]:
+                heapq.heappush(lower, (-value, end))
+                in_lower[end] = True
+                lower_size += 1
+            else:
+                heapq.heappush(upper, (value, end))
+                upper_size += 1
+            while decreasing and values[decreasing[-1]] <= value:
+                decreasing.pop()
+            decreasing.append(end)
+            end += 1
+            # Keep the lower half equal to the upper half or one larger
+            if lower_size > upper_size + 1:
+                move(lower, upper, False)
+                lower_size, upper_size = lower_size - 1, upper_size + 1
+            elif upper_size > lower_size:
+                move(upper, lower, True)
+                lower_size, upper_size = lower_size + 1, upper_size - 1
+        # Removals can leave the halves unbalanced when nothing is inserted
+        while lower_size > upper_size + 1 or upper_size > lower_size:
+            if lower_size > upper_size:
+                move(lower, upper, False)
+                lower_size, upper_size = lower_size - 1, upper_size + 1
+            else:
+                move(upper, lower, True)
+                lower_size, upper_size = lower_size + 1, upper_size - 1
+
+        if lower_size:
+            middle = -lower[0][0]
+            medians[k] = middle if lower_size > upper_size else 0.5 * (middle + upper[0][0])
+            maxima[k] = values[decreasing[0]]
+    return medians, maxima
+
+def save_multiscale(output_dir: Path, results: list) -> Path:
+    """
+    Write the window statistics of every scale as JSON.
+
+    Args:
+        output_dir (Path): Output directory of the run
+        results (list): Results of MultiScaleAnalysis.evaluate
+
+    Returns:
+        Path: The written file
+    """
+    def to_json(value):
+        if isinstance(value, np.ndarray):
+            return [None if isinstance(v, float) and np.isnan(v) else v for v in value.tolist()]
+        return value
+
+    path = Path(output_dir) / MULTISCALE_FILENAME
+    with open(path, 'w') as f:
+        json.dump({"scales": [{key: to_json(value) for key, value in result.items()}
+                              for result in results]}, f, indent=4)
+    return path
+
+def plot_heatmap(results: list, metric: str, path: Path, resolution: int = 2000):
+    """
+    Heatmap of a window metric over time (x) and window length (y).
+
+    Each scale is resampled onto a common time grid, taking the value of
+    the window whose centre is nearest to each grid point.
+
+    Args:
+        results (list): Results of MultiScaleAnalysis.evaluate, one row each
+        metric (str): Entry of WINDOW_METRICS to colour by
+        path (Path): Destination image
+        resolution (int): Number of time grid points
+    """
+    from src.evo_analyser.plot_renderer import _plotting_modules
+    plt = _plotting_modules()[0]
+
+    results = [r for r in results if len(r["start"])]
+    if not results:
+        raise ValueError("No window is shorter than the run")
+    t0 = min(r["start"][0] for r in results)
+    t1 = max(r["end"][-1] for r in results)
+    grid = np.linspace(t0, t1, resolution)
+    rows = []
+    for result in results:
+        centres = (result["start"] + result["end"]) / 2
+        nearest = np.clip(np.searchsorted(centres, grid), 1, len(centres) - 1) if len(centres) > 1 \
+            else np.zeros(len(grid), dtype=int)
+        if len(centres) > 1:
+            nearest -= (grid - centres[nearest - 1]) < (centres[nearest] - grid)
+        row = np.asarray(result[metric], dtype=np.float64)[nearest]
+        # Blank the edges no window of this length is centred near
+        row[(grid < result["start"][0]) | (grid > result["end"][-1])] = np.nan
+        rows.append(row)
+
+    fig, ax = plt.subplots(figsize=(12, 1.2 + 0.6 * len(rows)), layout='constrained')
+    try:
+        image = ax.imshow(np.vstack(rows), aspect='auto', interpolation='nearest', origin='lower',
+                          extent=(0, t1 - t0, -0.5, len(rows) - 0.5))
+        ax.set_yticks(range(len(rows)))
+        ax.set_yticklabels([f"{r['window']:g}s" for r in results])
+        ax.set_xlabel('Time (s)')
+        ax.set_ylabel('Window')
+        ax.set_title(f"{metric} per window")
+        fig.colorbar(image, ax=ax, label=metric)
+        fig.savefig(path)
+    finally:
+        plt.close(fig)
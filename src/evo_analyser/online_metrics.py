@@ -0,0 +1,412 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+from pathlib import Path
+import json
+import numpy as np
+from src.evo_analyser.alignment import AlignmentTransform
+from src.evo_analyser.association import match_nearest
+from src.evo_analyser.metric_engine import compute_errors
+
+ONLINE_METRICS_FILENAME = 'online_metrics.json'
+
+class P2Quantile:
+    """
+    Streaming quantile estimate with the P-square algorithm (Jain & Chlamtac).
+
+    Five markers track the minimum, the maximum and three quantiles around
+    the target, so memory is constant regardless of the number of samples.
+
+    Attributes:
+        q (float): Target quantile in (0, 1)
+        count (int): Number of samples seen
+    """
+
+    def __init__(self, q: float = 0.5):
+        self.q = q
+        self.count = 0
+        self._heights = []
+        self._positions = np.arange(1.0, 6.0)
+        self._desired = np.array([1.0, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5.0])
+        self._increments = np.array([0.0, q / 2, q, (1 + q) / 2, 1.0])
+
+    def update(self, values: np.ndarray):
+        """
+        Add samples one by one.
+
+        Args:
+            values (np.ndarray): New samples
+        """
+        for x in np.asarray(values, dtype=np.float64).ravel():
+            self._add(float(x))
+
+    @property
+    def value(self) -> float:
+        """
+        Current quantile estimate, exact while fewer than five samples were seen.
+        """
+        if self.count == 0:
+            return float('nan')
+        if self.count < 5:
+            return float(np.quantile(self._heights, self.q))
+        return float(self._heights[2])
+
+    def _add(self, x: float):
+        self.count += 1
+        heights = self._heights
+        if self.count <= 5:
+            heights.append(x)
+            heights.sort()
+            return
+
+        # Find the cell of x, widening the extreme markers if needed
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= heights[k + 1]:
+                k += 1
+        self._positions[k + 1:] += 1
+        self._desired += self._increments
+
+        # Move the three middle markers towards their desired positions
+        positions = self._positions
+        for i in (1, 2, 3):
+            d = self._desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or \
+                    (d <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1.0 if d > 0 else -1.0
+                candidate = self._parabolic(i, step)
+                if not heights[i - 1] < candidate < heights[i + 1]:
+                    j = i + int(step)
+                    candidate = heights[i] + step * (heights[j] - heights[i]) / (positions[j] - positions[i])
+                heights[i] = candidate
+                positions[i] += step
+
+    def _parabolic(self, i: int, step: float) -> float:
+        h, n = self._heights, self._positions
+        return h[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+        )
+
+class RunningStats:
+    """
+    Constant-memory statistics of an error series fed in batches.
+
+    Mean and variance are merged per batch with Welford's/Chan's update, the
+    median is a P-square estimate and the remaining statistics are exact.
+
+    Attributes:
+        count (int): Number of values seen
+        mean (float): Running mean
+        min (float): Smallest value seen
+        max (float): Largest value seen
+        sse (float): Sum of squared values
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.sse = 0.0
+        self._m2 = 0.0
+        self._median = P2Quantile(0.5)
+
+    def update(self, values: np.ndarray):
+        """
+        Add a batch of values.
+
+        Args:
+            values (np.ndarray): New values
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+        batch_mean = values.mean()
+        batch_m2 = float(np.sum((values - batch_mean) ** 2))
+        total = self.count + values.size
+        delta = batch_mean - self.mean
+        self.mean += delta * values.size / total
+        self._m2 += batch_m2 + delta ** 2 * self.count * values.size / total
+        self.count = total
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.sse += float(np.dot(values, values))
+        self._median.update(values)
+
+    @property
+    def std(self) -> float:
+        """
+        Population standard deviation, as reported by evo.
+        """
+        return float(np.sqrt(self._m2 / self.count)) if self.count else float('nan')
+
+    def to_dict(self) -> dict:
+        """
+        Statistics with the keys of metric_engine.error_statistics.
+        """
+        if self.count == 0:
+            return {key: float('nan') for key in ("rmse", "mean", "median", "std", "min", "max", "sse")}
+        return {
+            "rmse": float(np.sqrt(self.sse / self.count)),
+            "mean": float(self.mean),
+            "median": self._median.value,
+            "std": self.std,
+            "min": self.min,
+            "max": self.max,
+            "sse": self.sse,
+        }
+
+class AlignmentAccumulator:
+    """
+    Sufficient statistics for a Umeyama alignment fitted at the end of a stream.
+
+    First and second moments of the associated positions are accumulated, so
+    the similarity transform and the RMSE of the aligned translation error
+    can be computed exactly once the segment is complete, without keeping the
+    poses. Positions are taken relative to the first pair to avoid losing
+    precision on large map coordinates.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._origin_est = None
+        self._origin_ref = None
+        self._sum_est = np.zeros(3)
+        self._sum_ref = np.zeros(3)
+        self._sum_est_est = 0.0
+        self._sum_ref_ref = 0.0
+        self._sum_ref_est = np.zeros((3, 3))
+
+    def update(self, est_xyz: np.ndarray, ref_xyz: np.ndarray):
+        """
+        Add associated position pairs.
+
+        Args:
+            est_xyz (np.ndarray): Nx3 estimated positions
+            ref_xyz (np.ndarray): Nx3 reference positions
+        """
+        if self._origin_est is None:
+            self._origin_est, self._origin_ref = est_xyz[0].copy(), ref_xyz[0].copy()
+        est_xyz = est_xyz - self._origin_est
+        ref_xyz = ref_xyz - self._origin_ref
+        self.count += len(est_xyz)
+        self._sum_est += est_xyz.sum(axis=0)
+        self._sum_ref += ref_xyz.sum(axis=0)
+        self._sum_est_est += float(np.sum(est_xyz * est_xyz))
+        self._sum_ref_ref += float(np.sum(ref_xyz * ref_xyz))
+        self._sum_ref_est += ref_xyz.T @ est_xyz
+
+    def solve(self, correct_scale: bool = True) -> tuple:
+        """
+        Fit the alignment of the estimate onto the reference.
+
+        Returns:
+            tuple: (AlignmentTransform, RMSE of the aligned translation error),
+                or (None, nan) with fewer than three pairs
+        """
+        if self.count < 3:
+            return None, float('nan')
+        n = self.count
+        mean_est, mean_ref = self._sum_est / n, self._sum_ref / n
+        var_est = self._sum_est_est / n - mean_est @ mean_est
+        var_ref = self._sum_ref_ref / n - mean_ref @ mean_ref
+        cov = self._sum_ref_est / n - np.outer(mean_ref, mean_est)
+
+        u, d, vt = np.linalg.svd(cov)
+        s = np.eye(3)
+        if np.linalg.det(u) * np.linalg.det(vt) < 0:
+            s[2, 2] = -1
+        rotation = u @ s @ vt
+        scale = float(np.trace(np.diag(d) @ s) / var_est) if correct_scale and var_est > 0 else 1.0
+        translation = (mean_ref + self._origin_ref) - scale * rotation @ (mean_est + self._origin_est)
+
+        # Mean squared error of scale * R * (x - mean_x) - (y - mean_y)
+        mse = scale ** 2 * var_est + var_ref - 2 * scale * np.trace(rotation.T @ cov)
+        return AlignmentTransform(rotation, translation, scale), float(np.sqrt(max(mse, 0.0)))
+
+class OnlineEvaluator:
+    """
+    Incremental ATE/RPE of an estimated pose topic against a reference topic.
+
+    Decoded pose batches of both topics are fed as they are read. Estimated
+    poses are associated with their nearest reference pose once the
+    reference stream has moved more than max_diff past them, so every match
+    is final. Only poses inside a buffer of buffer_duration seconds are kept,
+    and the statistics use constant memory.
+
+    Streaming cannot align the trajectories before computing errors, so the
+    ATE series is unaligned. The moments needed for the Umeyama alignment
+    are accumulated as well. When a segment closes, a final correction pass
+    reports the aligned ATE RMSE and the alignment scale.
+
+    Attributes:
+        est_topic (str): Estimated pose topic
+        ref_topic (str): Reference pose topic
+        max_diff (float): Largest association time difference in seconds
+        buffer_duration (float): Seconds of unmatched poses kept per topic
+    """
+
+    def __init__(self, est_topic: str, ref_topic: str, max_diff: float,
+                 buffer_duration: float = 5.0):
+        self.est_topic = est_topic
+        self.ref_topic = ref_topic
+        self.max_diff = max_diff
+        self.buffer_duration = max(buffer_duration, 2 * max_diff)
+        self._reset()
+
+    def update(self, topic: str, poses: np.ndarray):
+        """
+        Feed a batch of decoded poses.
+
+        Args:
+            topic (str): Topic of the poses; other topics are ignored
+            poses (np.ndarray): Nx8 poses in TUM column order, sorted by time
+        """
+        if topic == self.est_topic:
+            self._est = np.concatenate([self._est, poses])
+        elif topic == self.ref_topic:
+            self._ref = np.concatenate([self._ref, poses])
+        else:
+            return
+        self._associate(final=False)
+
+    def close_segment(self, segment_id: str) -> dict:
+        """
+        Match the remaining buffered poses and return the segment's metrics.
+
+        Args:
+            segment_id (str): Name of the closed segment
+
+        Returns:
+            dict: Running statistics of the segment; the evaluator is reset
+                for the next segment
+        """
+        self._associate(final=True)
+        if self._held is not None:
+            self._update_stats(self._held[0], self._held[1])
+        alignment, aligned_rmse = self._alignment.solve()
+        stats = {name: series.to_dict() for name, series in self._stats.items()}
+        result = {"segment_id": segment_id}
+        for name, prefix in (("ape_trans", "ate"), ("ape_rot", "ate_rot"),
+                             ("rpe_trans", "rpe"), ("rpe_rot", "rpe_rot")):
+            for key in ("rmse", "mean", "median", "std", "min", "max"):
+                result[f"{prefix}_{key}"] = stats[name][key]
+        result.update({
+            "alignment": "none",
+            "aligned_ate_rmse": aligned_rmse,
+            "alignment_scale": alignment.scale if alignment is not None else float('nan'),
+            "matched_poses": self._stats["ape_trans"].count,
+            "dropped_poses": self._dropped,
+        })
+        self._reset()
+        return result
+
+    def _reset(self):
+        self._est = np.empty((0, 8))
+        self._ref = np.empty((0, 8))
+        self._previous = None
+        self._held = None  # (estimated pose, reference pose, time difference)
+        self._dropped = 0
+        self._alignment = AlignmentAccumulator()
+        self._stats = {name: RunningStats() for name in ("ape_trans", "ape_rot", "rpe_trans", "rpe_rot")}
+
+    def _associate(self, final: bool):
+        """
+        Match buffered estimated poses whose nearest reference pose is known.
+        """
+        if len(self._ref) == 0:
+            if final:
+                self._dropped += len(self._est)
+                self._est = self._est[:0]
+            return
+        horizon = np.inf if final else self._ref[-1, 0] - self.max_diff
+        ready = int(np.searchsorted(self._est[:, 0], horizon, side='right'))
+        if ready:
+            self._match(self._est[:ready])
+            self._est = self._est[ready:]
+
+        # Bound the buffers to buffer_duration behind the newest pose of either topic,
+        # e.g. when one topic stalls
+        latest = max(self._ref[-1, 0], self._est[-1, 0] if len(self._est) else -np.inf)
+        stale = int(np.searchsorted(self._est[:, 0], latest - self.buffer_duration))
+        self._dropped += stale
+        self._est = self._est[stale:]
+        # References older than this cannot be the nearest match of a pending estimate
+        keep_from = latest - self.buffer_duration
+        if len(self._est):
+            keep_from = min(keep_from, self._est[0, 0] - self.max_diff)
+        self._ref = self._ref[np.searchsorted(self._ref[:, 0], keep_from):]
+
+    def _match(self, est: np.ndarray):
+        """
+        Associate estimated poses with the buffered references and update the statistics.
+
+        Matching is one-to-one as in association.associate: a reference pose
+        claimed by several estimates goes to the closest one. The last pair
+        is held back until the next batch shows whether a closer estimate
+        claims its reference.
+        """
+        ref_times = self._ref[:, 0]
+        est_idx, ref_idx = match_nearest(est[:, 0], ref_times, self.max_diff)
+        order = np.argsort(est_idx, kind='stable')
+        est_idx, ref_idx = est_idx[order], ref_idx[order]
+        diffs = np.abs(ref_times[ref_idx] - est[est_idx, 0])
+        self._dropped += len(est) - len(est_idx)
+        est, ref = est[est_idx], self._ref[ref_idx]
+
+        # A reference shared with the held pair goes to the closer stamp, the earlier one on ties
+        if self._held is not None and len(ref) and ref[0, 0] == self._held[1][0, 0]:
+            if diffs[0] < self._held[2]:
+                self._held = None
+            else:
+                est, ref, diffs = est[1:], ref[1:], diffs[1:]
+            self._dropped += 1
+        if not len(ref):
+            return
+        if self._held is not None:
+            est = np.vstack([self._held[0], est])
+            ref = np.vstack([self._held[1], ref])
+        self._held = (est[-1:], ref[-1:], diffs[-1])
+        self._update_stats(est[:-1], ref[:-1])
+
+    def _update_stats(self, est: np.ndarray, ref: np.ndarray):
+        """
+        Add matched pose pairs to the running statistics.
+        """
+        if not len(est):
+            return
+        # Prepend the previous pair so RPE spans batch boundaries
+        if self._previous is not None:
+            est = np.vstack([self._previous[0], est])
+            ref = np.vstack([self._previous[1], ref])
+        errors = compute_errors(ref[:, 1:4], ref[:, [7, 4, 5, 6]], est[:, 1:4], est[:, [7, 4, 5, 6]])
+        skip = 0 if self._previous is None else 1
+        self._stats["ape_trans"].update(errors.ape_trans[skip:])
+        self._stats["ape_rot"].update(errors.ape_rot[skip:])
+        self._stats["rpe_trans"].update(errors.rpe_trans)
+        self._stats["rpe_rot"].update(errors.rpe_rot)
+        self._alignment.update(est[skip:, 1:4], ref[skip:, 1:4])
+        self._previous = (est[-1:], ref[-1:])
+
+def save_online_metrics(segment_path: Path, metrics: dict) -> Path:
+    """
+    Write streaming metrics to metrics/online_metrics.json inside the segment.
+
+    Args:
+        segment_path (Path): Segment directory
+        metrics (dict): Result of OnlineEvaluator.close_segment
+
+    Returns:
+        Path: Path of the written file
+    """
+    metrics_path = Path(segment_path) / 'metrics' / ONLINE_METRICS_FILENAME
+    metrics_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(metrics_path, 'w') as f:
+        json.dump(metrics, f, indent=4)
+    return metrics_path
@@ -0,0 +1,270 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+from pathlib import Path
+import logging
+import shutil
+import tempfile
+import numpy as np
+from src.evo_analyser.association import match_nearest
+from src.evo_analyser.metric_engine import compute_errors
+from src.evo_analyser.online_metrics import AlignmentAccumulator, RunningStats
+from src.utils.performance import peak_rss_bytes, span
+from src.utils.pose_store import (DEFAULT_CHUNK_POSES, POSE_COLUMNS, POSE_STORE_SUFFIX, PoseSpill,
+                                  budget_chunk_poses, count_poses, iter_pose_chunks, pose_filename)
+from src.utils.prepare_directories import segment_dirs
+
+RUN_METRICS_FILENAME = 'run_metrics.json'
+
+def _store_paths(output_dir: Path, topic: str) -> list:
+    """
+    Pose stores of a topic over all segments of a run, in segment order.
+    """
+    paths = [segment_path / 'poses' / pose_filename(topic, suffix=POSE_STORE_SUFFIX)
+             for segment_path in segment_dirs(output_dir)]
+    return [path for path in paths if path.exists()]
+
+def count_run_poses(output_dir: Path, topic: str) -> int:
+    """
+    Number of poses of a topic over all segments, without reading the poses.
+
+    Args:
+        output_dir (Path): Output directory holding the segment directories
+        topic (str): Pose topic name
+
+    Returns:
+        int: Number of stored poses
+    """
+    return sum(count_poses(path) for path in _store_paths(output_dir, topic))
+
+def iter_run_chunks(output_dir: Path, topic: str, chunk_poses: int = DEFAULT_CHUNK_POSES):
+    """
+    Read a topic's poses over all segments of a run in chunks.
+
+    Unlike multiscale.load_run_poses nothing is concatenated; each chunk is
+    read from a segment's pose store with iter_pose_chunks.
+
+    Args:
+        output_dir (Path): Output directory holding the segment directories
+        topic (str): Pose topic name
+        chunk_poses (int): Largest number of rows per chunk
+
+    Yields:
+        np.ndarray: Poses in TUM column order, in time order over the run
+    """
+    for path in _store_paths(output_dir, topic):
+        yield from iter_pose_chunks(path, chunk_poses)
+
+def associate_chunks(ref_chunks, est_chunks, ref_count: int, est_count: int, max_diff: float,
+                     offset_2: float = 0.0, chunk_poses: int = DEFAULT_CHUNK_POSES):
+    """
+    Associate two time-sorted pose streams chunk by chunk.
+
+    Gives the same pairs as association.associate over the concatenated
+    streams. The shorter stream is queried in its own chunks against a
+    buffer of the longer one. Once the buffer holds chunk_poses rows, only
+    the query stamps it covers up to max_diff are matched and the rest of
+    the query chunk waits for the next target rows, so the buffer stays
+    within about two target chunks whatever the ratio of the two rates.
+    Only when more than chunk_poses target stamps fall within max_diff of
+    a single query stamp does the buffer grow further.
+
+    Matching is one-to-one, so the last pair matched is held back until
+    the next query rows show whether a closer stamp claims its partner.
+
+    Args:
+        ref_chunks: Iterable of reference pose chunks in TUM column order
+        est_chunks: Iterable of estimated pose chunks in TUM column order
+        ref_count (int): Total number of reference poses
+        est_count (int): Total number of estimated poses
+        max_diff (float): Largest allowed absolute time difference in seconds
+        offset_2 (float): Time offset added to the estimated stamps before matching
+        chunk_poses (int): Target rows buffered before a query chunk is split
+
+    Yields:
+        tuple: (reference poses, estimated poses) of the matched pairs, in time order
+    """
+    # Query from the shorter stream, as associate does
+    swap = est_count < ref_count
+    query_chunks, target_chunks = (est_chunks, ref_chunks) if swap else (ref_chunks, est_chunks)
+    query_offset, target_offset = (offset_2, 0.0) if swap else (0.0, offset_2)
+
+    def pairs(query_rows, target_rows):
+        return (target_rows, query_rows) if swap else (query_rows, target_rows)
+
+    targets = iter(target_chunks)
+    target = np.empty((0, len(POSE_COLUMNS)))
+    target_start = 0
+    targets_done = False
+    held = None  # (query row, target row, target index, time difference)
+    for query in query_chunks:
+        while len(query):
+            query_times = query[:, 0] + query_offset
+
+            # Drop targets too early for this query, then buffer the targets it needs
+            # up to the cap, and past it only to cover the first query stamp
+            stale = int(np.searchsorted(target[:, 0] + target_offset, query_times[0] - max_diff))
+            target = target[stale:]
+            target_start += stale
+            def needs_targets():
+                last = target[-1, 0] + target_offset
+                return last <= query_times[0] + max_diff or \
+                    (len(target) < chunk_poses and last <= query_times[-1] + max_diff)
+            while not targets_done and (not len(target) or needs_targets()):
+                chunk = next(targets, None)
+                if chunk is None:
+                    targets_done = True
+                else:
+                    target = np.concatenate([target, chunk])
+            target_times = target[:, 0] + target_offset
+
+            # Query stamps whose candidates within max_diff are all buffered
+            covered = len(query) if targets_done else \
+                int(np.searchsorted(query_times, target_times[-1] - max_diff, side='left'))
+            query, rest = query[:covered], query[covered:]
+            query_times = query_times[:covered]
+
+            query_idx, target_idx = match_nearest(query_times, target_times, max_diff)
+            order = np.argsort(query_idx, kind='stable')
+            query_idx, target_idx = query_idx[order], target_idx[order]
+            diffs = np.abs(target_times[target_idx] - query_times[query_idx])
+            query_rows, target_rows = query[query_idx], target[target_idx]
+            target_ids = target_idx + target_start
+            query = rest
+
+            # A target shared with the held pair goes to the closer stamp, the earlier one on ties
+            if held is not None and len(target_ids) and target_ids[0] == held[2]:
+                if diffs[0] < held[3]:
+                    held = None
+                else:
+                    query_rows, target_rows, target_ids, diffs = \
+                        query_rows[1:], target_rows[1:], target_ids[1:], diffs[1:]
+            if not len(target_ids):
+                continue
+            if held is not None:
+                query_rows = np.concatenate([held[0], query_rows])
+                target_rows = np.concatenate([held[1], target_rows])
+            held = (query_rows[-1:], target_rows[-1:], target_ids[-1], diffs[-1])
+            if len(query_rows) > 1:
+                yield pairs(query_rows[:-1], target_rows[:-1])
+    if held is not None:
+        yield pairs(held[0], held[1])
+
+def evaluate_run(output_dir: Path, est_topic: str, ref_topic: str, max_diff: float,
+                 time_offset: float = 0.0, budget_mb: float = None, scratch_dir: Path = None) -> dict:
+    """
+    ATE and RPE of the whole run, across segment boundaries, with bounded memory.
+
+    The pose stores are read in chunks sized by the memory budget, so peak
+    memory does not grow with the length of the run:
+
+    1. The streams are associated chunk by chunk. Matched pairs are spilled
+       to scratch files while the Umeyama moments are accumulated.
+    2. The Sim(3) alignment is solved from the moments.
+    3. The spilled pairs are read back to compute the aligned APE and RPE,
+       whose statistics are merged chunk by chunk.
+
+    RMSE, mean, standard deviation, minimum and maximum are exact; medians
+    are P-square estimates, as in the online metrics.
+
+    Args:
+        output_dir (Path): Output directory holding the segment directories
+        est_topic (str): Estimated pose topic
+        ref_topic (str): Reference pose topic
+        max_diff (float): Largest association time difference in seconds
+        time_offset (float): Offset added to the estimated stamps before association
+        budget_mb (float, optional): Memory budget in MiB for the poses being
+            processed. Defaults to chunks of DEFAULT_CHUNK_POSES rows.
+        scratch_dir (Path, optional): Directory for the scratch files.
+            Defaults to .scratch inside the output directory.
+
+    Returns:
+        dict: Run metrics with the ATE and RPE keys of the segment metrics
+
+    Raises:
+        ValueError: If fewer than three pose pairs are associated
+    """
+    logger = logging.getLogger(__name__)
+    output_dir = Path(output_dir)
+    chunk_poses = budget_chunk_poses(budget_mb) if budget_mb is not None else DEFAULT_CHUNK_POSES
+    est_count, ref_count = count_run_poses(output_dir, est_topic), count_run_poses(output_dir, ref_topic)
+    logger.info(f"Evaluating {est_count} estimated and {ref_count} reference poses "
+                f"in chunks of {chunk_poses}")
+
+    scratch_root = Path(scratch_dir) if scratch_dir is not None else output_dir / '.scratch'
+    scratch_root.mkdir(parents=True, exist_ok=True)
+    scratch = Path(tempfile.mkdtemp(prefix='run_', dir=scratch_root))
+    ref_pairs = PoseSpill(scratch / 'reference.spill', chunk_poses)
+    est_pairs = PoseSpill(scratch / 'estimate.spill', chunk_poses)
+    try:
+        # Pass 1: association and alignment moments
+        alignment = AlignmentAccumulator()
+        with span('run_association', est_count + ref_count):
+            for ref, est in associate_chunks(iter_run_chunks(output_dir, ref_topic, chunk_poses),
+                                             iter_run_chunks(output_dir, est_topic, chunk_poses),
+                                             ref_count, est_count, max_diff, offset_2=time_offset,
+                                             chunk_poses=chunk_poses):
+                ref_pairs.append(ref)
+                est_pairs.append(est)
+                alignment.update(est[:, 1:4], ref[:, 1:4])
+        logger.info(f"Associated {len(ref_pairs)} pose pairs")
+        transform, _ = alignment.solve(correct_scale=True)
+        if transform is None:
+            raise ValueError(f"Too few pose pairs to align the run: {len(ref_pairs)}")
+
+        # Pass 2: aligned errors; each chunk starts with the previous chunk's last
+        # pair so RPE spans chunk boundaries
+        stats = {name: RunningStats() for name in ("ape_trans", "ape_rot", "rpe_trans", "rpe_rot")}
+        previous = None
+        path_length = 0.0
+        first_time = last_time = None
+        with span('run_metrics', len(ref_pairs)):
+            for ref, est in zip(ref_pairs.chunks(), est_pairs.chunks()):
+                skip = 0 if previous is None else 1
+                if previous is not None:
+                    ref, est = np.concatenate([previous[0], ref]), np.concatenate([previous[1], est])
+                errors = compute_errors(ref[:, 1:4], ref[:, [7, 4, 5, 6]], est[:, 1:4], est[:, [7, 4, 5, 6]],
+                                        transform.apply_positions(est[:, 1:4]),
+                                        transform.apply_orientations(est[:, [7, 4, 5, 6]]))
+                stats["ape_trans"].update(errors.ape_trans[skip:])
+                stats["ape_rot"].update(errors.ape_rot[skip:])
+                stats["rpe_trans"].update(errors.rpe_trans)
+                stats["rpe_rot"].update(errors.rpe_rot)
+                path_length += float(np.linalg.norm(np.diff(ref[:, 1:4], axis=0), axis=1).sum())
+                first_time = ref[0, 0] if first_time is None else first_time
+                last_time = ref[-1, 0]
+                previous = (ref[-1:], est[-1:])
+    finally:
+        ref_pairs.remove()
+        est_pairs.remove()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    ate, ate_rot, rpe, rpe_rot = (stats[name].to_dict()
+                                  for name in ("ape_trans", "ape_rot", "rpe_trans", "rpe_rot"))
+    duration = float(last_time - first_time)
+    return {
+        "ate_rmse": ate["rmse"],
+        "ate_mean": ate["mean"],
+        "ate_median": ate["median"],
+        "ate_std": ate["std"],
+        "ate_min": ate["min"],
+        "ate_max": ate["max"],
+        "ate_rot_rmse": ate_rot["rmse"],
+        "ate_rot_mean": ate_rot["mean"],
+        "ate_rot_median": ate_rot["median"],
+        "rpe_rmse": rpe["rmse"],
+        "rpe_mean": rpe["mean"],
+        "rpe_median": rpe["median"],
+        "rpe_rot_rmse": rpe_rot["rmse"],
+        "rpe_rot_mean": rpe_rot["mean"],
+        "rpe_rot_median": rpe_rot["median"],
+        "trajectory_length": path_length,
+        "duration": duration,
+        "average_speed": path_length / duration if duration > 0 else float('nan'),
+        "translation_error_percent": ate["mean"] / path_length * 100 if path_length > 0 else float('nan'),
+        "scale_drift": transform.scale_drift,
+        "alignment_scale": transform.scale,
+        "matched_poses": stats["ape_trans"].count,
+        "chunk_poses": chunk_poses,
+        "memory_budget_mb": budget_mb,
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
@@ -0,0 +1,197 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import logging
+import time
+
+# One analyser per worker process, created by the pool initializer
+_worker_analyser = None
+
+def _init_worker(output_dir: str, defer_plots: bool = False, cache_dir: str = None):
+    """
+    Create the EvoAnalyser instance owned by this worker process.
+
+    Args:
+        output_dir (str): Directory for analysis outputs
+        defer_plots (bool): Return plot jobs instead of rendering them
+        cache_dir (str): Result cache directory, None to disable caching
+    """
+    global _worker_analyser
+    from src.evo_analyser.evo_analyser import EvoAnalyser
+    _worker_analyser = EvoAnalyser(output_dir, defer_plots=defer_plots, cache_dir=cache_dir)
+
+def _take_plots() -> list:
+    """
+    Hand over the plot jobs queued by the worker's analyser.
+    """
+    jobs, _worker_analyser.pending_plots = _worker_analyser.pending_plots, []
+    return jobs
+
+def _analyze_one(segment_path: Path) -> tuple:
+    """
+    Analyze a single segment with the worker's analyser.
+
+    Args:
+        segment_path (Path): Path to the segment directory
+
+    Returns:
+        tuple: (segment name, metrics dict or None, error message or None,
+                list of deferred PlotJob objects)
+    """
+    try:
+        return segment_path.name, _worker_analyser.analyze_segment(segment_path), None, _take_plots()
+    except Exception as e:
+        return segment_path.name, None, f"{type(e).__name__}: {e}", _take_plots()
+
+def _analyze_poses_one(segment) -> tuple:
+    """
+    Analyze the in-memory poses of a streamed segment with the worker's analyser.
+
+    Args:
+        segment (SegmentData): Segment yielded by BagProcessor.iter_segments
+
+    Returns:
+        tuple: (segment name, metrics dict or None, error message or None,
+                list of deferred PlotJob objects)
+    """
+    try:
+        config = _worker_analyser.config
+        est_poses = segment.poses[config.get('topics', 'estimated')]
+        ref_poses = segment.poses[config.get('topics', 'reference')]
+        metrics = _worker_analyser.analyze_poses(segment.path, est_poses, ref_poses)
+        return segment.name, metrics, None, _take_plots()
+    except Exception as e:
+        return segment.name, None, f"{type(e).__name__}: {e}", _take_plots()
+
+def analyze_segments(output_dir: str, segment_paths: list, workers: int = 1,
+                     plot_renderer=None, cache_dir: str = None) -> tuple:
+    """
+    Analyze segments, optionally spreading them over a process pool.
+
+    Results are returned in the same order as segment_paths regardless of
+    which worker finished first. A segment that raises is reported and
+    skipped; the remaining segments are still analyzed.
+
+    Args:
+        output_dir (str): Directory for analysis outputs
+        segment_paths (list): Paths of the segment directories to analyze
+        workers (int): Number of worker processes. 1 analyzes in-process.
+        plot_renderer (PlotRenderer, optional): Receives each segment's plots
+            as soon as its metrics are collected. Without one, plots are
+            rendered by the analysing process.
+        cache_dir (str, optional): Result cache directory shared by the workers
+
+    Returns:
+        tuple: (list of metrics dicts in segment order,
+                list of {"segment_id", "error"} dicts for failed segments)
+    """
+    logger = logging.getLogger(__name__)
+    segment_paths = [Path(p) for p in segment_paths]
+
+    defer_plots = plot_renderer is not None
+
+    if workers <= 1 or len(segment_paths) <= 1:
+        _init_worker(output_dir, defer_plots, cache_dir)
+        outcomes = map(_analyze_one, segment_paths)
+        return _collect(outcomes, logger, plot_renderer)
+
+    workers = min(workers, len(segment_paths))
+    logger.info(f"Analyzing {len(segment_paths)} segments with {workers} workers")
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_worker,
+                             initargs=(str(output_dir), defer_plots, cache_dir)) as executor:
+        # map() yields in submission order, which keeps the summary ordered
+        return _collect(executor.map(_analyze_one, segment_paths), logger, plot_renderer)
+
+def analyze_stream(output_dir: str, segments, workers: int = 1, max_pending: int = None,
+                   plot_renderer=None, cache_dir: str = None) -> tuple:
+    """
+    Analyze segments while they are still being produced.
+
+    Each segment from the iterable (typically BagProcessor.iter_segments) is
+    sent to the pool as soon as it is yielded, so analysis of segment N runs
+    while segment N+1 is read. At most max_pending segments are queued, which
+    bounds the pose data held in memory. Results keep segment order.
+
+    Args:
+        output_dir (str): Directory for analysis outputs
+        segments: Iterable of SegmentData
+        workers (int): Number of worker processes, at least one
+        max_pending (int): Maximum segments submitted but not collected.
+            Defaults to twice the worker count.
+        plot_renderer (PlotRenderer, optional): Receives each segment's plots
+            as soon as its metrics are collected
+        cache_dir (str, optional): Result cache directory shared by the workers
+
+    Returns:
+        tuple: (list of metrics dicts in segment order,
+                list of {"segment_id", "error"} dicts for failed segments)
+    """
+    logger = logging.getLogger(__name__)
+    workers = max(1, workers)
+    max_pending = max_pending or 2 * workers
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_worker,
+                             initargs=(str(output_dir), plot_renderer is not None,
+                                       cache_dir)) as executor:
+        all_metrics, failures = _collect(
+            _stream_outcomes(executor, segments, max_pending, started, logger), logger, plot_renderer)
+
+    logger.info(f"Streamed analysis of {len(all_metrics) + len(failures)} segments "
+                f"took {time.perf_counter() - started:.2f}s")
+    return all_metrics, failures
+
+def _stream_outcomes(executor, segments, max_pending: int, started: float, logger):
+    """
+    Submit segments as they arrive and yield outcomes in segment order.
+
+    Args:
+        executor (ProcessPoolExecutor): Pool of initialised analysis workers
+        segments: Iterable of SegmentData
+        max_pending (int): Maximum segments submitted but not yielded
+        started (float): perf_counter() value the first-result time is measured from
+        logger (Logger): Logger for the time to the first result
+
+    Yields:
+        tuple: Outcome of _analyze_poses_one
+    """
+    pending = deque()
+    collected = 0
+    for segment in segments:
+        pending.append(executor.submit(_analyze_poses_one, segment))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+            collected += 1
+            if collected == 1:
+                logger.info(f"First segment analysed after {time.perf_counter() - started:.2f}s")
+    while pending:
+        yield pending.popleft().result()
+
+def _collect(outcomes, logger, plot_renderer=None) -> tuple:
+    """
+    Split analysis outcomes into successful metrics and failures.
+
+    Args:
+        outcomes: Iterable of (segment name, metrics, error, plot jobs) tuples
+        logger (Logger): Logger used to report failed segments
+        plot_renderer (PlotRenderer, optional): Receives the deferred plot jobs
+
+    Returns:
+        tuple: (list of metrics dicts, list of failure dicts)
+    """
+    all_metrics = []
+    failures = []
+    for segment_name, metrics, error, plot_jobs in outcomes:
+        for job in plot_jobs:
+            plot_renderer.submit(job)
+        if error is not None:
+            logger.error(f"Analysis of segment {segment_name} failed: {error}")
+            failures.append({"segment_id": segment_name, "error": error})
+            continue
+        logger.info(f"Analyzed segment: {segment_name}")
+        all_metrics.append(metrics)
+    return all_metrics, failures
@@ -0,0 +1,327 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+import logging
+import numpy as np
+from src.evo_analyser.decimation import lttb_indices, minmax_indices
+from src.evo_analyser.result_cache import ResultCache
+from src.utils.performance import span
+
+@dataclass
+class PlotJob:
+    """
+    Everything needed to render the plots of one analysed segment.
+
+    Paths and series may already be decimated (see make_plot_job), so each
+    series carries its own time axis.
+
+    Attributes:
+        segment_name (str): Name of the segment, used in file names
+        plots_dir (Path): Directory receiving the exported plots
+        ref_poses (np.ndarray): Reference poses in TUM column order
+        est_poses (np.ndarray): Estimated poses in TUM column order
+        aligned_poses (np.ndarray): Aligned estimated poses in TUM column order
+        ape_errors (np.ndarray): APE translation error of each aligned pose
+        ape_stats (dict): Statistics of the full APE series
+        rpe_stats (dict): Statistics of the full RPE series
+        ape_series (np.ndarray): Kx2 (seconds from start, APE)
+        rpe_series (np.ndarray): Kx2 (seconds from start, RPE)
+        rmse_series (np.ndarray): Kx2 (seconds from start, cumulative APE RMSE)
+        cache_dir (Path): ResultCache directory storing the rendered plots, None to skip
+        cache_key (str): Result key of the segment in the cache
+        plot_key (str): Key of the plot settings in the cache
+        cache_max_bytes (int): max_bytes of the ResultCache, None for no limit
+    """
+    segment_name: str
+    plots_dir: Path
+    ref_poses: np.ndarray
+    est_poses: np.ndarray
+    aligned_poses: np.ndarray
+    ape_errors: np.ndarray
+    ape_stats: dict
+    rpe_stats: dict
+    ape_series: np.ndarray
+    rpe_series: np.ndarray
+    rmse_series: np.ndarray
+    cache_dir: Path = None
+    cache_key: str = None
+    plot_key: str = None
+    cache_max_bytes: int = None
+
+def make_plot_job(segment_name: str, plots_dir: Path, ref_poses: np.ndarray,
+                  est_poses: np.ndarray, aligned_poses: np.ndarray, ape_errors: np.ndarray,
+                  rpe_errors: np.ndarray, ape_stats: dict, rpe_stats: dict,
+                  max_points: dict = None) -> PlotJob:
+    """
+    Build the plot data of a segment, decimated to the configured point budgets.
+
+    Time series are reduced with largest-triangle-three-buckets and paths
+    with per-bucket min/max selection; the APE colormap keeps the extremes
+    of the error as well as of the position.
+
+    Args:
+        segment_name (str): Name of the segment
+        plots_dir (Path): Directory receiving the exported plots
+        ref_poses (np.ndarray): Nx8 associated reference poses in TUM column order
+        est_poses (np.ndarray): Nx8 associated estimated poses in TUM column order
+        aligned_poses (np.ndarray): Nx8 aligned estimated poses in TUM column order
+        ape_errors (np.ndarray): APE translation error per pose
+        rpe_errors (np.ndarray): RPE translation error per pose pair
+        ape_stats (dict): Statistics of ape_errors
+        rpe_stats (dict): Statistics of rpe_errors
+        max_points (dict, optional): Point budgets with 'trajectory' and
+            'time_series' keys; missing or None budgets keep every point
+
+    Returns:
+        PlotJob: Plot data ready for render_plots
+    """
+    max_points = max_points or {}
+    path_budget = max_points.get('trajectory')
+    series_budget = max_points.get('time_series')
+
+    seconds = est_poses[:, 0] - est_poses[0, 0]
+    cumulative_rmse = np.sqrt(np.cumsum(ape_errors ** 2) / np.arange(1, len(ape_errors) + 1))
+
+    def series(x, y):
+        kept = lttb_indices(x, y, series_budget)
+        return np.column_stack([x[kept], y[kept]])
+
+    def path(poses):
+        return poses[minmax_indices(poses[:, 1:4], path_budget)]
+
+    colormap_kept = minmax_indices(np.column_stack([aligned_poses[:, 1:4], ape_errors]), path_budget)
+    return PlotJob(
+        segment_name=segment_name,
+        plots_dir=plots_dir,
+        ref_poses=path(ref_poses),
+        est_poses=path(est_poses),
+        aligned_poses=aligned_poses[colormap_kept],
+        ape_errors=ape_errors[colormap_kept],
+        ape_stats=ape_stats,
+        rpe_stats=rpe_stats,
+        ape_series=series(seconds, ape_errors),
+        rpe_series=series(seconds[1:], rpe_errors),
+        rmse_series=series(seconds, cumulative_rmse),
+    )
+
+def _plotting_modules() -> tuple:
+    """
+    Import matplotlib and evo's plotting on first use, with the Agg backend.
+
+    They take seconds to import, so processes that never plot skip them.
+
+    Returns:
+        tuple: (matplotlib.pyplot, evo.tools.plot, evo.core.metrics)
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from evo.tools.settings import SETTINGS
+    SETTINGS.plot_backend = 'Agg'
+    from evo.core import metrics
+    from evo.tools import plot
+    return plt, plot, metrics
+
+def render_plots(job: PlotJob):
+    """
+    Render and export the plots of a segment, closing every figure afterwards.
+
+    Args:
+        job (PlotJob): Segment data to plot
+    """
+    plt, plot, metrics = _plotting_modules()
+    traj_ref = _trajectory(job.ref_poses)
+    traj_est = _trajectory(job.est_poses)
+    traj_est_aligned = _trajectory(job.aligned_poses)
+    plot_collection = plot.PlotCollection("Trajectory Analysis")
+
+    try:
+        # 3D trajectory plots
+        fig = plt.figure(figsize=(12, 8))
+        plot_collection.add_figure("Trajectories Comparison", fig)
+        plot_mode = plot.PlotMode.xyz
+
+        # Original trajectories
+        ax = plot.prepare_axis(fig, plot_mode, subplot_arg=221)
+        ax.set_title("Original Trajectories")
+        plot.traj(ax, plot_mode, traj_ref, '--', 'gray', 'reference')
+        plot.traj(ax, plot_mode, traj_est, '-', 'blue', 'estimated')
+
+        # Aligned trajectories
+        ax = plot.prepare_axis(fig, plot_mode, subplot_arg=222)
+        ax.set_title("Aligned Trajectories")
+        plot.traj(ax, plot_mode, traj_ref, '--', 'gray', 'reference')
+        plot.traj(ax, plot_mode, traj_est_aligned, '-', 'blue', 'estimated (aligned)')
+
+        # Top view with APE colormapping
+        fig_top = plt.figure()
+        ax = plot.prepare_axis(fig_top, plot.PlotMode.xy)
+        plot_collection.add_figure("Top View (APE)", fig_top)
+        plot.traj(ax, plot.PlotMode.xy, traj_ref, '--', 'gray', 'reference')
+        plot.traj_colormap(ax, traj_est_aligned, job.ape_errors,
+                          plot.PlotMode.xy,
+                          min_map=job.ape_stats["min"],
+                          max_map=job.ape_stats["max"],
+                          title="APE Colormapping")
+
+        # RPE plot
+        fig_rpe = plt.figure()
+        ax = fig_rpe.add_subplot(111)
+        plot_collection.add_figure("RPE Over Time", fig_rpe)
+        plot.error_array(ax, job.rpe_series[:, 1],
+                        x_array=job.rpe_series[:, 0],
+                        statistics={s:v for s,v in job.rpe_stats.items()
+                                  if s != "sse"},
+                        name="RPE",
+                        title="RPE w.r.t. " + metrics.PoseRelation.translation_part.value,
+                        xlabel="t (s)")
+
+        # Add RMSE plot
+        fig_rmse = plt.figure(figsize=(10, 6))
+        ax = fig_rmse.add_subplot(111)
+        plot_collection.add_figure("RMSE Analysis", fig_rmse)
+
+        # Plot cumulative RMSE
+        ax.plot(job.rmse_series[:, 0], job.rmse_series[:, 1],
+                label=f'Cumulative RMSE (final: {job.rmse_series[-1, 1]:.3f}m)')
+        ax.set_xlabel('Time (s)')
+        ax.set_ylabel('RMSE (m)')
+        ax.set_title('Cumulative RMSE Over Time')
+        ax.grid(True)
+        ax.legend()
+
+        # Add ATE plot
+        fig_ate = plt.figure(figsize=(10, 6))
+        ax = fig_ate.add_subplot(111)
+        plot_collection.add_figure("ATE Analysis", fig_ate)
+
+        # Plot ATE over time
+        ax.plot(job.ape_series[:, 0], job.ape_series[:, 1], 'b-', label='ATE')
+        ax.set_xlabel('Time (s)')
+        ax.set_ylabel('ATE (m)')
+        ax.set_title('Absolute Trajectory Error Over Time')
+
+        # Add horizontal line for mean ATE
+        mean_ate = job.ape_stats["mean"]
+        ax.axhline(y=mean_ate, color='r', linestyle='--',
+                   label=f'Mean ATE: {mean_ate:.3f}m')
+
+        ax.grid(True)
+        ax.legend()
+
+        # Save all plots
+        Path(job.plots_dir).mkdir(parents=True, exist_ok=True)
+        plot_collection.export(
+            Path(job.plots_dir) / f"{job.segment_name}_plots",
+            confirm_overwrite=False
+        )
+    finally:
+        # Figures are retained by pyplot until closed
+        for figure in plot_collection.figures.values():
+            plt.close(figure)
+
+def _render_job(job: PlotJob) -> tuple:
+    """
+    Pool entry point rendering one job.
+
+    Returns:
+        tuple: (segment name, error message or None)
+    """
+    try:
+        with span('plotting', len(job.ref_poses), segment=job.segment_name):
+            render_plots(job)
+        return job.segment_name, None
+    except Exception as e:
+        return job.segment_name, f"{type(e).__name__}: {e}"
+
+def _trajectory(poses: np.ndarray):
+    from evo.core.trajectory import PoseTrajectory3D
+    return PoseTrajectory3D(
+        positions_xyz=poses[:, 1:4],
+        orientations_quat_wxyz=poses[:, [7, 4, 5, 6]],
+        timestamps=poses[:, 0]
+    )
+
+class PlotRenderer:
+    """
+    Bounded pool of processes rendering segment plots off the analysis path.
+
+    Jobs are rendered in submission order. At most max_pending jobs are in
+    flight; submit() waits for the oldest one beyond that, which bounds the
+    pose data held for plotting. With zero workers plots are rendered
+    synchronously in submit().
+
+    Rendered plots of jobs with a cache_dir are stored in the result cache
+    by this process, through one ResultCache per cache directory, so their
+    bytes count towards the cache's max_bytes.
+
+    Attributes:
+        workers (int): Number of rendering processes, 0 to render in-process
+        max_pending (int): Maximum jobs submitted but not finished
+        failures (list): {"segment_id", "error"} dicts of failed renders
+    """
+
+    def __init__(self, workers: int = 1, max_pending: int = None):
+        self.workers = max(0, workers)
+        self.max_pending = max_pending or 2 * max(1, self.workers)
+        self.failures = []
+        self.logger = logging.getLogger(__name__)
+        self._pending = deque()
+        self._caches = {}
+        self._executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers else None
+
+    def submit(self, job: PlotJob):
+        """
+        Queue the plots of a segment for rendering.
+
+        Args:
+            job (PlotJob): Segment data to plot
+        """
+        if self._executor is None:
+            self._record(job, _render_job(job))
+            return
+        self._pending.append((job, self._executor.submit(_render_job, job)))
+        while len(self._pending) > self.max_pending:
+            job, future = self._pending.popleft()
+            self._record(job, future.result())
+
+    def close(self) -> list:
+        """
+        Wait for all queued plots and shut the pool down.
+
+        Returns:
+            list: {"segment_id", "error"} dicts of failed renders
+        """
+        while self._pending:
+            job, future = self._pending.popleft()
+            self._record(job, future.result())
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        return self.failures
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _record(self, job: PlotJob, outcome: tuple):
+        segment_name, error = outcome
+        if error is not None:
+            self.logger.error(f"Plotting segment {segment_name} failed: {error}")
+            self.failures.append({"segment_id": segment_name, "error": error})
+        elif job.cache_dir is not None:
+            self._cache(job).put_plots(job.cache_key, job.plot_key, job.plots_dir, f"{segment_name}_plots")
+
+    def _cache(self, job: PlotJob) -> ResultCache:
+        """
+        ResultCache of a job's cache directory, opened once per renderer.
+        """
+        key = (str(job.cache_dir), job.cache_max_bytes)
+        if key not in self._caches:
+            self._caches[key] = ResultCache(job.cache_dir, job.cache_max_bytes)
+        return self._caches[key]
@@ -0,0 +1,204 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+import numpy as np
+
+METRICS_FILENAME = 'metrics.json'
+
+def hash_arrays(*arrays: np.ndarray) -> str:
+    """
+    Digest of the contents, shapes and dtypes of numeric arrays.
+
+    2-D arrays are hashed column by column, so the digest does not depend on
+    the memory layout and columns of Fortran-ordered (e.g. memory-mapped pose
+    store) arrays are hashed without copying.
+
+    Args:
+        *arrays (np.ndarray): Arrays to hash
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    for array in arrays:
+        array = np.asarray(array)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        columns = array.T if array.ndim == 2 else [array]
+        for column in columns:
+            digest.update(np.ascontiguousarray(column).data)
+    return digest.hexdigest()
+
+def cache_key(data_digest: str, settings: dict, version: str) -> str:
+    """
+    Content address of an analysis result.
+
+    Args:
+        data_digest (str): Digest of the input poses from hash_arrays
+        settings (dict): Configuration values the result depends on
+        version (str): Analyser version, bumped when results change
+
+    Returns:
+        str: Hex digest used as cache key
+    """
+    payload = json.dumps({"data": data_digest, "settings": settings, "version": version},
+                         sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=20).hexdigest()
+
+class ResultCache:
+    """
+    Local directory of segment metrics and plots addressed by their inputs.
+
+    Each entry is a directory named after its key holding metrics.json and
+    optionally plots/<plot key>/. Reading an entry refreshes its modification
+    time, and entries are evicted least recently used first once the cache
+    exceeds max_bytes. Entries are written to a temporary directory and moved
+    into place, so concurrent workers never see partial entries.
+
+    The size of the cache is scanned once on start and then kept as a running
+    total of the bytes this instance writes. The directory is only scanned
+    again when the total exceeds max_bytes, which also picks up entries
+    written or evicted by other workers.
+
+    Attributes:
+        cache_dir (Path): Root directory of the cache
+        max_bytes (int): Size above which entries are evicted, None for no limit
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = None):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._size = self.size()
+
+    def get_metrics(self, key: str) -> dict:
+        """
+        Look up cached metrics.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            dict: Cached metrics, or None on a miss
+        """
+        entry = self.cache_dir / key
+        try:
+            with open(entry / METRICS_FILENAME) as f:
+                metrics = json.load(f)
+            os.utime(entry)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return metrics
+
+    def put_metrics(self, key: str, metrics: dict):
+        """
+        Store metrics under a key and evict old entries if over budget.
+
+        Args:
+            key (str): Cache key
+            metrics (dict): Metrics to store
+        """
+        entry = self.cache_dir / key
+        entry.mkdir(exist_ok=True)
+        tmp_path = entry / f".{METRICS_FILENAME}.{uuid.uuid4().hex}"
+        with open(tmp_path, 'w') as f:
+            json.dump(metrics, f, indent=4)
+        self._size += tmp_path.stat().st_size - _file_size(entry / METRICS_FILENAME)
+        os.replace(tmp_path, entry / METRICS_FILENAME)
+        self.evict()
+
+    def has_plots(self, key: str, plot_key: str) -> bool:
+        return (self.cache_dir / key / 'plots' / plot_key).is_dir()
+
+    def put_plots(self, key: str, plot_key: str, plots_dir: Path, prefix: str):
+        """
+        Store exported plot files, dropping the segment specific file name prefix.
+
+        Args:
+            key (str): Cache key of the analysis
+            plot_key (str): Key of the plot settings
+            plots_dir (Path): Directory holding the exported plots
+            prefix (str): File name prefix to strip, e.g. segment_0_plots
+        """
+        target = self.cache_dir / key / 'plots' / plot_key
+        if target.exists():
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        staging = target.parent / f".{plot_key}.{uuid.uuid4().hex}"
+        staging.mkdir()
+        for path in Path(plots_dir).glob(f"{prefix}*"):
+            shutil.copy2(path, staging / path.name[len(prefix):])
+        try:
+            staging.rename(target)
+        except OSError:
+            # Another worker stored the same plots first
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+        self._size += sum(path.stat().st_size for path in target.iterdir())
+        self.evict()
+
+    def restore_plots(self, key: str, plot_key: str, plots_dir: Path, prefix: str) -> bool:
+        """
+        Copy cached plots into a segment, adding the segment's file name prefix.
+
+        Returns:
+            bool: False if the plots were evicted in the meantime
+        """
+        source = self.cache_dir / key / 'plots' / plot_key
+        plots_dir = Path(plots_dir)
+        plots_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            for path in source.iterdir():
+                shutil.copy2(path, plots_dir / f"{prefix}{path.name}")
+        except FileNotFoundError:
+            return False
+        return True
+
+    def size(self) -> int:
+        return sum(self._entry_sizes().values())
+
+    def evict(self):
+        """
+        Delete least recently used entries until the cache fits max_bytes.
+
+        The cache directory is only scanned once the running size total
+        exceeds max_bytes.
+        """
+        if self.max_bytes is None or self._size <= self.max_bytes:
+            return
+        sizes = self._entry_sizes()
+        total = sum(sizes.values())
+        for entry in sorted(sizes, key=_mtime):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= sizes[entry]
+            self.logger.debug(f"Evicted cache entry {entry.name}")
+        self._size = total
+
+    def _entry_sizes(self) -> dict:
+        sizes = {}
+        for entry in self.cache_dir.iterdir():
+            try:
+                sizes[entry] = sum(f.stat().st_size for f in entry.rglob('*') if f.is_file())
+            except FileNotFoundError:
+                continue
+        return sizes
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+def _mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
@@ -0,0 +1,107 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+import logging
+import time
+import numpy as np
+from src.evo_analyser.association import DEFAULT_MAX_ASSOCIATION_DIFF
+from src.live.sliding_window import SlidingWindowEvaluator
+from src.utils.config import Config
+from src.utils.pose_decoder import decode_pose_stamped_batch
+
+class LiveEvaluator:
+    """
+    Sliding-window ATE/RPE of live pose topics, published at a fixed rate.
+
+    Serialised messages from a source (Ros2PoseSource or FakePosePublisher)
+    are buffered per topic and decoded in one batch per evaluation. Every
+    1 / rate seconds of message time the window ending at the newest pose is
+    evaluated and written to each sink, so the work per second is bounded by
+    the rate and the ring buffer size, not by how long the stream runs.
+
+    Attributes:
+        window (SlidingWindowEvaluator): Ring buffers and window metrics
+        sinks (list): Objects with write(dict) receiving every result
+        rate (float): Evaluations per second of message time
+        evaluations (int): Number of results published
+    """
+
+    def __init__(self, sinks: list, window_duration: float = None, rate: float = None,
+                 buffer_size: int = None):
+        config = Config()
+        self.logger = logging.getLogger(__name__)
+        self.perf_logger = logging.getLogger('performance')
+        self.sinks = sinks
+        self.rate = rate or config.get('live', 'rate', default=1.0)
+        self.window = SlidingWindowEvaluator(
+            config.get('topics', 'estimated', default='/casestudy/predicted_pose'),
+            config.get('topics', 'reference', default='/casestudy/reference_pose'),
+            window_duration or config.get('live', 'window_duration', default=30.0),
+            config.get('analysis', 'trajectory', 'max_association_diff', default=DEFAULT_MAX_ASSOCIATION_DIFF),
+            buffer_size or config.get('live', 'buffer_size', default=10000),
+            config.get('analysis', 'trajectory', 'time_offset', default=0.0),
+            config.get('live', 'align', default=True)
+        )
+        self.evaluations = 0
+        self._pending = {}
+        self._next_evaluation = None
+
+    def on_message(self, topic: str, data: bytes, timestamp: int):
+        """
+        Buffer one serialised pose message and evaluate when due.
+
+        Args:
+            topic (str): Topic the message was received on
+            data (bytes): Serialised PoseStamped message
+            timestamp (int): Receive time in nanoseconds
+        """
+        if topic not in self.window.buffers:
+            return
+        data_list, stamps = self._pending.setdefault(topic, ([], []))
+        data_list.append(data)
+        stamps.append(timestamp)
+        if self._next_evaluation is None:
+            self._next_evaluation = timestamp + int(1e9 / self.rate)
+        elif timestamp >= self._next_evaluation:
+            self._next_evaluation = timestamp + int(1e9 / self.rate)
+            self.evaluate()
+
+    def evaluate(self) -> dict:
+        """
+        Decode buffered messages and publish the metrics of the current window.
+
+        Returns:
+            dict: Published metrics, or None if the window had too few matches
+        """
+        start = time.perf_counter()
+        for topic, (data_list, stamps) in self._pending.items():
+            if data_list:
+                poses, _ = decode_pose_stamped_batch(data_list)
+                self.window.update(topic, np.column_stack([np.asarray(stamps, dtype=np.int64) / 1e9, poses]))
+        self._pending = {}
+
+        metrics = self.window.evaluate()
+        if metrics is None:
+            self.logger.debug("Not enough associated poses in the window yet")
+            return None
+        metrics["evaluation_ms"] = (time.perf_counter() - start) * 1e3
+        for sink in self.sinks:
+            sink.write(metrics)
+        self.evaluations += 1
+        self.perf_logger.debug(f"Live window evaluated in {metrics['evaluation_ms']:.1f} ms")
+        return metrics
+
+    def run(self, source, duration: float = None) -> int:
+        """
+        Evaluate messages from a source until it ends or duration elapses.
+
+        Args:
+            source: Ros2PoseSource or FakePosePublisher
+            duration (float, optional): Wall-clock seconds to run, None for no limit
+
+        Returns:
+            int: Number of results published
+        """
+        deadline = time.monotonic() + duration if duration is not None else None
+        source.spin(self.on_message, lambda: deadline is not None and time.monotonic() > deadline)
+        self.evaluate()
+        return self.evaluations
@@ -0,0 +1,64 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+from pathlib import Path
+import json
+import socket
+
+class JsonLinesSink:
+    """
+    Appends each window's metrics as one JSON line to a file.
+
+    Lines are flushed as they are written, so the file can be tailed while
+    the evaluation runs.
+
+    Attributes:
+        path (Path): Metrics file
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.path, 'a')
+
+    def write(self, metrics: dict):
+        self._fh.write(json.dumps(metrics) + '\n')
+        self._fh.flush()
+
+    def close(self):
+        self._fh.close()
+
+class UdpSink:
+    """
+    Sends each window's metrics as a JSON datagram.
+
+    UDP never blocks the evaluation on a slow or absent consumer; results
+    sent while nobody listens are lost.
+
+    Attributes:
+        address (tuple): (host, port) receiving the datagrams
+    """
+
+    def __init__(self, host: str, port: int):
+        self.address = (host, port)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def write(self, metrics: dict):
+        self._socket.sendto(json.dumps(metrics).encode(), self.address)
+
+    def close(self):
+        self._socket.close()
+
+def open_sink(target: str):
+    """
+    Open a sink from a target string.
+
+    Args:
+        target (str): 'udp://host:port' for datagrams, otherwise a file path
+
+    Returns:
+        JsonLinesSink or UdpSink
+    """
+    if target.startswith('udp://'):
+        host, port = target[len('udp://'):].rsplit(':', 1)
+        return UdpSink(host, int(port))
+    return JsonLinesSink(target)
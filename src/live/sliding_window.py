@@ -0,0 +1,136 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+import numpy as np
+from src.evo_analyser.alignment import align_positions
+from src.evo_analyser.association import associate
+from src.evo_analyser.metric_engine import compute_errors, error_statistics
+
+class PoseRingBuffer:
+    """
+    Fixed-size buffer of the most recent poses of one topic.
+
+    Poses are stored in a preallocated Nx8 array; once it is full the oldest
+    poses are overwritten, so memory does not grow with the stream length.
+
+    Attributes:
+        capacity (int): Number of poses kept
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.empty((capacity, 8))
+        self._end = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def extend(self, poses: np.ndarray):
+        """
+        Append poses, overwriting the oldest ones when full.
+
+        Args:
+            poses (np.ndarray): Nx8 poses in TUM column order, sorted by time
+        """
+        poses = np.asarray(poses, dtype=np.float64)[-self.capacity:]
+        n = len(poses)
+        first = min(n, self.capacity - self._end)
+        self._data[self._end:self._end + first] = poses[:first]
+        self._data[:n - first] = poses[first:]
+        self._end = (self._end + n) % self.capacity
+        self._count = min(self._count + n, self.capacity)
+
+    def latest_time(self) -> float:
+        return float(self._data[self._end - 1, 0]) if self._count else float('-inf')
+
+    def since(self, start_time: float) -> np.ndarray:
+        """
+        Poses with a timestamp of at least start_time, oldest first.
+
+        Args:
+            start_time (float): Window start in seconds
+
+        Returns:
+            np.ndarray: Mx8 copy of the poses
+        """
+        start = (self._end - self._count) % self.capacity
+        ordered = np.roll(self._data, -start, axis=0)[:self._count] if start else self._data[:self._count]
+        return ordered[np.searchsorted(ordered[:, 0], start_time):].copy()
+
+class SlidingWindowEvaluator:
+    """
+    ATE/RPE over the last window_duration seconds of two pose streams.
+
+    Each topic keeps a PoseRingBuffer, so memory and the cost of one
+    evaluation are bounded by buffer_size regardless of how long the stream
+    runs. Each evaluation associates, aligns and computes the errors of the
+    current window with the same functions as the segment analysis.
+
+    Attributes:
+        est_topic (str): Estimated pose topic
+        ref_topic (str): Reference pose topic
+        window_duration (float): Window length in seconds
+        max_diff (float): Largest association time difference in seconds
+        time_offset (float): Offset in seconds added to estimated timestamps
+        align (bool): Fit a Umeyama alignment per window before the APE
+    """
+
+    def __init__(self, est_topic: str, ref_topic: str, window_duration: float, max_diff: float,
+                 buffer_size: int, time_offset: float = 0.0, align: bool = True):
+        self.est_topic = est_topic
+        self.ref_topic = ref_topic
+        self.window_duration = window_duration
+        self.max_diff = max_diff
+        self.time_offset = time_offset
+        self.align = align
+        self.buffers = {est_topic: PoseRingBuffer(buffer_size), ref_topic: PoseRingBuffer(buffer_size)}
+
+    def update(self, topic: str, poses: np.ndarray):
+        """
+        Add decoded poses of a topic; other topics are ignored.
+
+        Args:
+            topic (str): Topic of the poses
+            poses (np.ndarray): Nx8 poses in TUM column order, sorted by time
+        """
+        if topic in self.buffers and len(poses):
+            self.buffers[topic].extend(poses)
+
+    def evaluate(self) -> dict:
+        """
+        Compute the metrics of the window ending at the newest pose.
+
+        Returns:
+            dict: Window bounds, matched pose count and ATE/RPE statistics,
+                or None if fewer than two poses could be associated
+        """
+        window_end = max(buffer.latest_time() for buffer in self.buffers.values())
+        window_start = window_end - self.window_duration
+        ref = self.buffers[self.ref_topic].since(window_start)
+        est = self.buffers[self.est_topic].since(window_start)
+        ref_ids, est_ids = associate(ref[:, 0], est[:, 0], self.max_diff, self.time_offset)
+        if len(ref_ids) < 2:
+            return None
+        ref, est = ref[ref_ids], est[est_ids]
+        ref_wxyz, est_wxyz = ref[:, [7, 4, 5, 6]], est[:, [7, 4, 5, 6]]
+
+        aligned_xyz, aligned_wxyz, scale = est[:, 1:4], est_wxyz, 1.0
+        if self.align and len(ref) >= 3:
+            transform = align_positions(est[:, 1:4], ref[:, 1:4])
+            aligned_xyz = transform.apply_positions(est[:, 1:4])
+            aligned_wxyz = transform.apply_orientations(est_wxyz)
+            scale = transform.scale
+        errors = compute_errors(ref[:, 1:4], ref_wxyz, est[:, 1:4], est_wxyz, aligned_xyz, aligned_wxyz)
+
+        result = {
+            "window_start": float(window_start),
+            "window_end": float(window_end),
+            "matched_poses": len(ref_ids),
+            "alignment_scale": float(scale),
+        }
+        for name, prefix in (("ape_trans", "ate"), ("ape_rot", "ate_rot"),
+                             ("rpe_trans", "rpe"), ("rpe_rot", "rpe_rot")):
+            stats = error_statistics(getattr(errors, name))
+            for key in ("rmse", "mean", "median", "std", "min", "max"):
+                result[f"{prefix}_{key}"] = stats[key]
+        return result
@@ -0,0 +1,155 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+import logging
+import time
+import numpy as np
+from src.bag_processor.bag_reader import open_bag_reader
+from src.utils.pose_decoder import encode_pose_stamped
+from src.utils.synthetic import POSE_TYPE, make_trajectory, perturb_trajectory
+
+class Ros2PoseSource:
+    """
+    Subscribes to PoseStamped topics of a running ROS2 graph.
+
+    Messages are received serialised (raw subscriptions), so they are decoded
+    in batches by the same NumPy decoder as bag messages, and stamped with the
+    node clock on arrival like rosbag2 does. rclpy is imported on first use,
+    so the rest of the live mode works without a ROS2 installation.
+
+    Attributes:
+        topics (list): Topics to subscribe to, or None to discover them
+        node_name (str): Name of the subscribing node
+        discovery_timeout (float): Seconds to wait for pose topics to appear
+    """
+
+    def __init__(self, topics: list = None, node_name: str = 'trajectory_live_evaluator',
+                 discovery_timeout: float = 5.0):
+        self.topics = topics
+        self.node_name = node_name
+        self.discovery_timeout = discovery_timeout
+        self.logger = logging.getLogger(__name__)
+
+    def spin(self, callback, should_stop):
+        """
+        Deliver messages until should_stop() returns True.
+
+        Args:
+            callback (callable): Called with (topic, serialised data, timestamp in ns)
+            should_stop (callable): Polled between message deliveries
+        """
+        import rclpy
+        from geometry_msgs.msg import PoseStamped
+
+        rclpy.init()
+        node = rclpy.create_node(self.node_name)
+        try:
+            topics = self.topics or self._discover(rclpy, node)
+            clock = node.get_clock()
+            for topic in topics:
+                self.logger.info(f"Subscribing to {topic}")
+                node.create_subscription(
+                    PoseStamped, topic,
+                    lambda data, topic=topic: callback(topic, data, clock.now().nanoseconds),
+                    100, raw=True
+                )
+            while not should_stop():
+                rclpy.spin_once(node, timeout_sec=0.1)
+        finally:
+            node.destroy_node()
+            rclpy.shutdown()
+
+    def _discover(self, rclpy, node) -> list:
+        """
+        Wait for topics of the PoseStamped type, as BagProcessor selects them from a bag.
+        """
+        deadline = time.monotonic() + self.discovery_timeout
+        while True:
+            topics = [name for name, types in node.get_topic_names_and_types() if POSE_TYPE in types]
+            if len(topics) >= 2 or time.monotonic() > deadline:
+                return topics
+            rclpy.spin_once(node, timeout_sec=0.1)
+
+class FakePosePublisher:
+    """
+    Replays recorded or synthetic pose messages in place of a live ROS2 graph.
+
+    Offers the same spin() interface as Ros2PoseSource, so live evaluation
+    can be exercised without a robot or a ROS2 installation.
+
+    Attributes:
+        messages: Iterable of (topic, serialised data, timestamp in ns) in time order
+        speed (float): Replay speed relative to real time, None to replay as fast as possible
+    """
+
+    def __init__(self, messages, speed: float = None):
+        self.messages = messages
+        self.speed = speed
+
+    def spin(self, callback, should_stop):
+        """
+        Deliver messages until they run out or should_stop() returns True.
+
+        Args:
+            callback (callable): Called with (topic, serialised data, timestamp in ns)
+            should_stop (callable): Polled between message deliveries
+        """
+        wall_start = first_stamp = None
+        for topic, data, timestamp in self.messages:
+            if should_stop():
+                return
+            if self.speed:
+                if first_stamp is None:
+                    wall_start, first_stamp = time.monotonic(), timestamp
+                delay = (timestamp - first_stamp) / 1e9 / self.speed - (time.monotonic() - wall_start)
+                if delay > 0:
+                    time.sleep(delay)
+            callback(topic, data, timestamp)
+
+def bag_messages(bag_path: str, topics: list = None, storage_id: str = 'sqlite3'):
+    """
+    Messages of a recorded bag in timestamp order.
+
+    Args:
+        bag_path (str): Bag directory or .db3 file
+        topics (list, optional): Topics to read. Defaults to all PoseStamped topics
+        storage_id (str): rosbag2 storage plugin id
+
+    Yields:
+        tuple: (topic, serialised data, timestamp in ns)
+    """
+    reader = open_bag_reader(bag_path, storage_id)
+    try:
+        if topics is None:
+            topics = [topic.name for topic in reader.get_all_topics_and_types() if topic.type == POSE_TYPE]
+        for batch in reader.read_batches(topics=topics):
+            yield from batch
+    finally:
+        reader.close()
+
+def synthetic_messages(est_topic: str, ref_topic: str, duration: float = 60.0,
+                       rate: float = 50.0, noise: float = 0.05, drift: float = 0.0,
+                       start_time: float = None, seed: int = 0):
+    """
+    Serialised messages of a synthetic reference and a perturbed estimate.
+
+    Args:
+        est_topic (str): Topic of the estimated poses
+        ref_topic (str): Topic of the reference poses
+        duration (float): Length in seconds
+        rate (float): Pose rate of both topics in Hz
+        noise (float): Position noise of the estimate in metres
+        drift (float): Position drift of the estimate in metres per second
+        start_time (float, optional): First timestamp in seconds. Defaults to now.
+        seed (int): Seed of the trajectory and noise
+
+    Yields:
+        tuple: (topic, serialised data, timestamp in ns)
+    """
+    start_time = time.time() if start_time is None else start_time
+    reference = make_trajectory(duration, rate, start_time=start_time, seed=seed)
+    estimate = perturb_trajectory(reference, noise=noise, drift=drift, seed=seed + 1)
+    stamps_ns = np.round(reference[:, 0] * 1e9).astype(np.int64)
+    for i, ns in enumerate(stamps_ns.tolist()):
+        sec, nanosec = divmod(ns, 1_000_000_000)
+        yield ref_topic, encode_pose_stamped(sec, nanosec, 'map', reference[i, 1:]), ns
+        yield est_topic, encode_pose_stamped(sec, nanosec, 'map', estimate[i, 1:]), ns
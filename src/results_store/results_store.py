@@ -0,0 +1,263 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+from pathlib import Path
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+import uuid
+import numpy as np
+import pandas as pd
+from src.bag_processor.segment_manifest import load_manifest
+
+# Segment metrics stored as indexed columns; the full metrics dict is kept as JSON
+METRIC_COLUMNS = (
+    'ate_rmse', 'ate_mean', 'ate_median', 'ate_max', 'ate_rot_rmse',
+    'rpe_rmse', 'rpe_mean', 'rpe_rot_rmse', 'duration', 'trajectory_length',
+    'scale_drift', 'alignment_scale', 'tracking_success_rate',
+)
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs(
+    run_id TEXT PRIMARY KEY, bag TEXT NOT NULL, output_dir TEXT, started_at REAL NOT NULL,
+    finished_at REAL, config_hash TEXT NOT NULL, settings TEXT, segment_count INTEGER,
+    failed_segments INTEGER);
+CREATE TABLE IF NOT EXISTS segments(
+    run_id TEXT NOT NULL REFERENCES runs(run_id), segment_id TEXT NOT NULL,
+    segment_index INTEGER, bag TEXT NOT NULL, config_hash TEXT NOT NULL,
+    start_time REAL, end_time REAL, {', '.join(f'{c} REAL' for c in METRIC_COLUMNS)},
+    metrics TEXT NOT NULL, PRIMARY KEY (run_id, segment_id));
+CREATE INDEX IF NOT EXISTS runs_bag_idx ON runs(bag, started_at);
+CREATE INDEX IF NOT EXISTS runs_started_idx ON runs(started_at);
+CREATE INDEX IF NOT EXISTS runs_config_idx ON runs(config_hash, started_at);
+CREATE INDEX IF NOT EXISTS segments_bag_idx ON segments(bag, start_time);
+CREATE INDEX IF NOT EXISTS segments_time_idx ON segments(start_time, end_time);
+CREATE INDEX IF NOT EXISTS segments_config_idx ON segments(config_hash);
+"""
+
+def config_hash(settings: dict) -> str:
+    """
+    Short digest of the settings a run's results depend on.
+
+    Args:
+        settings (dict): JSON-serialisable settings
+
+    Returns:
+        str: Hex digest
+    """
+    payload = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+class ResultsStore:
+    """
+    SQLite database of run and segment metrics across all analysis runs.
+
+    Every run is appended in a single transaction, so readers never see a
+    partial run. The database uses write-ahead logging and a busy timeout,
+    so analysis processes appending concurrently (e.g. a batch of bags)
+    wait for each other instead of failing, while readers are not blocked.
+    Segments are indexed by run, bag, time range and config hash.
+
+    Attributes:
+        path (Path): Database file
+        timeout (float): Seconds a writer waits for the database lock
+    """
+
+    def __init__(self, path: str, timeout: float = 60.0):
+        self.path = Path(path)
+        self.timeout = timeout
+        self.logger = logging.getLogger(__name__)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _transaction(self):
+        # A new connection per transaction keeps the store safe to share with forked workers
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        return _Transaction(conn)
+
+    def record_run(self, bag: str, settings: dict, all_metrics: list, failures: list = None,
+                   output_dir: str = None, started_at: float = None, run_id: str = None) -> str:
+        """
+        Append a run and its segment metrics in one transaction.
+
+        Segment time ranges are taken from the segments' manifest.json when
+        output_dir is given.
+
+        Args:
+            bag (str): Path of the analysed bag
+            settings (dict): Settings the results depend on, hashed into config_hash
+            all_metrics (list): Segment metrics dicts as in analysis_summary.json
+            failures (list, optional): {"segment_id", "error"} dicts of failed segments
+            output_dir (str, optional): Output directory holding the segment directories
+            started_at (float, optional): Run start as a Unix time. Defaults to now.
+            run_id (str, optional): Identifier of the run. Defaults to a new random id.
+
+        Returns:
+            str: The run id
+        """
+        run_id = run_id or uuid.uuid4().hex[:16]
+        digest = config_hash(settings)
+        bag = str(Path(bag).resolve())
+        now = time.time()
+        rows = []
+        for metrics in all_metrics:
+            segment_id = metrics["segment_id"]
+            start_time = end_time = None
+            if output_dir is not None:
+                try:
+                    manifest = load_manifest(Path(output_dir) / segment_id)
+                    start_time, end_time = manifest["start_time"] / 1e9, manifest["end_time"] / 1e9
+                except FileNotFoundError:
+                    pass
+            index = segment_id.rsplit('_', 1)[-1]
+            rows.append((run_id, segment_id, int(index) if index.isdigit() else None, bag, digest,
+                         start_time, end_time, *(metrics.get(c) for c in METRIC_COLUMNS),
+                         json.dumps(metrics)))
+
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, bag, str(output_dir) if output_dir is not None else None,
+                 started_at if started_at is not None else now, now, digest,
+                 json.dumps(settings, sort_keys=True, default=str), len(all_metrics), len(failures or []))
+            )
+            conn.executemany(
+                f"INSERT INTO segments VALUES ({', '.join('?' * (7 + len(METRIC_COLUMNS) + 1))})", rows)
+        self.logger.info(f"Recorded run {run_id} with {len(rows)} segments in {self.path}")
+        return run_id
+
+    def runs(self, bag: str = None, config_hash: str = None, since: float = None,
+             limit: int = None) -> pd.DataFrame:
+        """
+        Runs, most recent first.
+
+        Args:
+            bag (str, optional): Only runs of this bag
+            config_hash (str, optional): Only runs with these settings
+            since (float, optional): Only runs started at or after this Unix time
+            limit (int, optional): Maximum number of runs
+
+        Returns:
+            pd.DataFrame: One row per run
+        """
+        where, params = _where([("bag = ?", _resolve(bag)), ("config_hash = ?", config_hash),
+                                ("started_at >= ?", since)])
+        query = f"SELECT * FROM runs{where} ORDER BY started_at DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        return self._query(query, params)
+
+    def segments(self, columns: list = None, run_ids: list = None, bag: str = None,
+                 config_hash: str = None, start_time: float = None, end_time: float = None) -> pd.DataFrame:
+        """
+        Segment metrics matching all given filters.
+
+        Args:
+            columns (list, optional): Metric columns to return. Defaults to all of METRIC_COLUMNS.
+            run_ids (list, optional): Only segments of these runs
+            bag (str, optional): Only segments of this bag
+            config_hash (str, optional): Only segments analysed with these settings
+            start_time (float, optional): Only segments ending after this Unix time
+            end_time (float, optional): Only segments starting before this Unix time
+
+        Returns:
+            pd.DataFrame: Identifying columns (run, bag, segment, time range,
+                config hash) and the requested metrics
+        """
+        columns = _metric_columns(columns)
+        where, params = _where([("bag = ?", _resolve(bag)), ("config_hash = ?", config_hash),
+                                ("end_time > ?", start_time), ("start_time < ?", end_time)])
+        if run_ids is not None:
+            where += (" AND " if where else " WHERE ") + f"run_id IN ({', '.join('?' * len(run_ids))})"
+            params += list(run_ids)
+        select = ", ".join(["run_id", "segment_id", "segment_index", "bag", "config_hash",
+                            "start_time", "end_time", *columns])
+        return self._query(f"SELECT {select} FROM segments{where} ORDER BY run_id, segment_index", params)
+
+    def metric_trend(self, metric: str, last_runs: int = 200, bag: str = None,
+                     config_hash: str = None) -> pd.DataFrame:
+        """
+        Per-run aggregate of a segment metric over the most recent runs.
+
+        The aggregation runs inside SQLite, so only one row per run is loaded.
+
+        Args:
+            metric (str): One of METRIC_COLUMNS, e.g. 'ate_rmse'
+            last_runs (int): Number of most recent runs
+            bag (str, optional): Only runs of this bag
+            config_hash (str, optional): Only runs with these settings
+
+        Returns:
+            pd.DataFrame: run_id, bag, started_at, segments, mean, max and
+                duration-weighted RMS of the metric, oldest run first
+        """
+        (metric,) = _metric_columns([metric])
+        where, params = _where([("bag = ?", _resolve(bag)), ("config_hash = ?", config_hash)])
+        query = f"""
+            SELECT r.run_id, r.bag, r.started_at, COUNT(s.segment_id) AS segments,
+                   AVG(s.{metric}) AS mean, MAX(s.{metric}) AS max,
+                   SUM(s.{metric} * s.{metric} * s.duration) AS weighted_sse, SUM(s.duration) AS duration
+            FROM (SELECT * FROM runs{where} ORDER BY started_at DESC LIMIT ?) r
+            JOIN segments s ON s.run_id = r.run_id
+            GROUP BY r.run_id ORDER BY r.started_at
+        """
+        trend = self._query(query, params + [int(last_runs)])
+        trend["rms"] = np.sqrt(trend.pop("weighted_sse") / trend.pop("duration"))
+        return trend
+
+    def _query(self, query: str, params: list) -> pd.DataFrame:
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=self.timeout)
+        try:
+            return pd.read_sql_query(query, conn, params=params)
+        finally:
+            conn.close()
+
+class _Transaction:
+    """
+    Context manager running a connection's statements in one IMMEDIATE transaction.
+
+    IMMEDIATE takes the write lock up front, so concurrent writers queue on
+    the busy timeout instead of failing when upgrading a read lock.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.conn.close()
+
+def _metric_columns(columns: list) -> list:
+    """
+    Validate metric column names, which are interpolated into SQL.
+    """
+    columns = list(columns) if columns is not None else list(METRIC_COLUMNS)
+    unknown = set(columns) - set(METRIC_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown metric columns: {sorted(unknown)}")
+    return columns
+
+def _resolve(bag: str) -> str:
+    return str(Path(bag).resolve()) if bag is not None else None
+
+def _where(conditions: list) -> tuple:
+    """
+    Build a WHERE clause from (SQL condition, value) pairs, skipping None values.
+    """
+    conditions = [(sql, value) for sql, value in conditions if value is not None]
+    if not conditions:
+        return "", []
+    return " WHERE " + " AND ".join(sql for sql, _ in conditions), [value for _, value in conditions]
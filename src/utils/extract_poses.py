@@ -1,70 +1,200 @@
 # Copyright 2024
 # Author: Usamah Zaheer
-from rclpy.serialization import deserialize_message
-from geometry_msgs.msg import PoseStamped
+from functools import partial
 from pathlib import Path
 import logging
+import weakref
+import numpy as np
+from src.utils.performance import span
+from src.utils.pose_decoder import decode_pose_stamped_batch
+from src.utils.pose_store import (DEFAULT_CHUNK_POSES, POSE_COLUMNS, POSE_SPILL_SUFFIX, PoseSpill,
+                                  load_poses, pose_filename, save_poses)
+
+# Number of pose messages buffered per topic before they are decoded and written
+POSE_BATCH_SIZE = 4096
+
+class PoseFile:
+    """
+    Buffered writer for the poses of a single topic.
+    
+    Serialised messages are collected and decoded in batches with
+    decode_pose_stamped_batch instead of being deserialised one by one.
+    Decoded poses are saved to a binary pose store on close and can also
+    be exported as a TUM text file. Without a filepath the poses are only
+    kept in memory and returned by close().
+    
+    With a spill, decoded batches are appended to a scratch file instead of
+    being kept in memory, and the pose store is written from it chunk by
+    chunk, so memory use does not grow with the number of poses.
+    
+    Attributes:
+        filepath (Path): Path to the .npy pose store, or None for in-memory use
+        tum_path (Path): Path to the TUM text export, or None if disabled
+        stats (TopicStats): Statistics updated with every decoded batch, or None
+        batch_size (int): Number of messages buffered before a flush
+        on_batch (callable): Called with every decoded Nx8 chunk, or None
+        spill (PoseSpill): Scratch file receiving the decoded poses, or None
+    """
+
+    def __init__(self, filepath: Path = None, write_tum: bool = False, stats=None,
+                 batch_size: int = POSE_BATCH_SIZE, on_batch=None, spill: PoseSpill = None):
+        self.filepath = Path(filepath) if filepath is not None else None
+        self.stats = stats
+        self.tum_path = self.filepath.with_suffix('.txt') if write_tum and filepath else None
+        self.batch_size = batch_size
+        self.on_batch = on_batch
+        self.spill = spill
+        self._tum_fh = open(self.tum_path, 'w') if self.tum_path else None
+        self._chunks = []
+        self._data = []
+        self._timestamps = []
+
+    def append(self, data: bytes, timestamp: int):
+        """
+        Buffer a serialised pose message.
+        
+        Args:
+            data (bytes): Serialised PoseStamped message
+            timestamp (int): Message timestamp in nanoseconds
+        """
+        self._data.append(data)
+        self._timestamps.append(timestamp)
+        if len(self._data) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Decode buffered messages into the pending pose array.
+        """
+        if not self._data:
+            return
+        with span('decode', items=len(self._data)):
+            poses, _ = decode_pose_stamped_batch(self._data)
+        timestamps_seconds = np.asarray(self._timestamps, dtype=np.int64) / 1e9
+        chunk = np.column_stack([timestamps_seconds, poses])
+        if self.stats is not None:
+            self.stats.update(timestamps_seconds)
+        if self.on_batch is not None:
+            self.on_batch(chunk)
+        if self.spill is not None:
+            self.spill.append(chunk)
+        else:
+            self._chunks.append(chunk)
+        if self._tum_fh is not None:
+            np.savetxt(self._tum_fh, chunk, fmt='%.4f')
+        self._data = []
+        self._timestamps = []
+
+    def close(self) -> np.ndarray:
+        """
+        Flush remaining messages and write the pose store.
+        
+        Returns:
+            np.ndarray: Nx8 array of all poses in POSE_COLUMNS order; a read-only
+                memory map of the pose store, or of the spill without a store,
+                when the poses were spilled
+        """
+        self.flush()
+        if self.spill is not None:
+            return self._close_spill()
+        poses = np.concatenate(self._chunks or [np.empty((0, len(POSE_COLUMNS)))])
+        self._chunks = []
+        with span('segment_write', items=len(poses), file=self.filepath.name if self.filepath else None):
+            if self.filepath is not None:
+                save_poses(self.filepath, poses)
+            if self._tum_fh is not None:
+                self._tum_fh.close()
+        return poses
+    
+    def _close_spill(self) -> np.ndarray:
+        """
+        Write the pose store from the spill and delete the scratch file.
+        """
+        self.spill.close()
+        with span('segment_write', items=len(self.spill), file=self.filepath.name if self.filepath else None):
+            if self.filepath is not None:
+                self.spill.save(self.filepath)
+                poses = load_poses(self.filepath)
+            else:
+                poses = self.spill.array()
+            if self._tum_fh is not None:
+                self._tum_fh.close()
+        if self.filepath is None and isinstance(poses, np.memmap):
+            # Without a pose store the caller reads the spill itself; it is deleted
+            # once the map and every view of it are released
+            weakref.finalize(poses, self.spill.remove)
+        else:
+            self.spill.remove()
+        return poses
 
 def write_pose_message(topic_name, data, timestamp, segment, pose_files):
     """
-    Write pose messages to both bag and text files in TUM format.
+    Write pose messages to both the bag and the topic's pose store.
     
     Args:
         topic_name (str): Name of the ROS topic
         data (bytes): Serialized pose message data
         timestamp (int): Message timestamp in nanoseconds
-        segment (SequentialWriter): Bag segment writer
-        pose_files (dict): Dictionary of open file handles for pose data
-        
+        segment (SequentialWriter): Bag segment writer, or None to skip the bag
+        pose_files (dict): Dictionary of PoseFile writers for pose data
+    
     Raises:
-        Exception: If writing to bag or text file fails
+        Exception: If writing to bag or pose file fails
     """
-    logger = logging.getLogger(__name__)
-    
     try:
         # Write to bag
-        segment.write(topic_name, data, timestamp)
-        
-        # Write to pose file if applicable
+        if segment is not None:
+            segment.write(topic_name, data, timestamp)
+
+        # Buffer for the pose file if applicable; decoding happens in batches
         if topic_name in pose_files:
-            msg = deserialize_message(data, PoseStamped)
-            pos = msg.pose.position
-            ori = msg.pose.orientation
-            timestamp_seconds = timestamp / 1e9
-            
-            # TUM format
-            pose_files[topic_name].write(
-                f'{timestamp_seconds:.4f} {pos.x:.4f} {pos.y:.4f} {pos.z:.4f} '
-                f'{ori.x:.4f} {ori.y:.4f} {ori.z:.4f} {ori.w:.4f}\n'
-            )
+            pose_files[topic_name].append(data, timestamp)
     except Exception as e:
+        logger = logging.getLogger(__name__)
         logger.error(f"Error writing pose message for topic {topic_name}: {str(e)}")
         raise
 
-def open_pose_files(segment_path: Path, pose_topics: list) -> dict:
+def open_pose_files(segment_path: Path, pose_topics: list, write_tum: bool = False,
+                    write_store: bool = True, quality=None, online=None, spill_dir: Path = None,
+                    chunk_poses: int = DEFAULT_CHUNK_POSES) -> dict:
     """
-    Open text files for writing pose data for each topic.
+    Open pose writers for each topic.
     
     Args:
         segment_path (Path): Path to the segment directory
         pose_topics (list): List of pose topic names
-        
+        write_tum (bool): Also export TUM text files next to the pose stores
+        write_store (bool): Write pose stores to disk; if False poses stay in memory
+        quality (SegmentQuality, optional): Collects per-topic statistics while decoding
+        online (OnlineEvaluator, optional): Receives every decoded batch with its topic
+        spill_dir (Path, optional): Directory for scratch files that decoded poses
+            are spilled to instead of being kept in memory
+        chunk_poses (int): Rows per chunk when writing a spilled pose store
+    
     Returns:
-        dict: Dictionary mapping topic names to open file handles
+        dict: Dictionary mapping topic names to PoseFile writers
     """
     pose_files = {}
     for topic in pose_topics:
-        filename = topic.strip('/').replace('/', '_') + '.txt'
-        filepath = segment_path / "poses" / filename
-        pose_files[topic] = open(filepath, 'w')
+        filepath = segment_path / "poses" / pose_filename(topic) if write_store else None
+        stats = quality.topics[topic] if quality is not None else None
+        on_batch = partial(online.update, topic) if online is not None else None
+        spill = None
+        if spill_dir is not None:
+            spill_name = f"{Path(segment_path).name}_{pose_filename(topic, suffix=POSE_SPILL_SUFFIX)}"
+            spill = PoseSpill(Path(spill_dir) / spill_name, chunk_poses)
+        pose_files[topic] = PoseFile(filepath, write_tum=write_tum, stats=stats, on_batch=on_batch,
+                                     spill=spill)
     return pose_files
 
-def close_pose_files(pose_files: dict):
+def close_pose_files(pose_files: dict) -> dict:
     """
-    Close all open pose files.
+    Flush and close all open pose files.
     
     Args:
-        pose_files (dict): Dictionary of open file handles to close
+        pose_files (dict): Dictionary of PoseFile writers to close
+        
+    Returns:
+        dict: Dictionary mapping topic names to Nx8 pose arrays
     """
-    for fh in pose_files.values():
-        fh.close()
+    return {topic: pose_file.close() for topic, pose_file in pose_files.items()}
@@ -0,0 +1,340 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+from pathlib import Path
+import json
+import logging
+import os
+import sys
+import time
+import numpy as np
+from src.utils.config import Config
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+PERF_LOGGER_NAME = 'performance'
+
+# Prefix of every metric in the Prometheus textfile
+METRIC_PREFIX = 'trajectory_analyzer'
+
+# Per-process state: None until the first span reads logging.performance from the config
+_state = None
+
+class _NullSpan:
+    """
+    Span returned while instrumentation is disabled; every operation is a no-op.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def add(self, items: int = 0, nbytes: int = 0):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class Span:
+    """
+    Timing span around one pipeline stage, written as a JSON line on exit.
+
+    Attributes:
+        stage (str): Stage name, e.g. 'decode' or 'alignment'
+        labels (dict): Extra fields of the record, e.g. segment or topic
+        items (int): Messages or poses processed in the span
+        nbytes (int): Bytes read in the span
+    """
+
+    def __init__(self, stage: str, items: int = 0, nbytes: int = 0, **labels):
+        self.stage = stage
+        self.labels = labels
+        self.items = items
+        self.nbytes = nbytes
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        emit(self.stage, time.perf_counter() - self._start, self.items, self.nbytes,
+             failed=exc_type is not None, **self.labels)
+        return False
+
+    def add(self, items: int = 0, nbytes: int = 0):
+        """
+        Count items and bytes processed in the span.
+        """
+        self.items += items
+        self.nbytes += nbytes
+
+class _JsonSpanFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.span)
+
+def configure_performance(jsonl_path: str = None, prometheus_path: str = None):
+    """
+    Enable or disable stage spans in this process.
+
+    Spans are logged by the 'performance' logger as JSON lines appended to
+    jsonl_path; the logger does not propagate, so spans stay out of the
+    analysis log. Forked worker processes inherit the setting, spawned ones
+    read it from the config.
+
+    Args:
+        jsonl_path (str, optional): JSON lines file receiving the spans. None disables spans.
+        prometheus_path (str, optional): Textfile written by export_prometheus
+    """
+    global _state
+    perf_logger = logging.getLogger(PERF_LOGGER_NAME)
+    for handler in [h for h in perf_logger.handlers if isinstance(h.formatter, _JsonSpanFormatter)]:
+        perf_logger.removeHandler(handler)
+        handler.close()
+    _state = {"enabled": jsonl_path is not None, "jsonl_path": jsonl_path,
+              "prometheus_path": prometheus_path, "logger": perf_logger}
+    if jsonl_path is None:
+        return
+    Path(jsonl_path).parent.mkdir(parents=True, exist_ok=True)
+    handler = logging.FileHandler(jsonl_path)
+    handler.setFormatter(_JsonSpanFormatter())
+    perf_logger.addHandler(handler)
+    perf_logger.setLevel(logging.INFO)
+    perf_logger.propagate = False
+
+def configure_from_config(root_dir: Path = None):
+    """
+    Apply the logging.performance settings of the config.
+
+    Args:
+        root_dir (Path, optional): Directory relative paths are resolved
+            against. Defaults to the repository root.
+    """
+    config = Config().get('logging', 'performance', default={}) or {}
+    if not config.get('enabled', False):
+        configure_performance(None)
+        return
+    root_dir = Path(root_dir) if root_dir is not None else Path(__file__).parent.parent.parent
+    prometheus_path = config.get('prometheus_path')
+    configure_performance(root_dir / config.get('jsonl_path', 'logs/performance.jsonl'),
+                          root_dir / prometheus_path if prometheus_path else None)
+
+def performance_enabled() -> bool:
+    """
+    Whether stage spans are recorded in this process.
+    """
+    if _state is None:
+        configure_from_config()
+    return _state["enabled"]
+
+def span(stage: str, items: int = 0, nbytes: int = 0, **labels):
+    """
+    Context manager timing a stage.
+
+    While instrumentation is disabled a shared no-op span is returned, so
+    instrumented code costs one function call and a flag check.
+
+    Args:
+        stage (str): Stage name
+        items (int): Messages or poses processed, if known up front
+        nbytes (int): Bytes read, if known up front
+        **labels: Extra JSON fields, e.g. segment='segment_3'
+
+    Returns:
+        Span: Span to use in a with statement
+    """
+    if not performance_enabled():
+        return _NULL_SPAN
+    return Span(stage, items, nbytes, **labels)
+
+def emit(stage: str, seconds: float, items: int = 0, nbytes: int = 0, **labels):
+    """
+    Write one span record.
+
+    Args:
+        stage (str): Stage name
+        seconds (float): Wall time of the stage
+        items (int): Messages or poses processed
+        nbytes (int): Bytes read
+        **labels: Extra JSON fields
+    """
+    if not performance_enabled():
+        return
+    record = {
+        "time": time.time(), "stage": stage, "seconds": seconds, "items": items, "bytes": nbytes,
+        "items_per_s": items / seconds if items and seconds > 0 else None,
+        "peak_rss_bytes": peak_rss_bytes(), "pid": os.getpid(), **labels,
+    }
+    _state["logger"].info(stage, extra={"span": record})
+
+def timed_batches(batches, stage: str = 'read', **labels):
+    """
+    Time the fetching of every batch from an iterator of message batches.
+
+    Only the time spent producing a batch is counted, not the time the
+    consumer spends on it. Returns the iterator unchanged while disabled.
+
+    Args:
+        batches: Iterator of lists of (topic name, serialized data, timestamp)
+        stage (str): Stage name of the spans
+        **labels: Extra JSON fields
+
+    Yields:
+        list: The batches of the wrapped iterator
+    """
+    if not performance_enabled():
+        return batches
+    return _timed_batches(iter(batches), stage, labels)
+
+def _timed_batches(batches, stage: str, labels: dict):
+    while True:
+        start = time.perf_counter()
+        try:
+            batch = next(batches)
+        except StopIteration:
+            return
+        emit(stage, time.perf_counter() - start, len(batch), sum(len(data) for _, data, _ in batch), **labels)
+        yield batch
+
+def peak_rss_bytes() -> int:
+    """
+    Peak resident set size of this process in bytes, or None if unknown.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def load_spans(jsonl_path: str, since: float = None) -> list:
+    """
+    Read span records, skipping lines cut short by a crash.
+
+    Args:
+        jsonl_path (str): JSON lines file written by the spans
+        since (float, optional): Only spans ending at or after this Unix time
+
+    Returns:
+        list: Span record dicts
+    """
+    spans = []
+    try:
+        with open(jsonl_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if since is None or record["time"] >= since:
+                    spans.append(record)
+    except FileNotFoundError:
+        pass
+    return spans
+
+def summarise_spans(spans: list) -> dict:
+    """
+    Aggregate span records per stage.
+
+    Args:
+        spans (list): Span record dicts
+
+    Returns:
+        dict: Stage mapped to count, seconds, items, bytes, items_per_s,
+              peak_rss_bytes and latency quantiles (p50, p95, max) of its spans
+    """
+    stages = {}
+    for record in spans:
+        stages.setdefault(record["stage"], []).append(record)
+    summary = {}
+    for stage, records in sorted(stages.items()):
+        seconds = np.array([r["seconds"] for r in records])
+        items = sum(r.get("items") or 0 for r in records)
+        summary[stage] = {
+            "count": len(records),
+            "seconds": float(seconds.sum()),
+            "items": items,
+            "bytes": sum(r.get("bytes") or 0 for r in records),
+            "items_per_s": items / seconds.sum() if items and seconds.sum() > 0 else None,
+            "peak_rss_bytes": max((r.get("peak_rss_bytes") or 0 for r in records), default=0),
+            "p50": float(np.percentile(seconds, 50)),
+            "p95": float(np.percentile(seconds, 95)),
+            "max": float(seconds.max()),
+        }
+    return summary
+
+def write_prometheus(path: str, summary: dict, labels: dict = None):
+    """
+    Write stage aggregates in the Prometheus text format for the node
+    exporter's textfile collector.
+
+    The file is replaced atomically, so the collector never reads a partial file.
+
+    Args:
+        path (str): Destination .prom file
+        summary (dict): Result of summarise_spans
+        labels (dict, optional): Labels added to every sample, e.g. {"bag": "run_1"}
+    """
+    base = dict(labels or {})
+
+    def sample(name, value, **extra):
+        pairs = ",".join(f'{key}="{_escape(val)}"' for key, val in {**base, **extra}.items())
+        return f"{METRIC_PREFIX}_{name}{{{pairs}}} {value}" if pairs else f"{METRIC_PREFIX}_{name} {value}"
+
+    metrics = [
+        ("stage_seconds", "gauge", "Wall time spent in the stage in the last run", "seconds"),
+        ("stage_calls", "gauge", "Spans recorded for the stage in the last run", "count"),
+        ("stage_items", "gauge", "Messages or poses processed by the stage in the last run", "items"),
+        ("stage_bytes", "gauge", "Bytes read by the stage in the last run", "bytes"),
+        ("stage_items_per_second", "gauge", "Throughput of the stage in the last run", "items_per_s"),
+        ("stage_peak_rss_bytes", "gauge", "Peak resident set size of the processes running the stage",
+         "peak_rss_bytes"),
+    ]
+    lines = []
+    for name, kind, help_text, key in metrics:
+        lines += [f"# HELP {METRIC_PREFIX}_{name} {help_text}", f"# TYPE {METRIC_PREFIX}_{name} {kind}"]
+        lines += [sample(name, stats[key], stage=stage) for stage, stats in summary.items()
+                  if stats[key] is not None]
+    lines += [f"# HELP {METRIC_PREFIX}_stage_latency_seconds Latency of a single span of the stage",
+              f"# TYPE {METRIC_PREFIX}_stage_latency_seconds gauge"]
+    for stage, stats in summary.items():
+        for quantile, key in (("0.5", "p50"), ("0.95", "p95"), ("1", "max")):
+            lines.append(sample("stage_latency_seconds", stats[key], stage=stage, quantile=quantile))
+    lines += [f"# HELP {METRIC_PREFIX}_last_run_timestamp_seconds Time the metrics were written",
+              f"# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge",
+              sample("last_run_timestamp_seconds", time.time())]
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+
+def export_prometheus(since: float, labels: dict = None) -> dict:
+    """
+    Aggregate the spans of a run into the configured Prometheus textfile.
+
+    Spans are read back from the JSON lines file, so spans of worker
+    processes are included.
+
+    Args:
+        since (float): Run start as a Unix time
+        labels (dict, optional): Labels added to every sample
+
+    Returns:
+        dict: The stage summary, or None if instrumentation or the textfile is disabled
+    """
+    if not performance_enabled() or _state["prometheus_path"] is None:
+        return None
+    for handler in _state["logger"].handlers:
+        handler.flush()
+    summary = summarise_spans(load_spans(_state["jsonl_path"], since))
+    write_prometheus(_state["prometheus_path"], summary, labels)
+    logging.getLogger(__name__).info(f"Wrote stage metrics of {len(summary)} stages to {_state['prometheus_path']}")
+    return summary
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,112 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+import struct
+import numpy as np
+
+# CDR little-endian encapsulation header (representation id 0x0001, options 0x0000)
+CDR_LE_HEADER = b'\x00\x01\x00\x00'
+ENCAPSULATION_SIZE = 4
+# stamp.sec (int32) + stamp.nanosec (uint32) + frame_id length (uint32)
+HEADER_FIXED_SIZE = 12
+# position x, y, z + orientation x, y, z, w as float64
+POSE_FIELDS = 7
+POSE_SIZE = POSE_FIELDS * 8
+
+def _pose_offset(frame_id_length):
+    """
+    Byte offset of the pose block for a given frame_id length (incl. terminator).
+
+    CDR aligns float64 to 8 bytes relative to the end of the encapsulation header.
+    """
+    return ENCAPSULATION_SIZE + ((HEADER_FIXED_SIZE + frame_id_length + 7) // 8) * 8
+
+def encode_pose_stamped(sec: int, nanosec: int, frame_id: str, pose) -> bytes:
+    """
+    Serialise a PoseStamped into little-endian CDR.
+
+    Args:
+        sec (int): Header stamp seconds
+        nanosec (int): Header stamp nanoseconds
+        frame_id (str): Header frame id
+        pose: Sequence of 7 floats (x, y, z, qx, qy, qz, qw)
+
+    Returns:
+        bytes: Serialised message, byte-compatible with rclpy.serialize_message
+    """
+    frame = frame_id.encode('utf-8') + b'\x00'
+    head = CDR_LE_HEADER + struct.pack('<iII', sec, nanosec, len(frame)) + frame
+    padding = b'\x00' * (_pose_offset(len(frame)) - len(head))
+    return head + padding + struct.pack('<7d', *pose)
+
+def decode_pose_stamped_batch(buffers: list) -> tuple:
+    """
+    Decode a batch of serialised PoseStamped messages with NumPy.
+
+    Buffers of equal length are stacked into one uint8 matrix and decoded
+    with strided views, so the per-message Python work is a dictionary
+    lookup. Buffers that are not little-endian CDR PoseStamped payloads are
+    decoded one by one through rclpy instead.
+
+    Args:
+        buffers (list): Serialised PoseStamped messages (bytes)
+
+    Returns:
+        tuple: (Nx7 float64 array of x, y, z, qx, qy, qz, qw,
+                N int64 array of header stamps in nanoseconds)
+    """
+    n = len(buffers)
+    poses = np.empty((n, POSE_FIELDS), dtype=np.float64)
+    stamps = np.empty(n, dtype=np.int64)
+
+    groups = {}
+    for i, buf in enumerate(buffers):
+        groups.setdefault(len(buf), []).append(i)
+
+    fallback = []
+    for length, indices in groups.items():
+        if length < ENCAPSULATION_SIZE + HEADER_FIXED_SIZE + POSE_SIZE:
+            fallback.extend(indices)
+            continue
+        indices = np.asarray(indices)
+        raw = np.frombuffer(b''.join(buffers[i] for i in indices), dtype=np.uint8)
+        raw = raw.reshape(len(indices), length)
+
+        header = raw[:, :ENCAPSULATION_SIZE + HEADER_FIXED_SIZE].copy()
+        is_cdr_le = (header[:, 0] == 0) & (header[:, 1] == 1)
+        fields = header[:, ENCAPSULATION_SIZE:].view('<u4')
+        offsets = ENCAPSULATION_SIZE + ((HEADER_FIXED_SIZE + fields[:, 2].astype(np.int64) + 7) // 8) * 8
+        valid = is_cdr_le & (offsets + POSE_SIZE == length)
+        fallback.extend(indices[~valid].tolist())
+
+        # Equal length and a valid layout imply the same pose offset
+        rows = indices[valid]
+        if rows.size == 0:
+            continue
+        offset = int(offsets[valid][0])
+        poses[rows] = raw[valid, offset:offset + POSE_SIZE].copy().view('<f8')
+        sec = fields[valid, 0].view('<i4').astype(np.int64)
+        stamps[rows] = sec * 1_000_000_000 + fields[valid, 1]
+
+    for i in fallback:
+        poses[i], stamps[i] = _deserialize_fallback(buffers[i])
+
+    return poses, stamps
+
+def _deserialize_fallback(data: bytes) -> tuple:
+    """
+    Decode a single PoseStamped through rclpy.
+
+    Args:
+        data (bytes): Serialised message
+
+    Returns:
+        tuple: (list of 7 pose values, header stamp in nanoseconds)
+    """
+    from rclpy.serialization import deserialize_message
+    from geometry_msgs.msg import PoseStamped
+
+    msg = deserialize_message(data, PoseStamped)
+    pos = msg.pose.position
+    ori = msg.pose.orientation
+    stamp = msg.header.stamp.sec * 1_000_000_000 + msg.header.stamp.nanosec
+    return [pos.x, pos.y, pos.z, ori.x, ori.y, ori.z, ori.w], stamp
@@ -0,0 +1,223 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+from pathlib import Path
+import numpy as np
+
+# Column layout of a pose store, matching the TUM field order
+POSE_COLUMNS = ('timestamp', 'x', 'y', 'z', 'qx', 'qy', 'qz', 'qw')
+POSE_STORE_SUFFIX = '.npy'
+POSE_SPILL_SUFFIX = '.spill'
+
+# Rows per chunk when poses are spilled to scratch files without a memory budget
+DEFAULT_CHUNK_POSES = 65536
+
+# Working memory per pose row of a chunk: the row itself and the association,
+# alignment and error temporaries derived from it
+WORKING_BYTES_PER_POSE = 2048
+MIN_CHUNK_POSES = 1024
+# Part of a memory budget taken by the bag reader's page cache and decoder buffers
+RESERVED_BUDGET_MB = 4
+
+def pose_filename(topic: str, suffix: str = POSE_STORE_SUFFIX) -> str:
+    """
+    Build the pose file name used for a topic inside a segment.
+    
+    Args:
+        topic (str): ROS topic name, e.g. /casestudy/predicted_pose
+        suffix (str): File suffix. Defaults to the binary store suffix
+    
+    Returns:
+        str: File name such as casestudy_predicted_pose.npy
+    """
+    return topic.strip('/').replace('/', '_') + suffix
+
+def save_poses(path: Path, poses: np.ndarray):
+    """
+    Save an Nx8 pose array as a column-major .npy file.
+    
+    Each column (timestamp, x, y, z, qx, qy, qz, qw) is contiguous on disk,
+    so memory-mapped readers touch only the columns they use. Timestamps
+    are stored as float64 seconds instead of being cut to 4 decimals.
+    
+    Args:
+        path (Path): Destination .npy path
+        poses (np.ndarray): Nx8 array in POSE_COLUMNS order
+    """
+    poses = np.asarray(poses, dtype=np.float64).reshape(-1, len(POSE_COLUMNS))
+    np.save(path, np.asfortranarray(poses), allow_pickle=False)
+
+def load_poses(path: Path) -> np.ndarray:
+    """
+    Open a pose store without copying it into memory.
+    
+    Args:
+        path (Path): Path to a .npy pose store
+    
+    Returns:
+        np.memmap: Read-only Nx8 array in POSE_COLUMNS order
+    """
+    return np.load(path, mmap_mode='r', allow_pickle=False)
+
+def count_poses(path: Path) -> int:
+    """
+    Number of poses in a store without reading the pose data.
+    
+    Args:
+        path (Path): Path to a .npy pose store
+    
+    Returns:
+        int: Number of stored poses
+    """
+    return load_poses(path).shape[0]
+
+
+def iter_pose_chunks(path: Path, chunk_poses: int = DEFAULT_CHUNK_POSES):
+    """
+    Read a pose store in chunks of rows.
+    
+    Every chunk is copied out of its own short-lived memory map, so the
+    pages of one chunk are released before the next is read and resident
+    memory stays at one chunk however large the store is.
+    
+    Args:
+        path (Path): Path to a .npy pose store
+        chunk_poses (int): Rows per chunk
+    
+    Yields:
+        np.ndarray: Up to chunk_poses x 8 poses in POSE_COLUMNS order
+    """
+    for start in range(0, count_poses(path), chunk_poses):
+        poses = load_poses(path)
+        chunk = np.array(poses[start:start + chunk_poses])
+        del poses
+        yield chunk
+
+def budget_chunk_poses(budget_mb: float) -> int:
+    """
+    Rows per chunk that keep the working set of out-of-core processing within a budget.
+    
+    RESERVED_BUDGET_MB of the budget is set aside for buffers that do not
+    scale with the chunk size. Budgets too small for MIN_CHUNK_POSES rows
+    still get that many.
+    
+    Args:
+        budget_mb (float): Memory budget in MiB for the data being processed,
+            on top of the interpreter and its libraries
+    
+    Returns:
+        int: Chunk size in rows, at least MIN_CHUNK_POSES
+    """
+    working_bytes = int((budget_mb - RESERVED_BUDGET_MB) * 2**20)
+    return max(MIN_CHUNK_POSES, working_bytes // WORKING_BYTES_PER_POSE)
+
+class PoseSpill:
+    """
+    Append-only scratch file of Nx8 poses, read back in memory-mapped chunks.
+    
+    Rows are appended as raw row-major float64 values, so memory use does not
+    grow with the number of poses. Reading maps one chunk at a time, like
+    iter_pose_chunks.
+    
+    Attributes:
+        path (Path): Scratch file path
+        chunk_poses (int): Rows per chunk read back
+        count (int): Number of rows appended
+    """
+    
+    def __init__(self, path: Path, chunk_poses: int = DEFAULT_CHUNK_POSES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.chunk_poses = chunk_poses
+        self.count = 0
+        self._fh = open(self.path, 'wb')
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def append(self, poses: np.ndarray):
+        """
+        Append poses to the end of the file.
+        
+        Args:
+            poses (np.ndarray): Nx8 poses in POSE_COLUMNS order
+        """
+        poses = np.ascontiguousarray(poses, dtype=np.float64).reshape(-1, len(POSE_COLUMNS))
+        self._fh.write(poses.tobytes())
+        self.count += len(poses)
+    
+    def rows(self, start: int, stop: int) -> np.ndarray:
+        """
+        Copy rows [start, stop) out of a memory map of the file.
+        
+        Args:
+            start (int): First row
+            stop (int): Row after the last one, clipped to count
+        
+        Returns:
+            np.ndarray: (stop - start) x 8 poses
+        """
+        stop = min(stop, self.count)
+        if stop <= start:
+            return np.empty((0, len(POSE_COLUMNS)))
+        if not self._fh.closed:
+            self._fh.flush()
+        row_bytes = len(POSE_COLUMNS) * np.dtype(np.float64).itemsize
+        mapped = np.memmap(self.path, dtype=np.float64, mode='r', offset=start * row_bytes,
+                           shape=(stop - start, len(POSE_COLUMNS)))
+        chunk = np.array(mapped)
+        del mapped
+        return chunk
+    
+    def array(self) -> np.ndarray:
+        """
+        Map all rows read-only without copying them.
+        
+        Returns:
+            np.memmap: count x 8 poses; an empty array if nothing was appended
+        """
+        if not self.count:
+            return np.empty((0, len(POSE_COLUMNS)))
+        if not self._fh.closed:
+            self._fh.flush()
+        return np.memmap(self.path, dtype=np.float64, mode='r', shape=(self.count, len(POSE_COLUMNS)))
+    
+    def chunks(self):
+        """
+        Read the file back in order.
+        
+        Yields:
+            np.ndarray: Up to chunk_poses x 8 poses
+        """
+        for start in range(0, self.count, self.chunk_poses):
+            yield self.rows(start, start + self.chunk_poses)
+    
+    def save(self, path: Path):
+        """
+        Write the spilled poses as a column-major pose store, one column chunk at a time.
+        
+        The result is identical to save_poses of the whole array, without
+        holding more than one chunk in memory.
+        
+        Args:
+            path (Path): Destination .npy path
+        """
+        header = {'descr': np.lib.format.dtype_to_descr(np.dtype(np.float64)),
+                  'fortran_order': True, 'shape': (self.count, len(POSE_COLUMNS))}
+        with open(path, 'wb') as f:
+            np.lib.format.write_array_header_1_0(f, header)
+            for column in range(len(POSE_COLUMNS)):
+                for chunk in self.chunks():
+                    f.write(np.ascontiguousarray(chunk[:, column]).tobytes())
+    
+    def close(self):
+        """
+        Stop appending; the rows stay readable.
+        """
+        self._fh.close()
+    
+    def remove(self):
+        """
+        Close and delete the scratch file.
+        """
+        self.close()
+        self.path.unlink(missing_ok=True)
@@ -17,7 +17,8 @@ def prepare_directories(output_dir: str, segment_index: int = None) -> Path:
         Path: Path to created directory
         
     Note:
-        If segment_index is None, handles main output directory setup
+        If segment_index is None, creates the main output directory and removes
+        segment directories left by a previous run
         If segment_index is provided, creates segment subdirectories
     """
     logger = logging.getLogger(__name__)
@@ -28,12 +29,13 @@ def prepare_directories(output_dir: str, segment_index: int = None) -> Path:
     
     output_path = Path(output_dir)
     if segment_index is None:
-        # Handle main output directory setup
-        if output_path.exists():
-            logger = logging.getLogger(__name__)
-            logger.info(f"Cleaning up existing output directory: {output_path}")
-            shutil.rmtree(output_path)
+        # Handle main output directory setup; only the segments of a previous run
+        # are removed, other results in the directory are kept
         output_path.mkdir(parents=True, exist_ok=True)
+        for stale_segment in output_path.glob('segment_*'):
+            if stale_segment.is_dir():
+                logger.info(f"Removing segment of a previous run: {stale_segment}")
+                shutil.rmtree(stale_segment)
         return output_path
         
     # Create segment directory with proper numbering
@@ -43,4 +45,19 @@ def prepare_directories(output_dir: str, segment_index: int = None) -> Path:
     for subdir in ['poses', 'plots', 'metrics']:
         (segment_dir / subdir).mkdir(parents=True, exist_ok=True)
     
-    return segment_dir 
\ No newline at end of file
+    return segment_dir
+
+
+def segment_dirs(output_dir: str) -> list:
+    """
+    Segment directories of an output directory in segment order.
+    
+    Args:
+        output_dir (str): The base output directory
+            
+    Returns:
+        list: Paths of the segment_N directories, sorted by N
+    """
+    paths = [path for path in Path(output_dir).glob('segment_*')
+             if path.is_dir() and path.name.rsplit('_', 1)[-1].isdigit()]
+    return sorted(paths, key=lambda path: int(path.name.rsplit('_', 1)[-1]))
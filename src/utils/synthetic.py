@@ -0,0 +1,135 @@
+# Copyright 2024
+# Author: Usamah Zaheer
+import sqlite3
+from pathlib import Path
+import numpy as np
+from src.utils.pose_decoder import encode_pose_stamped
+
+POSE_TYPE = 'geometry_msgs/msg/PoseStamped'
+START_TIME_NS = 1733136910 * 1_000_000_000
+
+# rosbag2 sqlite3 storage schema
+_BAG_SCHEMA = """
+CREATE TABLE schema(schema_version INTEGER PRIMARY KEY, ros_distro TEXT NOT NULL);
+CREATE TABLE topics(id INTEGER PRIMARY KEY, name TEXT NOT NULL, type TEXT NOT NULL,
+                    serialization_format TEXT NOT NULL, offered_qos_profiles TEXT NOT NULL);
+CREATE TABLE messages(id INTEGER PRIMARY KEY, topic_id INTEGER NOT NULL,
+                      timestamp INTEGER NOT NULL, data BLOB NOT NULL);
+CREATE INDEX timestamp_idx ON messages (timestamp ASC);
+INSERT INTO schema VALUES (3, 'humble');
+"""
+
+def make_trajectory(duration: float, rate: float, start_time: float = START_TIME_NS / 1e9,
+                    seed: int = 0) -> np.ndarray:
+    """
+    Generate a smooth reference trajectory.
+    
+    Args:
+        duration (float): Length in seconds
+        rate (float): Pose rate in Hz
+        start_time (float): First timestamp in seconds
+        seed (int): Seed for the path shape
+    
+    Returns:
+        np.ndarray: Nx8 poses in TUM column order
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(0.0, duration, 1.0 / rate)
+    radius, speed = 5.0 + rng.uniform(0, 5), 0.5 + rng.uniform(0, 0.5)
+    yaw = speed * t / radius
+    positions = np.column_stack([radius * np.cos(yaw), radius * np.sin(yaw), 0.05 * np.sin(t)])
+    heading = yaw + np.pi / 2
+    quats = np.column_stack([np.zeros_like(t), np.zeros_like(t),
+                             np.sin(heading / 2), np.cos(heading / 2)])
+    return np.column_stack([start_time + t, positions, quats])
+
+def perturb_trajectory(reference: np.ndarray, noise: float = 0.05, drift: float = 0.0,
+                       time_offset: float = 0.0, seed: int = 1) -> np.ndarray:
+    """
+    Derive an estimated trajectory from a reference one.
+    
+    Args:
+        reference (np.ndarray): Nx8 reference poses in TUM column order
+        noise (float): Standard deviation of the position noise in metres
+        drift (float): Position drift in metres per second along x
+        time_offset (float): Constant offset added to the timestamps in seconds
+        seed (int): Noise seed
+    
+    Returns:
+        np.ndarray: Nx8 estimated poses in TUM column order
+    """
+    rng = np.random.default_rng(seed)
+    estimate = np.array(reference, dtype=np.float64)
+    elapsed = estimate[:, 0] - estimate[0, 0]
+    estimate[:, 1:4] += rng.normal(scale=noise, size=(len(estimate), 3))
+    estimate[:, 1] += drift * elapsed
+    estimate[:, 0] += time_offset
+    return estimate
+
+def write_synthetic_bag(path: Path, duration: float = 60.0, pose_rate: float = 50.0,
+                        extra_topics: dict = None, seed: int = 0, noise: float = 0.05,
+                        drift: float = 0.0) -> Path:
+    """
+    Write a rosbag2 sqlite3 file with reference and predicted PoseStamped topics.
+    
+    Args:
+        path (Path): Destination .db3 path
+        duration (float): Recording length in seconds
+        pose_rate (float): Rate of both pose topics in Hz
+        extra_topics (dict, optional): Additional topic name mapped to
+            (rate in Hz, payload size in bytes), written as opaque blobs
+        seed (int): Seed for trajectories and payloads
+        noise (float): Position noise of the predicted poses in metres
+        drift (float): Position drift of the predicted poses in metres per second
+    
+    Returns:
+        Path: Path of the written bag
+    """
+    path = Path(path)
+    reference = make_trajectory(duration, pose_rate, seed=seed)
+    estimate = perturb_trajectory(reference, noise=noise, drift=drift, seed=seed + 1)
+    topics = [('/casestudy/reference_pose', POSE_TYPE), ('/casestudy/predicted_pose', POSE_TYPE)]
+    topics += [(name, 'std_msgs/msg/ByteMultiArray') for name in (extra_topics or {})]
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(_BAG_SCHEMA)
+        conn.executemany("INSERT INTO topics VALUES (?, ?, ?, 'cdr', '')",
+                         [(i + 1, name, msg_type) for i, (name, msg_type) in enumerate(topics)])
+        # Insert in one-second windows so large bags are written with bounded memory
+        rng = np.random.default_rng(seed)
+        extra = [(topic_id, rate, rng.bytes(size))
+                 for topic_id, (rate, size) in enumerate((extra_topics or {}).values(), start=3)]
+        stamps_ns = START_TIME_NS + np.round(np.arange(len(reference)) * 1e9 / pose_rate).astype(np.int64)
+        for window in range(int(np.ceil(duration))):
+            lo, hi = START_TIME_NS + window * 1_000_000_000, START_TIME_NS + (window + 1) * 1_000_000_000
+            rows = []
+            for topic_id, poses in ((1, reference), (2, estimate)):
+                for i in range(np.searchsorted(stamps_ns, lo), np.searchsorted(stamps_ns, hi)):
+                    ns = int(stamps_ns[i])
+                    rows.append((topic_id, ns, encode_pose_stamped(
+                        ns // 1_000_000_000, ns % 1_000_000_000, 'map', poses[i, 1:])))
+            for topic_id, rate, payload in extra:
+                for t in np.arange(np.ceil(window * rate), min((window + 1), duration) * rate):
+                    rows.append((topic_id, START_TIME_NS + int(t * 1e9 / rate), payload))
+            rows.sort(key=lambda row: row[1])
+            conn.executemany("INSERT INTO messages (topic_id, timestamp, data) VALUES (?, ?, ?)", rows)
+        conn.commit()
+    finally:
+        conn.close()
+    return path
+
+def write_tum_trajectory(path: Path, poses: np.ndarray) -> Path:
+    """
+    Write poses as a TUM text trajectory (timestamp x y z qx qy qz qw).
+    
+    Args:
+        path (Path): Destination .txt path
+        poses (np.ndarray): Nx8 poses in TUM column order
+    
+    Returns:
+        Path: Path of the written file
+    """
+    path = Path(path)
+    np.savetxt(path, poses, fmt='%.9f')
+    return path
@@ -1,26 +1,50 @@
 import pytest
 from pathlib import Path
+from src.utils.pose_store import save_poses
+from src.utils.synthetic import make_trajectory, perturb_trajectory, write_synthetic_bag, write_tum_trajectory
 
 @pytest.fixture
 def sample_bag_file(tmp_path):
     """Create a sample ROS bag file for testing"""
-    # TODO: Create sample bag file with known poses
-    pass
+    return write_synthetic_bag(tmp_path / "sample.db3", duration=20.0, pose_rate=20.0)
 
 @pytest.fixture
-def sample_segment_dir(tmp_path):
+def sample_segment_dir(tmp_path, mock_pose_data):
     """Create a sample segment directory structure"""
-    # TODO: Create segment directory with required structure
-    pass
+    reference, estimate = mock_pose_data
+    segment_dir = tmp_path / "output" / "segment_0"
+    for subdir in ['poses', 'plots', 'metrics']:
+        (segment_dir / subdir).mkdir(parents=True)
+    save_poses(segment_dir / 'poses' / 'casestudy_reference_pose.npy', reference)
+    save_poses(segment_dir / 'poses' / 'casestudy_predicted_pose.npy', estimate)
+    return segment_dir
+
+@pytest.fixture
+def make_segment():
+    """Factory creating segment directories with a synthetic trajectory pair"""
+    def make(root, name="segment_0", seed=0, tum=False):
+        reference = make_trajectory(10.0, 20.0, seed=seed)
+        estimate = perturb_trajectory(reference, seed=seed + 1)
+        segment_dir = Path(root) / name
+        for subdir in ['poses', 'plots', 'metrics']:
+            (segment_dir / subdir).mkdir(parents=True)
+        for topic, poses in (('casestudy_reference_pose', reference), ('casestudy_predicted_pose', estimate)):
+            if tum:
+                write_tum_trajectory(segment_dir / 'poses' / f"{topic}.txt", poses)
+            else:
+                save_poses(segment_dir / 'poses' / f"{topic}.npy", poses)
+        return segment_dir
+    return make
 
 @pytest.fixture
 def mock_pose_data():
     """Generate mock pose data for testing"""
-    # TODO: Generate mock pose data
-    pass
+    reference = make_trajectory(20.0, 20.0)
+    return reference, perturb_trajectory(reference, noise=0.05, drift=0.001, time_offset=0.001)
 
 @pytest.fixture
 def test_output_dir(tmp_path):
     """Create test output directory"""
-    # TODO: Setup test output directory
-    pass 
\ No newline at end of file
+    output_dir = tmp_path / "output"
+    output_dir.mkdir(exist_ok=True)
+    return output_dir
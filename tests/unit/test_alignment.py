@@ -0,0 +1,49 @@
+import copy
+import numpy as np
+import pytest
+from src.evo_analyser.alignment import align_positions
+from src.evo_analyser.evo_analyser import trajectory_from_poses
+from src.utils.synthetic import make_trajectory, perturb_trajectory
+
+
+def test_alignment_matches_evo_align():
+    """Applying the transform gives the same poses as evo's in-place align"""
+    reference = make_trajectory(20.0, 20.0)
+    traj_ref = trajectory_from_poses(reference)
+    traj_est = trajectory_from_poses(perturb_trajectory(reference, noise=0.1, drift=0.05))
+    expected = copy.deepcopy(traj_est)
+    expected.align(traj_ref, correct_scale=True)
+
+    alignment = align_positions(traj_est.positions_xyz, traj_ref.positions_xyz)
+    aligned_wxyz = alignment.apply_orientations(traj_est.orientations_quat_wxyz)
+
+    np.testing.assert_allclose(alignment.apply_positions(traj_est.positions_xyz),
+                               expected.positions_xyz, atol=1e-9)
+    # q and -q are the same rotation
+    np.testing.assert_allclose(np.abs(np.sum(aligned_wxyz * expected.orientations_quat_wxyz, axis=1)),
+                               1.0, atol=1e-9)
+
+
+def test_alignment_recovers_scale():
+    """A uniformly scaled, rotated and shifted estimate is mapped back exactly"""
+    reference = make_trajectory(20.0, 20.0)
+    angle = 0.3
+    rotation = np.array([[np.cos(angle), -np.sin(angle), 0.0],
+                         [np.sin(angle), np.cos(angle), 0.0],
+                         [0.0, 0.0, 1.0]])
+    est_xyz = 0.8 * reference[:, 1:4] @ rotation.T + [1.0, -2.0, 0.5]
+
+    alignment = align_positions(est_xyz, reference[:, 1:4])
+
+    assert alignment.scale == pytest.approx(1.25)
+    assert alignment.scale_drift == pytest.approx(0.25)
+    np.testing.assert_allclose(alignment.apply_positions(est_xyz), reference[:, 1:4], atol=1e-9)
+
+
+def test_alignment_without_scale():
+    reference = make_trajectory(10.0, 20.0)
+
+    alignment = align_positions(reference[:, 1:4] * 2.0, reference[:, 1:4], correct_scale=False)
+
+    assert alignment.scale == 1.0
+    assert alignment.to_dict()["scale"] == 1.0
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from evo.core import sync
+from src.evo_analyser.association import associate, estimate_time_offset
+from src.utils.synthetic import make_trajectory, perturb_trajectory
+
+
+@pytest.mark.parametrize("max_diff", [0.005, 0.02, 1.0])
+def test_associate_matches_evo(max_diff):
+    """Without duplicate partners the matches equal evo's binary search"""
+    rng = np.random.default_rng(0)
+    stamps_ref = np.arange(0.0, 20.0, 0.02)
+    stamps_est = np.sort(np.arange(0.003, 20.0, 0.05) + rng.normal(scale=0.002, size=400))
+
+    for stamps_1, stamps_2 in ((stamps_ref, stamps_est), (stamps_est, stamps_ref)):
+        idx_1, idx_2 = associate(stamps_1, stamps_2, max_diff)
+        if len(stamps_2) < len(stamps_1):
+            evo_2, evo_1 = sync.matching_time_indices(stamps_2, stamps_1, max_diff)
+        else:
+            evo_1, evo_2 = sync.matching_time_indices(stamps_1, stamps_2, max_diff)
+        order = np.argsort(evo_1)
+        np.testing.assert_array_equal(idx_1, np.asarray(evo_1)[order])
+        np.testing.assert_array_equal(idx_2, np.asarray(evo_2)[order])
+
+
+def test_associate_is_one_to_one():
+    """Two stamps competing for one partner keep only the closest pair"""
+    idx_1, idx_2 = associate([0.0, 0.9, 1.05, 3.0], [1.0, 1.1, 1.2, 1.3, 5.0], max_diff=0.2)
+
+    np.testing.assert_array_equal(idx_1, [2])
+    np.testing.assert_array_equal(idx_2, [0])
+    assert len(set(idx_2)) == len(idx_2)
+
+
+def test_associate_offset_and_unsorted_stamps():
+    """Offsets shift the second clock and unsorted stamps map back to input order"""
+    idx_1, idx_2 = associate([0.0, 1.0, 2.0], [2.5, 0.5, 1.5], max_diff=0.01, offset_2=-0.5)
+
+    np.testing.assert_array_equal(idx_1, [0, 1, 2])
+    np.testing.assert_array_equal(idx_2, [1, 2, 0])
+    assert associate([0.0], [], max_diff=1.0)[0].size == 0
+
+
+def test_estimate_time_offset_recovers_clock_offset():
+    """A delayed estimate clock is recovered from the speed profiles"""
+    reference = make_trajectory(30.0, 50.0, start_time=0.0)
+    # Vary the speed so the profile has features to correlate
+    reference[:, 1:4] *= (1.0 + 0.5 * np.sin(reference[:, [0]]))
+    estimate = perturb_trajectory(reference, noise=0.001, time_offset=-0.24)
+
+    offset = estimate_time_offset(reference[:, 0], reference[:, 1:4],
+                                  estimate[:, 0], estimate[:, 1:4], max_offset=1.0)
+
+    assert offset == pytest.approx(0.24, abs=0.02)
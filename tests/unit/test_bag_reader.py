@@ -0,0 +1,58 @@
+import pytest
+from src.bag_processor.bag_reader import SqliteBagReader, open_bag_reader, split_files
+from src.utils.synthetic import START_TIME_NS, write_synthetic_bag
+
+
+@pytest.fixture
+def synthetic_bag(tmp_path):
+    return write_synthetic_bag(tmp_path / 'bag.db3', duration=5.0, pose_rate=20.0,
+                               extra_topics={'/camera/image_raw': (10.0, 2048)})
+
+
+def test_topics_and_time_bounds(synthetic_bag):
+    """Topic metadata and time bounds come straight from the sqlite tables"""
+    reader = open_bag_reader(synthetic_bag, 'sqlite3')
+
+    assert isinstance(reader, SqliteBagReader)
+    topics = {t.name: t.type for t in reader.get_all_topics_and_types()}
+    assert topics['/casestudy/predicted_pose'] == 'geometry_msgs/msg/PoseStamped'
+    assert '/camera/image_raw' in topics
+    start, end = reader.time_bounds(['/casestudy/predicted_pose'])
+    assert start == START_TIME_NS
+    assert end == START_TIME_NS + 4_950_000_000
+
+
+def test_topic_and_time_pushdown(synthetic_bag):
+    """Only requested topics inside the time window are returned, in order"""
+    reader = SqliteBagReader(synthetic_bag, batch_size=7)
+    start, end = START_TIME_NS + 1_000_000_000, START_TIME_NS + 2_000_000_000
+
+    batches = list(reader.read_batches(topics=['/casestudy/reference_pose'],
+                                       start_time=start, end_time=end))
+    messages = [message for batch in batches for message in batch]
+
+    assert max(len(batch) for batch in batches) == 7
+    assert len(messages) == 20
+    assert {topic for topic, _, _ in messages} == {'/casestudy/reference_pose'}
+    timestamps = [timestamp for _, _, timestamp in messages]
+    assert timestamps == sorted(timestamps)
+    assert start <= timestamps[0] and timestamps[-1] < end
+
+
+def test_unknown_topic_reads_nothing(synthetic_bag):
+    reader = SqliteBagReader(synthetic_bag)
+    assert list(reader.read_batches(topics=['/missing'])) == []
+    assert reader.time_bounds(['/missing']) == (None, None)
+
+
+def test_split_files_follow_recording_order(tmp_path):
+    """Splits are ordered by metadata.yaml, else numerically, never as text"""
+    for index in (0, 1, 2, 10):
+        write_synthetic_bag(tmp_path / f'bag_{index}.db3', duration=0.5, pose_rate=10.0)
+    assert [p.name for p in split_files(tmp_path)] == ['bag_0.db3', 'bag_1.db3', 'bag_2.db3', 'bag_10.db3']
+
+    (tmp_path / 'metadata.yaml').write_text(
+        "rosbag2_bagfile_information:\n"
+        "  relative_file_paths: [bag_2.db3, bag_0.db3, bag_1.db3, bag_10.db3]\n")
+    assert [p.name for p in SqliteBagReader(tmp_path).db_paths] == \
+        ['bag_2.db3', 'bag_0.db3', 'bag_1.db3', 'bag_10.db3']
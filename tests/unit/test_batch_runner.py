@@ -0,0 +1,67 @@
+import json
+import pytest
+from src.batch_runner.batch_runner import (BatchRunner, COMPLETE_FILENAME, FLEET_SUMMARY_FILENAME,
+                                           bag_output_dir, discover_bags)
+from src.results_store.results_store import ResultsStore
+from src.utils.config import Config
+from src.utils.synthetic import write_synthetic_bag
+
+
+@pytest.fixture
+def nightly_bags(tmp_path, monkeypatch):
+    monkeypatch.setitem(Config().config['output']['segments'], 'mode', 'virtual')
+    monkeypatch.setitem(Config().config['output']['plots'], 'mode', 'none')
+    bags = []
+    for night in ("2024-12-01", "2024-12-02"):
+        (tmp_path / "bags" / night).mkdir(parents=True)
+        bags.append(write_synthetic_bag(tmp_path / "bags" / night / "run.db3", duration=25,
+                                        pose_rate=10, seed=len(bags)))
+    return bags
+
+
+def test_discover_bags_directories_and_globs(tmp_path, nightly_bags):
+    rosbag_dir = tmp_path / "bags" / "2024-12-03"
+    rosbag_dir.mkdir()
+    write_synthetic_bag(rosbag_dir / "rosbag_0.db3", duration=2)
+    (rosbag_dir / "metadata.yaml").write_text("rosbag2_bagfile_information: {}\n")
+
+    found = discover_bags([tmp_path / "bags"])
+
+    assert found == sorted([bag.resolve() for bag in nightly_bags] + [rosbag_dir.resolve()])
+    assert discover_bags([str(tmp_path / "bags" / "*" / "run.db3")]) == found[:2]
+    assert len({bag_output_dir(tmp_path, bag) for bag in found}) == 3
+
+
+def test_batch_runs_bags_and_skips_complete_ones(tmp_path, nightly_bags):
+    output_root = tmp_path / "out"
+    runner = BatchRunner(output_root, workers=2, segment_duration=10, results_db=tmp_path / "results.sqlite")
+
+    summary = runner.run(nightly_bags)
+
+    assert summary["totals"]["analysed"] == 2
+    assert summary["totals"]["segments"] == 6
+    for entry in summary["bags"]:
+        assert (output_root / entry["output_dir"] / COMPLETE_FILENAME).exists()
+        assert entry["ate_rmse"] > 0
+    assert json.loads((output_root / FLEET_SUMMARY_FILENAME).read_text())["totals"] == summary["totals"]
+    assert summary["ate_rmse"]["worst_bag"] in {str(bag) for bag in nightly_bags}
+    assert len(ResultsStore(tmp_path / "results.sqlite").segments(columns=["ate_rmse"])) == 6
+
+    # A second run reuses both bags; touching one bag analyses it again
+    (output_root / "unrelated.txt").write_text("kept")
+    nightly_bags[1].write_bytes(nightly_bags[1].read_bytes())
+    second = BatchRunner(output_root, workers=1, segment_duration=10).run(nightly_bags)
+
+    assert [entry["status"] for entry in second["bags"]] == ["skipped", "analysed"]
+    assert second["bags"][0]["ate_rmse"] == summary["bags"][0]["ate_rmse"]
+    assert (output_root / "unrelated.txt").exists()
+
+
+def test_failed_bag_is_reported_and_not_marked_complete(tmp_path, nightly_bags):
+    broken = tmp_path / "bags" / "broken.db3"
+    broken.write_bytes(b"not a bag")
+
+    summary = BatchRunner(tmp_path / "out", workers=1, segment_duration=10).run([nightly_bags[0], broken])
+
+    assert [entry["status"] for entry in summary["bags"]] == ["analysed", "failed"]
+    assert not (bag_output_dir(tmp_path / "out", broken) / COMPLETE_FILENAME).exists()
@@ -0,0 +1,31 @@
+import pytest
+from benchmarks.suite import STAGES, compare, run_suite
+from src.utils.config import Config
+
+
+def _results(**seconds):
+    return {"stages": {stage: {"seconds": s, "items": 100, "items_per_s": 100 / s}
+                       for stage, s in seconds.items()}}
+
+
+def test_compare_flags_stages_beyond_tolerance():
+    baseline = _results(association=1.0, metrics=1.0, plotting=1.0, alignment=1.0)
+    current = _results(association=1.2, metrics=1.3, plotting=0.5, end_to_end=9.0)
+    report = compare(current, baseline, tolerance=0.25)
+
+    assert [e["stage"] for e in report["regressions"]] == ["metrics"]
+    assert [e["stage"] for e in report["improvements"]] == ["plotting"]
+    assert [e["stage"] for e in report["unchanged"]] == ["association"]
+    assert report["regressions"][0]["ratio"] == pytest.approx(1.3)
+
+
+def test_quick_run_times_every_stage_and_restores_config(tmp_path):
+    mode = Config().get('output', 'segments', 'mode')
+    results = run_suite(duration=12.0, rate=10.0, noise=0.05, drift=0.001, segment_duration=5,
+                        repeat=1, work_dir=tmp_path)
+
+    assert set(results["stages"]) == set(STAGES)
+    assert all(stage["seconds"] > 0 and stage["items"] > 0 for stage in results["stages"].values())
+    assert results["meta"]["poses"] == 120
+    assert Config().get('output', 'segments', 'mode') == mode
+    assert not compare(results, results, tolerance=0.0)["regressions"]
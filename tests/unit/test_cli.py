@@ -0,0 +1,110 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from src.cli import main, summarise_metrics
+from src.utils.prepare_directories import segment_dirs
+from src.utils.config import Config
+
+REPO_ROOT = Path(__file__).parents[2]
+
+# Startup budget of the CLI module; the heavy dependencies alone take seconds
+IMPORT_TIME_BUDGET_S = 0.3
+HEAVY_MODULES = ('numpy', 'evo', 'matplotlib', 'pandas', 'scipy', 'rosbag2_py', 'rclpy')
+
+
+def _python(code):
+    return subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=REPO_ROOT,
+                          capture_output=True, text=True)
+
+
+def _metrics(segment_id, ate_rmse, duration=60.0):
+    return {"segment_id": segment_id, "duration": duration, "trajectory_length": 30.0,
+            "ate_rmse": ate_rmse, "ate_max": 2 * ate_rmse, "rpe_rmse": 0.01, "ate_rot_rmse": 1.0}
+
+
+def test_import_stays_within_budget():
+    result = _python("import src.cli")
+    assert result.returncode == 0, result.stderr
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    cumulative_us = next(int(line.split('|')[1]) for line in result.stderr.splitlines()
+                         if line.split('|')[-1].strip() == 'src.cli')
+    assert cumulative_us / 1e6 < IMPORT_TIME_BUDGET_S
+
+
+def test_summarise_imports_no_heavy_dependencies(tmp_path):
+    with open(tmp_path / "analysis_summary.json", 'w') as f:
+        json.dump([_metrics("segment_0", 0.1), _metrics("segment_1", 0.3)], f)
+    result = _python(
+        "import sys\n"
+        "from src.cli import main\n"
+        f"status = main(['summarise', '--output-dir', {str(tmp_path)!r}, '--json'])\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "sys.exit(status or (3 if heavy else 0))"
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    totals = json.loads(result.stdout)
+    assert totals["segments"] == 2
+    assert totals["ate_rmse"] == pytest.approx((0.1 ** 2 / 2 + 0.3 ** 2 / 2) ** 0.5)
+    assert totals["worst_segment"] == "segment_1"
+
+
+def test_summarise_of_empty_run():
+    totals = summarise_metrics([])
+    assert totals["segments"] == 0 and totals["ate_rmse"] is None
+
+
+def test_ingest_analyse_summarise_and_plot(sample_bag_file, test_output_dir, tmp_path, monkeypatch, capsys):
+    monkeypatch.setitem(Config().config['output']['segments'], 'mode', 'virtual')
+    monkeypatch.setitem(Config().config['output']['plots'], 'mode', 'none')
+    monkeypatch.setitem(Config().config['cache'], 'enabled', False)
+    monkeypatch.setitem(Config().config['results_store'], 'enabled', False)
+    common = ['--output-dir', str(test_output_dir), '--log-dir', str(tmp_path / "logs")]
+
+    assert main(['ingest', '--bag', str(sample_bag_file), '--segment-duration', '5', *common]) == 0
+    assert [p.name for p in segment_dirs(test_output_dir)] == [f"segment_{i}" for i in range(4)]
+    assert not (test_output_dir / "analysis_summary.json").exists()
+
+    assert main(['analyse', '--workers', '1', *common]) == 0
+    with open(test_output_dir / "analysis_summary.json") as f:
+        assert [m["segment_id"] for m in json.load(f)] == [f"segment_{i}" for i in range(4)]
+    assert not any((test_output_dir / "segment_0" / "plots").iterdir())
+
+    capsys.readouterr()
+    assert main(['summarise', '--output-dir', str(test_output_dir), '--segments']) == 0
+    assert "Segments:          4" in capsys.readouterr().out
+
+    metrics_path = test_output_dir / "segment_2" / "metrics" / "segment_2_metrics.json"
+    saved = metrics_path.stat().st_mtime_ns
+    assert main(['plot', 'segment_2', *common]) == 0
+    assert any((test_output_dir / "segment_2" / "plots").iterdir())
+    assert metrics_path.stat().st_mtime_ns == saved
+    assert not any((test_output_dir / "segment_1" / "plots").iterdir())
+
+
+def test_stream_warns_that_ingest_workers_are_ignored(sample_bag_file, test_output_dir, tmp_path, monkeypatch,
+                                                      caplog):
+    monkeypatch.setitem(Config().config['output']['segments'], 'mode', 'virtual')
+    monkeypatch.setitem(Config().config['output']['plots'], 'mode', 'none')
+    monkeypatch.setitem(Config().config['cache'], 'enabled', False)
+    monkeypatch.setitem(Config().config['results_store'], 'enabled', False)
+
+    assert main(['run', '--stream', '--ingest-workers', '2', '--bag', str(sample_bag_file),
+                 '--segment-duration', '5', '--output-dir', str(test_output_dir),
+                 '--log-dir', str(tmp_path / "logs")]) == 0
+    assert "ignoring --ingest-workers 2" in caplog.text
+
+
+def test_rpe_command_writes_deltas(sample_bag_file, test_output_dir, tmp_path, monkeypatch):
+    monkeypatch.setitem(Config().config['output']['segments'], 'mode', 'virtual')
+    common = ['--output-dir', str(test_output_dir), '--log-dir', str(tmp_path / "logs")]
+    assert main(['ingest', '--bag', str(sample_bag_file), '--segment-duration', '5', *common]) == 0
+    assert main(['rpe', '--distance-deltas', '1', '--time-deltas', '1', '15', *common]) == 0
+
+    with open(test_output_dir / "rpe_deltas.json") as f:
+        deltas = json.load(f)
+    assert list(deltas) == ["1m", "1s", "15s"]
+    # Deltas spanning several segments still find pairs
+    assert deltas["15s"]["pairs"] > 0
+    assert "trans_drift_pct" in deltas["1m"] and "trans_drift_pct" not in deltas["1s"]
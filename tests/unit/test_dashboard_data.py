@@ -0,0 +1,84 @@
+import json
+import os
+import numpy as np
+import pytest
+from src.dashboard import data_layer
+from src.dashboard.data_layer import SummaryStore
+
+
+def write_summary(path, ate_values):
+    path.mkdir(parents=True, exist_ok=True)
+    records = [{"segment_id": f"segment_{i}", "ate_rmse": v, "rpe_rmse": v / 10}
+               for i, v in enumerate(ate_values)]
+    # Out of order on purpose: segment_10 sorts before segment_2 as a string
+    with open(path / "analysis_summary.json", 'w') as f:
+        json.dump(records[::-1], f)
+
+
+@pytest.fixture
+def batch_output(tmp_path):
+    write_summary(tmp_path / "night1_run", [0.1 * (i + 1) for i in range(12)])
+    write_summary(tmp_path / "night2_run", [1.0, 3.0])
+    return tmp_path
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    built = []
+    original = data_layer._build_partition
+
+    def counting_build(source, partition, run, stat):
+        built.append(run)
+        return original(source, partition, run, stat)
+
+    monkeypatch.setattr(data_layer, "_build_partition", counting_build)
+    return built
+
+
+def test_store_loads_only_requested_columns_in_segment_order(batch_output):
+    store = SummaryStore(batch_output)
+    store.refresh()
+
+    df = store.columns(["segment_index", "ate_rmse"], runs=["night1_run"])
+
+    assert list(df.columns) == ["run", "segment_index", "ate_rmse"]
+    np.testing.assert_array_equal(df["segment_index"], np.arange(12))
+    np.testing.assert_allclose(df["ate_rmse"], 0.1 * np.arange(1, 13))
+    assert store.columns(["missing"])["missing"].isna().all()
+
+
+def test_refresh_rebuilds_only_changed_summaries(batch_output, builds):
+    store = SummaryStore(batch_output)
+    version = store.refresh()
+    assert sorted(builds) == ["night1_run", "night2_run"]
+
+    assert store.refresh() == version
+    # A new process reuses the partitions on disk
+    assert SummaryStore(batch_output).refresh() == version
+    assert len(builds) == 2
+
+    write_summary(batch_output / "night2_run", [1.0, 3.0, 5.0])
+    stat = (batch_output / "night2_run" / "analysis_summary.json").stat()
+    os.utime(batch_output / "night2_run" / "analysis_summary.json", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert store.refresh() != version
+    assert builds[2:] == ["night2_run"]
+    assert len(store.columns(["ate_rmse"], runs=["night2_run"])) == 3
+
+    (batch_output / "night1_run" / "analysis_summary.json").unlink()
+    store.refresh()
+    assert store.runs() == ["night2_run"]
+    assert len([p for p in store.store_dir.iterdir() if p.is_dir()]) == 1
+
+
+def test_fleet_aggregates_are_weighted_by_segment_count(batch_output):
+    store = SummaryStore(batch_output)
+    store.refresh()
+
+    table = store.aggregates("ate_rmse")
+
+    values = np.concatenate([0.1 * np.arange(1, 13), [1.0, 3.0]])
+    assert table.loc["night2_run", "mean"] == pytest.approx(2.0)
+    assert table.loc["fleet", "count"] == 14
+    assert table.loc["fleet", "mean"] == pytest.approx(values.mean())
+    assert table.loc["fleet", "rms"] == pytest.approx(np.sqrt(np.mean(values ** 2)))
+    assert table.loc["fleet", "max"] == 3.0
@@ -0,0 +1,45 @@
+import numpy as np
+from src.evo_analyser.decimation import lttb_indices, minmax_indices
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    x = np.linspace(0.0, 100.0, 10_001)
+    y = np.sin(x)
+    y[5000] = 50.0
+
+    kept = lttb_indices(x, y, 200)
+
+    assert len(kept) == 200
+    assert kept[0] == 0 and kept[-1] == len(x) - 1
+    assert 5000 in kept
+    assert np.all(np.diff(kept) > 0)
+
+
+def test_lttb_small_inputs_are_untouched():
+    x = np.arange(10.0)
+
+    np.testing.assert_array_equal(lttb_indices(x, x, 20), np.arange(10))
+    np.testing.assert_array_equal(lttb_indices(x, x, None), np.arange(10))
+
+
+def test_minmax_keeps_extent_within_budget():
+    rng = np.random.default_rng(0)
+    path = np.cumsum(rng.normal(size=(20_000, 3)), axis=0)
+
+    kept = minmax_indices(path, 1000)
+
+    assert len(kept) <= 1000
+    assert kept[0] == 0 and kept[-1] == len(path) - 1
+    np.testing.assert_array_equal(path[kept].min(axis=0), path.min(axis=0))
+    np.testing.assert_array_equal(path[kept].max(axis=0), path.max(axis=0))
+    assert len(minmax_indices(path[:500], 1000)) == 500
+
+
+def test_minmax_small_budget_falls_back_to_even_spacing():
+    path = np.cumsum(np.random.default_rng(1).normal(size=(1000, 4)), axis=0)
+
+    for max_points in (1, 2, 5, 9):
+        kept = minmax_indices(path, max_points)
+        assert len(kept) == max_points and kept[0] == 0
+        assert max_points == 1 or kept[-1] == len(path) - 1
+    assert len(minmax_indices(path, 10)) <= 10
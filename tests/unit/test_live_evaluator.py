@@ -0,0 +1,93 @@
+import json
+import socket
+import numpy as np
+import pytest
+from src.evo_analyser.metric_engine import compute_errors
+from src.live.live_evaluator import LiveEvaluator
+from src.live.sinks import JsonLinesSink, open_sink
+from src.live.sliding_window import PoseRingBuffer, SlidingWindowEvaluator
+from src.live.sources import FakePosePublisher, bag_messages, synthetic_messages
+from src.utils.synthetic import make_trajectory, perturb_trajectory, write_synthetic_bag
+
+EST, REF = '/casestudy/predicted_pose', '/casestudy/reference_pose'
+
+
+class ListSink:
+    def __init__(self):
+        self.results = []
+
+    def write(self, metrics):
+        self.results.append(metrics)
+
+
+def test_ring_buffer_keeps_latest_poses_in_order():
+    poses = make_trajectory(10.0, 10.0, start_time=0.0)
+    buffer = PoseRingBuffer(25)
+    for chunk in np.array_split(poses, 9):
+        buffer.extend(chunk)
+
+    assert len(buffer) == 25
+    np.testing.assert_array_equal(buffer.since(-np.inf), poses[-25:])
+    np.testing.assert_array_equal(buffer.since(9.5), poses[poses[:, 0] >= 9.5])
+
+    buffer.extend(poses)
+    np.testing.assert_array_equal(buffer.since(-np.inf), poses[-25:])
+
+
+def test_sliding_window_matches_offline_errors_of_window():
+    reference = make_trajectory(40.0, 20.0, start_time=0.0)
+    estimate = perturb_trajectory(reference, noise=0.1)
+    window = SlidingWindowEvaluator(EST, REF, window_duration=10.0, max_diff=0.02,
+                                    buffer_size=1000, align=False)
+    window.update(REF, reference)
+    window.update(EST, estimate)
+
+    result = window.evaluate()
+
+    last = reference[:, 0] >= reference[-1, 0] - 10.0
+    ref, est = reference[last], estimate[last]
+    errors = compute_errors(ref[:, 1:4], ref[:, [7, 4, 5, 6]], est[:, 1:4], est[:, [7, 4, 5, 6]])
+    assert result["matched_poses"] == last.sum()
+    assert result["ate_rmse"] == pytest.approx(np.sqrt(np.mean(errors.ape_trans ** 2)))
+    assert result["rpe_mean"] == pytest.approx(errors.rpe_trans.mean())
+
+
+def test_live_evaluator_publishes_at_configured_rate():
+    sink = ListSink()
+    evaluator = LiveEvaluator([sink], window_duration=5.0, rate=2.0, buffer_size=500)
+    messages = synthetic_messages(EST, REF, duration=30.0, rate=50.0, noise=0.05, start_time=100.0)
+
+    published = evaluator.run(FakePosePublisher(messages))
+
+    # One result per half second of message time after the first, plus the final flush
+    assert published == len(sink.results) == 60
+    assert all(r["window_end"] - r["window_start"] == pytest.approx(5.0) for r in sink.results)
+    assert all(r["matched_poses"] <= 251 for r in sink.results)
+    assert sink.results[-1]["ate_rmse"] < 0.15
+    assert len(evaluator.window.buffers[REF]) == 500
+
+
+def test_bag_replay_to_metrics_file(tmp_path):
+    bag = write_synthetic_bag(tmp_path / "bag.db3", duration=20, pose_rate=20)
+    metrics_path = tmp_path / "live.jsonl"
+    sink = JsonLinesSink(metrics_path)
+
+    LiveEvaluator([sink], window_duration=10.0, rate=1.0).run(FakePosePublisher(bag_messages(bag)))
+    sink.close()
+
+    lines = [json.loads(line) for line in metrics_path.read_text().splitlines()]
+    assert len(lines) == 20
+    assert lines[-1]["matched_poses"] == 201
+
+
+def test_udp_sink_sends_datagrams():
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(2.0)
+    sink = open_sink(f"udp://127.0.0.1:{receiver.getsockname()[1]}")
+    try:
+        sink.write({"ate_rmse": 0.5})
+        assert json.loads(receiver.recv(65536)) == {"ate_rmse": 0.5}
+    finally:
+        sink.close()
+        receiver.close()
@@ -0,0 +1,127 @@
+import copy
+import numpy as np
+import pytest
+from evo.core import metrics
+from src.evo_analyser.evo_analyser import trajectory_from_poses
+from src.evo_analyser.metric_engine import (compute_errors, delta_pairs, delta_rpe, error_statistics,
+                                             path_distances, relative_pose_errors)
+from src.utils.synthetic import make_trajectory, perturb_trajectory
+
+
+def _noisy_pair(seed: int) -> tuple:
+    """Reference and estimate with position and orientation noise"""
+    reference = make_trajectory(20.0, 20.0, seed=seed)
+    estimate = perturb_trajectory(reference, noise=0.1, drift=0.02, seed=seed + 1)
+    rng = np.random.default_rng(seed)
+    estimate[:, 4:8] += rng.normal(scale=0.02, size=(len(estimate), 4))
+    estimate[:, 4:8] /= np.linalg.norm(estimate[:, 4:8], axis=1, keepdims=True)
+    return trajectory_from_poses(reference), trajectory_from_poses(estimate)
+
+
+def _evo_errors(metric, traj_ref, traj_est) -> np.ndarray:
+    metric.process_data((traj_ref, traj_est))
+    return metric.error, metric.get_all_statistics()
+
+
+@pytest.mark.parametrize("seed", [0, 7])
+def test_errors_match_evo(seed):
+    """All four series and their statistics agree with evo's metrics"""
+    traj_ref, traj_est = _noisy_pair(seed)
+    traj_aligned = copy.deepcopy(traj_est)
+    traj_aligned.align(traj_ref, correct_scale=True)
+
+    errors = compute_errors(traj_ref.positions_xyz, traj_ref.orientations_quat_wxyz,
+                            traj_est.positions_xyz, traj_est.orientations_quat_wxyz,
+                            traj_aligned.positions_xyz, traj_aligned.orientations_quat_wxyz)
+    stats = errors.statistics()
+
+    expected = {
+        "ape_trans": _evo_errors(metrics.APE(metrics.PoseRelation.translation_part),
+                                 traj_ref, traj_aligned),
+        "ape_rot": _evo_errors(metrics.APE(metrics.PoseRelation.rotation_angle_deg),
+                               traj_ref, traj_aligned),
+        "rpe_trans": _evo_errors(metrics.RPE(metrics.PoseRelation.translation_part, delta=1,
+                                             delta_unit=metrics.Unit.frames, all_pairs=False),
+                                 traj_ref, traj_est),
+        "rpe_rot": _evo_errors(metrics.RPE(metrics.PoseRelation.rotation_angle_deg, delta=1,
+                                           delta_unit=metrics.Unit.frames, all_pairs=False),
+                               traj_ref, traj_est),
+    }
+    for name, (evo_error, evo_stats) in expected.items():
+        np.testing.assert_allclose(getattr(errors, name), evo_error, rtol=1e-6, atol=1e-6)
+        for key, value in evo_stats.items():
+            assert stats[name][key] == pytest.approx(value, rel=1e-6, abs=1e-6), (name, key)
+
+
+def test_identical_trajectories_have_zero_error():
+    traj_ref, _ = _noisy_pair(3)
+
+    errors = compute_errors(traj_ref.positions_xyz, traj_ref.orientations_quat_wxyz,
+                            traj_ref.positions_xyz, traj_ref.orientations_quat_wxyz)
+
+    for series in (errors.ape_trans, errors.ape_rot, errors.rpe_trans, errors.rpe_rot):
+        assert np.abs(series).max() < 1e-6
+    assert len(errors.rpe_trans) == traj_ref.num_poses - 1
+
+
+def test_mismatched_lengths_raise():
+    with pytest.raises(ValueError):
+        compute_errors(np.zeros((3, 3)), np.tile([1.0, 0, 0, 0], (3, 1)),
+                       np.zeros((2, 3)), np.tile([1.0, 0, 0, 0], (2, 1)))
+
+
+def test_error_statistics_keys():
+    stats = error_statistics(np.array([3.0, 4.0]))
+
+    assert stats == {"rmse": pytest.approx(np.sqrt(12.5)), "mean": 3.5, "median": 3.5,
+                     "std": 0.5, "min": 3.0, "max": 4.0, "sse": 25.0}
+
+
+def test_delta_pairs_match_brute_force():
+    """Each pair ends at the first pose at least delta further on"""
+    values = np.cumsum(np.random.default_rng(2).uniform(0.0, 1.0, size=300))
+    first, second = delta_pairs(values, 25.0, stride=3)
+    for i, j in zip(first, second):
+        assert i % 3 == 0
+        assert j == next(k for k in range(len(values)) if values[k] >= values[i] + 25.0)
+    # Later starts have no pose far enough away
+    assert values[first[-1] + 3] + 25.0 > values[-1]
+
+
+def test_all_pairs_frame_delta_matches_evo():
+    """Batched pair errors agree with evo's all-pairs RPE"""
+    traj_ref, traj_est = _noisy_pair(3)
+    first, second = delta_pairs(np.arange(traj_ref.num_poses), 10)
+    trans, rot = relative_pose_errors(traj_ref.positions_xyz, traj_ref.orientations_quat_wxyz,
+                                      traj_est.positions_xyz, traj_est.orientations_quat_wxyz, first, second)
+    for relation, errors in ((metrics.PoseRelation.translation_part, trans),
+                             (metrics.PoseRelation.rotation_angle_deg, rot)):
+        expected, _ = _evo_errors(metrics.RPE(relation, delta=10, delta_unit=metrics.Unit.frames,
+                                              all_pairs=True), traj_ref, traj_est)
+        np.testing.assert_allclose(errors, expected, atol=1e-9)
+
+
+def test_distance_drift_of_scaled_estimate():
+    """A 1 % scale error shows as 1 % translation drift at every distance"""
+    t = np.arange(0.0, 200.0, 0.1)
+    ref_xyz = np.column_stack([2.0 * t, np.zeros_like(t), np.zeros_like(t)])
+    wxyz = np.tile([1.0, 0.0, 0.0, 0.0], (len(t), 1))
+    deltas = delta_rpe(ref_xyz, wxyz, 1.01 * ref_xyz, wxyz, t, distance_deltas=[100, 200],
+                       time_deltas=[10], stride=10)
+
+    assert set(deltas) == {"100m", "200m", "10s"}
+    assert path_distances(ref_xyz)[-1] == pytest.approx(2.0 * t[-1])
+    assert deltas["100m"]["pairs"] == len(range(0, len(t) - 500, 10))
+    assert deltas["100m"]["trans_drift_pct"] == pytest.approx(1.0)
+    assert deltas["200m"]["trans_drift_pct"] == pytest.approx(1.0)
+    assert deltas["200m"]["rot_drift_deg_per_100m"] == pytest.approx(0.0)
+    assert deltas["10s"]["trans_mean"] == pytest.approx(0.2)
+    assert "trans_drift_pct" not in deltas["10s"]
+
+
+def test_delta_longer_than_trajectory_has_no_pairs():
+    xyz = np.column_stack([np.arange(10.0), np.zeros(10), np.zeros(10)])
+    wxyz = np.tile([1.0, 0.0, 0.0, 0.0], (10, 1))
+    deltas = delta_rpe(xyz, wxyz, xyz, wxyz, np.arange(10.0), distance_deltas=[100])
+    assert deltas["100m"]["pairs"] == 0
+    assert np.isnan(deltas["100m"]["trans_rmse"])
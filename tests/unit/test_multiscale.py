@@ -0,0 +1,82 @@
+import json
+import numpy as np
+import pytest
+from src.cli import main
+from src.evo_analyser.alignment import align_positions
+from src.evo_analyser.metric_engine import error_statistics
+from src.evo_analyser.multiscale import MULTISCALE_FILENAME, HEATMAP_FILENAME, MultiScaleAnalysis, sliding_median_max
+from src.utils.config import Config
+from src.utils.synthetic import make_trajectory, perturb_trajectory
+
+
+def test_windows_match_brute_force_statistics():
+    reference = make_trajectory(60.0, 20.0)
+    estimate = perturb_trajectory(reference, noise=0.05, drift=0.01, time_offset=0.002)
+    analysis = MultiScaleAnalysis(estimate, reference, max_diff=0.01)
+    result = analysis.evaluate(window=10.0, stride=5.0)
+
+    assert len(result["start"]) == 10
+    for k, (lo, hi) in enumerate(zip(*analysis.window_bounds(10.0, 5.0)[2:])):
+        est, ref = analysis.est_xyz[lo:hi], analysis.ref_xyz[lo:hi]
+        transform = align_positions(est, ref)
+        ate = np.linalg.norm(transform.apply_positions(est) - ref, axis=1)
+        assert result["ate_rmse"][k] == pytest.approx(np.sqrt(np.mean(ate ** 2)), rel=1e-6)
+        assert result["alignment_scale"][k] == pytest.approx(transform.scale, rel=1e-6)
+
+        rpe = error_statistics(analysis.rpe_trans[lo:hi - 1])
+        for key in ("rmse", "mean", "median", "max"):
+            assert result[f"rpe_{key}"][k] == pytest.approx(rpe[key], rel=1e-6)
+        assert result["rpe_rot_rmse"][k] == pytest.approx(error_statistics(analysis.rpe_rot[lo:hi - 1])["rmse"])
+        assert result["trajectory_length"][k] == pytest.approx(
+            np.linalg.norm(np.diff(ref, axis=0), axis=1).sum())
+
+
+def test_scales_share_the_overlap():
+    reference = make_trajectory(30.0, 10.0)
+    analysis = MultiScaleAnalysis(perturb_trajectory(reference), reference)
+    results = analysis.evaluate_scales([5, 10, 60], overlap=0.5)
+    assert [r["stride"] for r in results] == [2.5, 5.0, 30.0]
+    assert [len(r["start"]) for r in results] == [10, 4, 0]
+    with pytest.raises(ValueError):
+        analysis.evaluate_scales([5], overlap=1.0)
+
+
+def test_sliding_median_max_handles_gaps_and_empty_windows():
+    rng = np.random.default_rng(3)
+    values = rng.normal(size=200)
+    lo = np.array([0, 5, 5, 40, 100, 150, 150])
+    hi = np.array([10, 30, 31, 90, 100, 180, 199])
+    medians, maxima = sliding_median_max(values, lo, hi)
+    for k, (a, b) in enumerate(zip(lo, hi)):
+        if a == b:
+            assert np.isnan(medians[k]) and np.isnan(maxima[k])
+        else:
+            assert medians[k] == pytest.approx(np.median(values[a:b]))
+            assert maxima[k] == values[a:b].max()
+
+
+def test_sliding_median_max_matches_numpy_on_random_windows():
+    rng = np.random.default_rng(4)
+    for _ in range(50):
+        # Rounded values so that the windows hold ties
+        values = np.round(rng.normal(size=int(rng.integers(1, 300))), 1)
+        lo = np.sort(rng.integers(0, len(values), size=40))
+        hi = np.maximum.accumulate(np.minimum(lo + rng.integers(0, 60, size=40), len(values)))
+        medians, maxima = sliding_median_max(values, lo, hi)
+        for k, (a, b) in enumerate(zip(lo, hi)):
+            if a < b:
+                assert medians[k] == pytest.approx(np.median(values[a:b]))
+                assert maxima[k] == values[a:b].max()
+
+
+def test_multiscale_command_writes_windows_and_heatmap(sample_bag_file, test_output_dir, tmp_path, monkeypatch):
+    monkeypatch.setitem(Config().config['output']['segments'], 'mode', 'virtual')
+    common = ['--output-dir', str(test_output_dir), '--log-dir', str(tmp_path / "logs")]
+    assert main(['ingest', '--bag', str(sample_bag_file), '--segment-duration', '5', *common]) == 0
+    assert main(['multiscale', '--windows', '4', '8', '--overlap', '0.5', *common]) == 0
+
+    with open(test_output_dir / MULTISCALE_FILENAME) as f:
+        scales = json.load(f)["scales"]
+    assert [s["window"] for s in scales] == [4.0, 8.0]
+    assert len(scales[0]["ate_rmse"]) == len(scales[0]["start"]) > len(scales[1]["start"])
+    assert (test_output_dir / HEATMAP_FILENAME).stat().st_size > 0
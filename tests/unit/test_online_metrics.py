@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+from src.evo_analyser.alignment import align_positions
+from src.evo_analyser.association import associate
+from src.evo_analyser.metric_engine import compute_errors, error_statistics
+from src.evo_analyser.online_metrics import (AlignmentAccumulator, OnlineEvaluator, P2Quantile,
+                                             RunningStats)
+from src.utils.synthetic import make_trajectory, perturb_trajectory
+
+EST, REF = '/casestudy/predicted_pose', '/casestudy/reference_pose'
+
+
+def test_running_stats_match_batch_statistics():
+    rng = np.random.default_rng(0)
+    values = rng.gamma(2.0, size=20_000)
+    stats = RunningStats()
+    for chunk in np.array_split(values, 37):
+        stats.update(chunk)
+
+    online, exact = stats.to_dict(), error_statistics(values)
+
+    for key in ("rmse", "mean", "std", "min", "max", "sse"):
+        assert online[key] == pytest.approx(exact[key], rel=1e-9)
+    assert online["median"] == pytest.approx(exact["median"], rel=0.02)
+
+
+def test_p2_quantile_small_and_large_samples():
+    estimator = P2Quantile(0.9)
+    estimator.update([3.0, 1.0, 2.0])
+    assert estimator.value == pytest.approx(np.quantile([1.0, 2.0, 3.0], 0.9))
+
+    estimator.update(np.random.default_rng(1).uniform(size=50_000))
+    assert estimator.value == pytest.approx(0.9, abs=0.01)
+
+
+def test_alignment_accumulator_matches_umeyama():
+    reference = make_trajectory(30.0, 20.0, start_time=0.0)
+    ref_xyz = reference[:, 1:4] + [5.0e5, 4.0e6, 0.0]  # map-scale coordinates
+    est_xyz = perturb_trajectory(reference, noise=0.2, drift=0.05)[:, 1:4] * 0.9
+    accumulator = AlignmentAccumulator()
+    for est_chunk, ref_chunk in zip(np.array_split(est_xyz, 7), np.array_split(ref_xyz, 7)):
+        accumulator.update(est_chunk, ref_chunk)
+
+    transform, rmse = accumulator.solve()
+    expected = align_positions(est_xyz, ref_xyz)
+    aligned_error = np.linalg.norm(expected.apply_positions(est_xyz) - ref_xyz, axis=1)
+
+    assert transform.scale == pytest.approx(expected.scale, rel=1e-6)
+    np.testing.assert_allclose(transform.rotation, expected.rotation, atol=1e-6)
+    assert rmse == pytest.approx(np.sqrt(np.mean(aligned_error ** 2)), rel=1e-5)
+
+
+def test_online_evaluator_matches_offline_metrics():
+    """Batches lagging less than the buffer give the offline per-segment numbers"""
+    reference = make_trajectory(60.0, 50.0, start_time=100.0)
+    estimate = perturb_trajectory(reference, noise=0.05, time_offset=0.004)
+    estimate[:, 4:8] = np.roll(estimate[:, 4:8], 3, axis=0)
+    evaluator = OnlineEvaluator(EST, REF, max_diff=0.01, buffer_duration=10.0)
+    rng = np.random.default_rng(2)
+    splits = np.sort(rng.choice(np.arange(1, len(reference)), size=40, replace=False))
+    est_splits = np.clip(splits + rng.integers(-60, 60, size=splits.size), 1, len(estimate) - 1)
+    for est_chunk, ref_chunk in zip(np.split(estimate, np.sort(est_splits)), np.split(reference, splits)):
+        evaluator.update(REF, ref_chunk)
+        evaluator.update(EST, est_chunk)
+        evaluator.update('/other', est_chunk)
+
+    online = evaluator.close_segment("segment_0")
+
+    ref_ids, est_ids = associate(reference[:, 0], estimate[:, 0], 0.01)
+    ref, est = reference[ref_ids], estimate[est_ids]
+    errors = compute_errors(ref[:, 1:4], ref[:, [7, 4, 5, 6]], est[:, 1:4], est[:, [7, 4, 5, 6]])
+    assert online["matched_poses"] == len(ref_ids)
+    assert online["ate_rmse"] == pytest.approx(error_statistics(errors.ape_trans)["rmse"])
+    assert online["rpe_rot_mean"] == pytest.approx(error_statistics(errors.rpe_rot)["mean"])
+    assert online["ate_median"] == pytest.approx(error_statistics(errors.ape_trans)["median"], rel=0.05)
+    alignment = align_positions(est[:, 1:4], ref[:, 1:4])
+    aligned = np.linalg.norm(alignment.apply_positions(est[:, 1:4]) - ref[:, 1:4], axis=1)
+    assert online["aligned_ate_rmse"] == pytest.approx(np.sqrt(np.mean(aligned ** 2)), rel=1e-6)
+    # The evaluator starts over for the next segment
+    assert evaluator.close_segment("segment_1")["matched_poses"] == 0
+
+
+def test_online_evaluator_buffer_is_bounded_when_a_topic_stalls():
+    reference = make_trajectory(60.0, 50.0, start_time=0.0)
+    evaluator = OnlineEvaluator(EST, REF, max_diff=0.05, buffer_duration=1.0)
+    for chunk in np.array_split(reference, 60):
+        evaluator.update(REF, chunk)
+
+    assert len(evaluator._ref) <= 1.2 * 50
+    assert evaluator.close_segment("segment_0")["matched_poses"] == 0
+
+
+def test_online_evaluator_keeps_the_closest_estimate_per_reference():
+    def poses(stamps):
+        rows = np.zeros((len(stamps), 8))
+        rows[:, 0] = rows[:, 1] = stamps
+        rows[:, 7] = 1.0
+        return rows
+
+    reference, estimate = poses([0.0, 1.0, 2.0, 3.0]), poses([0.85, 0.95, 1.96, 2.02, 3.0])
+    evaluator = OnlineEvaluator(EST, REF, max_diff=0.1)
+    evaluator.update(REF, reference)
+    # 0.85 is out of tolerance and must not cost 0.95 its reference;
+    # 1.96 is matched in one batch and loses its reference to 2.02 in the next
+    evaluator.update(EST, estimate[:3])
+    evaluator.update(EST, estimate[3:])
+
+    online = evaluator.close_segment("segment_0")
+
+    ref_ids, est_ids = associate(reference[:, 0], estimate[:, 0], 0.1)
+    np.testing.assert_array_equal(est_ids, [1, 3, 4])
+    assert online["matched_poses"] == 3 and online["dropped_poses"] == 2
+    assert online["ate_mean"] == pytest.approx(np.mean(np.abs(estimate[est_ids, 0] - reference[ref_ids, 0])))
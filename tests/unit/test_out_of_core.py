@@ -0,0 +1,189 @@
+import gc
+import json
+import subprocess
+import sys
+from pathlib import Path
+import numpy as np
+import pytest
+from src.bag_processor.bag_processor import BagProcessor
+from src.cli import main
+from src.evo_analyser.alignment import align_positions
+from src.evo_analyser.association import associate
+from src.evo_analyser.metric_engine import compute_errors, error_statistics
+from src.evo_analyser.multiscale import load_run_poses
+from src.evo_analyser.out_of_core import RUN_METRICS_FILENAME, associate_chunks, evaluate_run
+from src.utils import pose_store
+from src.utils.config import Config
+from src.utils.pose_store import PoseSpill, iter_pose_chunks, save_poses
+from src.utils.synthetic import write_synthetic_bag
+
+REPO_ROOT = Path(__file__).parents[2]
+EST_TOPIC, REF_TOPIC = '/casestudy/predicted_pose', '/casestudy/reference_pose'
+
+
+def _chunks(poses, size):
+    return [poses[i:i + size] for i in range(0, len(poses), size)]
+
+
+def test_chunked_association_matches_associate():
+    rng = np.random.default_rng(4)
+    for _ in range(100):
+        # Coarse stamps so that many estimates compete for the same reference
+        ref, est = (np.zeros((n, 8)) for n in rng.integers(1, 300, size=2))
+        ref[:, 0] = np.sort(np.round(rng.uniform(0, 60, len(ref)), 1))
+        est[:, 0] = np.sort(np.round(rng.uniform(0, 60, len(est)), 1))
+        ref[:, 1], est[:, 1] = np.arange(len(ref)), np.arange(len(est))
+        max_diff, offset = rng.choice([0.05, 0.3, 2.0]), rng.choice([0.0, 0.1, -0.3])
+
+        expected_ref, expected_est = associate(ref[:, 0], est[:, 0], max_diff, offset_2=offset)
+        ref_size, est_size = (int(size) for size in rng.integers(1, 40, size=2))
+        pairs = list(associate_chunks(_chunks(ref, ref_size), _chunks(est, est_size),
+                                      len(ref), len(est), max_diff, offset_2=offset,
+                                      chunk_poses=int(rng.integers(1, 40))))
+        matched_ref = np.concatenate([r[:, 1] for r, _ in pairs]) if pairs else np.empty(0)
+        matched_est = np.concatenate([e[:, 1] for _, e in pairs]) if pairs else np.empty(0)
+        np.testing.assert_array_equal(matched_ref, expected_ref)
+        np.testing.assert_array_equal(matched_est, expected_est)
+
+
+def test_dense_target_stream_is_buffered_in_chunks():
+    # 1 Hz reference queried against a 200 Hz estimate
+    ref, est = np.zeros((100, 8)), np.zeros((20000, 8))
+    ref[:, 0], est[:, 0] = np.arange(100.0), np.arange(20000) / 200.0 + 0.002
+    ref[:, 1], est[:, 1] = np.arange(len(ref)), np.arange(len(est))
+    pulled = []
+
+    def estimate_chunks():
+        for chunk in _chunks(est, 50):
+            pulled.append(len(chunk))
+            yield chunk
+
+    matched = []
+    for ref_rows, est_rows in associate_chunks(_chunks(ref, 50), estimate_chunks(), len(ref), len(est),
+                                               max_diff=0.01, chunk_poses=50):
+        # Read ahead of the last yielded match: the held pair's 200 estimates plus two chunks,
+        # rather than a whole query chunk of 50 s (10000 estimates)
+        assert sum(pulled) - est_rows[-1, 1] <= 200 + 2 * 50
+        matched.append(est_rows[:, 1])
+    expected_ref, expected_est = associate(ref[:, 0], est[:, 0], 0.01)
+    np.testing.assert_array_equal(np.concatenate(matched), expected_est)
+
+
+def test_spill_writes_the_same_store(tmp_path):
+    poses = np.random.default_rng(5).normal(size=(2500, 8))
+    spill = PoseSpill(tmp_path / "poses.spill", chunk_poses=1000)
+    for chunk in _chunks(poses, 700):
+        spill.append(chunk)
+    spill.save(tmp_path / "spilled.npy")
+    save_poses(tmp_path / "direct.npy", poses)
+
+    assert (tmp_path / "spilled.npy").read_bytes() == (tmp_path / "direct.npy").read_bytes()
+    np.testing.assert_array_equal(np.concatenate(list(spill.chunks())), poses)
+    np.testing.assert_array_equal(np.concatenate(list(iter_pose_chunks(tmp_path / "direct.npy", 300))), poses)
+    spill.remove()
+    assert not spill.path.exists()
+
+
+def test_budgeted_ingest_matches_in_memory_ingest(sample_bag_file, tmp_path, monkeypatch):
+    monkeypatch.setitem(Config().config['output']['segments'], 'mode', 'virtual')
+    in_memory = BagProcessor(sample_bag_file, tmp_path / "in_memory").process_bag(segment_duration=5)
+    budgeted = BagProcessor(sample_bag_file, tmp_path / "budgeted", memory_budget_mb=8).process_bag(
+        segment_duration=5)
+
+    assert [p.name for p in budgeted] == [p.name for p in in_memory]
+    for a, b in zip(in_memory, budgeted):
+        for store in (a / "poses").glob("*.npy"):
+            assert (b / "poses" / store.name).read_bytes() == store.read_bytes()
+    assert not any((tmp_path / "budgeted" / ".scratch").iterdir())
+
+
+def test_streamed_segments_are_mapped_from_the_spill(sample_bag_file, tmp_path, monkeypatch):
+    monkeypatch.setitem(Config().config['output']['segments'], 'mode', 'virtual')
+    in_memory = [segment.poses for segment in BagProcessor(sample_bag_file, tmp_path / "a").iter_segments(
+        5, write_artifacts=False)]
+    scratch = tmp_path / "b" / ".scratch"
+    segments = BagProcessor(sample_bag_file, tmp_path / "b", memory_budget_mb=8).iter_segments(
+        5, write_artifacts=False)
+
+    for expected, segment in zip(in_memory, segments):
+        poses = segment.poses[EST_TOPIC]
+        assert isinstance(poses, np.memmap)
+        np.testing.assert_array_equal(poses, expected[EST_TOPIC])
+        # Scratch files of earlier segments went with the last reference to their poses
+        assert {path.name.split('_casestudy')[0] for path in scratch.iterdir()} == {segment.path.name}
+        del segment, poses
+        gc.collect()
+    assert next(segments, None) is None
+    gc.collect()
+    assert not any(scratch.iterdir())
+
+
+def test_run_metrics_match_in_memory_evaluation(sample_bag_file, test_output_dir, monkeypatch):
+    monkeypatch.setitem(Config().config['output']['segments'], 'mode', 'virtual')
+    BagProcessor(sample_bag_file, test_output_dir).process_bag(segment_duration=5)
+    # Chunks of 64 rows, so association and RPE cross many chunk boundaries
+    monkeypatch.setattr(pose_store, 'MIN_CHUNK_POSES', 1)
+    budget_mb = pose_store.RESERVED_BUDGET_MB + 64 * pose_store.WORKING_BYTES_PER_POSE / 2**20
+    metrics = evaluate_run(test_output_dir, EST_TOPIC, REF_TOPIC, max_diff=0.01, budget_mb=budget_mb)
+    assert metrics["chunk_poses"] == 64
+
+    est, ref = load_run_poses(test_output_dir, EST_TOPIC), load_run_poses(test_output_dir, REF_TOPIC)
+    ref_ids, est_ids = associate(ref[:, 0], est[:, 0], 0.01)
+    ref, est = ref[ref_ids], est[est_ids]
+    transform = align_positions(est[:, 1:4], ref[:, 1:4])
+    errors = compute_errors(ref[:, 1:4], ref[:, [7, 4, 5, 6]], est[:, 1:4], est[:, [7, 4, 5, 6]],
+                            transform.apply_positions(est[:, 1:4]),
+                            transform.apply_orientations(est[:, [7, 4, 5, 6]]))
+    ate, rpe = error_statistics(errors.ape_trans), error_statistics(errors.rpe_trans)
+
+    assert metrics["matched_poses"] == len(ref_ids)
+    for key in ("rmse", "mean", "std", "min", "max"):
+        assert metrics[f"ate_{key}"] == pytest.approx(ate[key], rel=1e-6)
+    assert metrics["ate_median"] == pytest.approx(ate["median"], rel=0.1)
+    assert metrics["rpe_rmse"] == pytest.approx(rpe["rmse"], rel=1e-9)
+    assert metrics["ate_rot_rmse"] == pytest.approx(error_statistics(errors.ape_rot)["rmse"], rel=1e-6)
+    assert metrics["alignment_scale"] == pytest.approx(transform.scale, rel=1e-9)
+    assert metrics["trajectory_length"] == pytest.approx(
+        np.linalg.norm(np.diff(ref[:, 1:4], axis=0), axis=1).sum())
+    assert not any((test_output_dir / ".scratch").iterdir())
+
+
+def test_run_metrics_command(sample_bag_file, test_output_dir, tmp_path, monkeypatch):
+    monkeypatch.setitem(Config().config['output']['segments'], 'mode', 'virtual')
+    common = ['--output-dir', str(test_output_dir), '--log-dir', str(tmp_path / "logs")]
+    assert main(['ingest', '--bag', str(sample_bag_file), '--segment-duration', '5',
+                 '--memory-budget', '8', *common]) == 0
+    assert main(['run-metrics', '--memory-budget', '8', *common]) == 0
+    with open(test_output_dir / RUN_METRICS_FILENAME) as f:
+        metrics = json.load(f)
+    assert metrics["memory_budget_mb"] == 8 and metrics["matched_poses"] > 0
+
+
+@pytest.mark.skipif(not Path('/proc/self/status').exists(), reason="reads peak RSS from /proc")
+def test_peak_memory_stays_within_budget_on_long_bag(tmp_path):
+    # One hour at 50 Hz in a single segment; its raw poses alone exceed the budget
+    budget_mb, duration, rate = 16, 3600.0, 50.0
+    bag = write_synthetic_bag(tmp_path / "long.db3", duration=duration, pose_rate=rate)
+    assert 2 * duration * rate * 8 * 8 > budget_mb * 2**20
+
+    code = (
+        "import json, sqlite3\n"
+        "from src.utils.config import Config\n"
+        "from src.bag_processor.bag_processor import BagProcessor\n"
+        "from src.evo_analyser.evo_analyser import EvoAnalyser\n"
+        "import src.utils.pose_decoder\n"
+        "def status(key):\n"
+        "    with open('/proc/self/status') as f:\n"
+        "        return next(int(line.split()[1]) * 1024 for line in f if line.startswith(key))\n"
+        "Config().config['output']['segments']['mode'] = 'virtual'\n"
+        "baseline = status('VmRSS:')\n"
+        f"BagProcessor({str(bag)!r}, {str(tmp_path / 'out')!r}, {budget_mb}).process_bag("
+        f"segment_duration={int(duration)})\n"
+        f"metrics = EvoAnalyser({str(tmp_path / 'out')!r}).analyze_run({budget_mb})\n"
+        "print(json.dumps({'growth': status('VmHWM:') - baseline, 'poses': metrics['matched_poses']}))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr[-2000:]
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+    assert measured["poses"] == duration * rate
+    assert measured["growth"] < budget_mb * 2**20
@@ -0,0 +1,58 @@
+import pytest
+import numpy as np
+from src.bag_processor.segment import SegmentData
+from src.evo_analyser.parallel import analyze_segments, analyze_stream
+from src.utils.pose_store import load_poses
+
+
+def test_parallel_results_keep_segment_order(tmp_path, make_segment):
+    """Metrics come back in segment order and a broken segment does not stop the others"""
+    segments = [make_segment(tmp_path, f"segment_{i}", seed=i) for i in range(3)]
+    broken = tmp_path / "segment_3"
+    (broken / "poses").mkdir(parents=True)
+    segments.insert(1, broken)
+
+    all_metrics, failures = analyze_segments(tmp_path, segments, workers=2)
+
+    assert [m["segment_id"] for m in all_metrics] == ["segment_0", "segment_1", "segment_2"]
+    assert [f["segment_id"] for f in failures] == ["segment_3"]
+
+
+def test_parallel_matches_serial(tmp_path, make_segment):
+    """Pool and in-process analysis produce identical metrics"""
+    segments = [make_segment(tmp_path, f"segment_{i}", seed=i) for i in range(2)]
+
+    serial, _ = analyze_segments(tmp_path, segments, workers=1)
+    parallel, _ = analyze_segments(tmp_path, segments, workers=2)
+
+    assert serial == parallel
+
+
+def test_tum_text_segments_still_load(tmp_path, make_segment):
+    """Segments with TUM text exports only are analysed like pose stores"""
+    npy_segment = make_segment(tmp_path / "npy")
+    tum_segment = make_segment(tmp_path / "tum", tum=True)
+
+    from_store, _ = analyze_segments(tmp_path, [npy_segment])
+    from_text, _ = analyze_segments(tmp_path, [tum_segment])
+
+    assert from_store[0]["ate_rmse"] == pytest.approx(from_text[0]["ate_rmse"], abs=1e-3)
+
+
+def test_streamed_segments_match_file_based_analysis(tmp_path, make_segment):
+    """In-memory streaming gives the same metrics, in order, as reading pose stores"""
+    segment_paths = [make_segment(tmp_path, f"segment_{i}", seed=i) for i in range(3)]
+
+    def stream():
+        for i, path in enumerate(segment_paths):
+            poses = {
+                '/casestudy/predicted_pose': np.array(load_poses(path / 'poses' / 'casestudy_predicted_pose.npy')),
+                '/casestudy/reference_pose': np.array(load_poses(path / 'poses' / 'casestudy_reference_pose.npy')),
+            }
+            yield SegmentData(i, path, 0, 0, poses)
+
+    streamed, failures = analyze_stream(tmp_path, stream(), workers=2, max_pending=1)
+    from_files, _ = analyze_segments(tmp_path, segment_paths)
+
+    assert failures == []
+    assert streamed == from_files
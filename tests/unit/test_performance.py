@@ -0,0 +1,61 @@
+import pytest
+from src.bag_processor.bag_processor import BagProcessor
+from src.evo_analyser.evo_analyser import EvoAnalyser
+from src.utils.config import Config
+from src.utils.performance import (configure_performance, configure_from_config, export_prometheus,
+                                   load_spans, span, summarise_spans)
+
+
+@pytest.fixture
+def perf_files(tmp_path):
+    paths = tmp_path / "perf.jsonl", tmp_path / "metrics.prom"
+    configure_performance(*paths)
+    yield paths
+    configure_from_config()
+
+
+def test_disabled_spans_are_shared_no_ops(tmp_path):
+    configure_performance(None)
+    try:
+        with span('decode', items=10) as first, span('alignment') as second:
+            first.add(5)
+        assert first is second
+        assert export_prometheus(0.0) is None
+    finally:
+        configure_from_config()
+
+
+def test_pipeline_stages_are_recorded(perf_files, sample_bag_file, test_output_dir, monkeypatch):
+    monkeypatch.setitem(Config().config['output']['segments'], 'mode', 'virtual')
+    jsonl_path, prom_path = perf_files
+    segment_paths = BagProcessor(sample_bag_file, test_output_dir).process_bag(segment_duration=10)
+    analyser = EvoAnalyser(test_output_dir)
+    for path in segment_paths:
+        analyser.analyze_segment(path)
+
+    spans = load_spans(jsonl_path)
+    summary = summarise_spans(spans)
+    for stage in ('bag_open', 'read', 'decode', 'segment_write', 'validation', 'segment_ingest', 'load',
+                  'association', 'alignment', 'metric_errors', 'metric_ape_trans', 'metric_rpe_rot',
+                  'plotting', 'segment_analysis'):
+        assert stage in summary, stage
+    assert summary['read']['items'] == 800
+    assert summary['read']['bytes'] > 800 * 56
+    assert summary['decode']['items'] == 800
+    assert summary['segment_ingest']['count'] == len(segment_paths) == 2
+    assert all(s['peak_rss_bytes'] > 0 for s in summary.values())
+    assert {r['segment'] for r in spans if r['stage'] == 'segment_analysis'} == {'segment_0', 'segment_1'}
+
+    export_prometheus(0.0, {"bag": "sample"})
+    text = prom_path.read_text()
+    assert '# TYPE trajectory_analyzer_stage_seconds gauge' in text
+    assert 'trajectory_analyzer_stage_items{bag="sample",stage="read"} 800' in text
+    assert 'trajectory_analyzer_stage_latency_seconds{bag="sample",stage="alignment",quantile="0.95"}' in text
+
+
+def test_truncated_lines_are_skipped(tmp_path):
+    path = tmp_path / "perf.jsonl"
+    path.write_text('{"time": 5, "stage": "read", "seconds": 1.0, "items": 10}\n{"time": 6, "sta')
+    assert len(load_spans(path)) == 1
+    assert load_spans(path, since=6) == []
+    assert summarise_spans(load_spans(path))['read']['items_per_s'] == 10
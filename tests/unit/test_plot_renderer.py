@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+import matplotlib.pyplot as plt
+from src.evo_analyser.parallel import analyze_segments
+from src.evo_analyser.plot_renderer import PlotJob, PlotRenderer, make_plot_job, render_plots
+from src.utils.config import Config
+from src.utils.synthetic import make_trajectory
+
+
+def _plot_files(segment_dir):
+    return sorted((segment_dir / 'plots').glob('*'))
+
+
+def test_background_rendering_matches_inline_metrics(tmp_path, make_segment):
+    """Deferred plots are rendered by the pool and metrics are unchanged"""
+    segments = [make_segment(tmp_path / "pool", f"segment_{i}", seed=i) for i in range(3)]
+    inline_segment = make_segment(tmp_path / "inline")
+
+    with PlotRenderer(workers=2, max_pending=1) as renderer:
+        metrics, failures = analyze_segments(tmp_path, segments, workers=2, plot_renderer=renderer)
+        assert failures == []
+    inline_metrics, _ = analyze_segments(tmp_path, [inline_segment])
+
+    assert renderer.failures == []
+    assert metrics[0] == inline_metrics[0]
+    assert all(_plot_files(segment) for segment in segments)
+    assert [p.name for p in _plot_files(segments[0])] == [p.name for p in _plot_files(inline_segment)]
+
+
+def test_metrics_only_mode_skips_plots(tmp_path, make_segment, monkeypatch):
+    monkeypatch.setitem(Config().config['output']['plots'], 'mode', 'none')
+    segment = make_segment(tmp_path)
+
+    metrics, _ = analyze_segments(tmp_path, [segment])
+
+    assert metrics[0]["segment_id"] == "segment_0"
+    assert _plot_files(segment) == []
+
+
+def test_render_closes_figures(tmp_path):
+    poses = make_trajectory(5.0, 20.0)
+    errors = np.linspace(0.0, 1.0, len(poses))
+    stats = {"rmse": 0.5, "mean": 0.5, "median": 0.5, "std": 0.1, "min": 0.0, "max": 1.0, "sse": 1.0}
+
+    render_plots(make_plot_job("segment_0", tmp_path, poses, poses, poses, errors, errors[1:], stats, stats))
+
+    assert plt.get_fignums() == []
+    assert list(tmp_path.glob('segment_0_plots*'))
+
+
+def test_render_failures_are_reported(tmp_path):
+    empty = np.empty((0, 8))
+
+    with PlotRenderer(workers=0) as renderer:
+        renderer.submit(PlotJob("segment_9", tmp_path, empty, empty, empty, np.empty(0), {}, {},
+                                np.empty((0, 2)), np.empty((0, 2)), np.empty((0, 2))))
+
+    assert [f["segment_id"] for f in renderer.failures] == ["segment_9"]
+
+
+def test_plot_job_respects_point_budgets(tmp_path):
+    """Decimated paths and series stay within budget and keep the APE peak"""
+    poses = make_trajectory(100.0, 100.0)
+    errors = np.abs(np.sin(poses[:, 0]))
+    errors[4321] = 10.0
+    stats = {"min": 0.0, "max": 10.0, "mean": 1.0}
+
+    job = make_plot_job("segment_0", tmp_path, poses, poses, poses, errors, errors[1:], stats, stats,
+                        max_points={'trajectory': 500, 'time_series': 300})
+
+    assert len(job.ref_poses) <= 500 and len(job.aligned_poses) <= 500
+    assert len(job.ape_series) == len(job.rpe_series) == len(job.rmse_series) == 300
+    assert job.ape_errors.max() == 10.0
+    assert job.ape_series[:, 1].max() == 10.0
+    assert job.rmse_series[-1, 1] == pytest.approx(np.sqrt(np.mean(errors ** 2)))
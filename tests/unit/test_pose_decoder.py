@@ -0,0 +1,40 @@
+import pytest
+import numpy as np
+from src.utils import pose_decoder
+from src.utils.pose_decoder import encode_pose_stamped, decode_pose_stamped_batch
+
+
+def test_decode_matches_encoded_values():
+    """Batch decoding recovers poses and stamps for mixed frame_id lengths"""
+    rng = np.random.default_rng(0)
+    expected = rng.normal(size=(50, 7))
+    frames = ['map', 'odom', '', 'a_much_longer_frame_name', 'base_link']
+    buffers = [
+        encode_pose_stamped(1733136910 + i, 1000 * i, frames[i % len(frames)], expected[i])
+        for i in range(len(expected))
+    ]
+
+    poses, stamps = decode_pose_stamped_batch(buffers)
+
+    np.testing.assert_array_equal(poses, expected)
+    assert stamps.dtype == np.int64
+    assert stamps[3] == (1733136910 + 3) * 1_000_000_000 + 3000
+
+
+def test_unrecognised_payload_uses_fallback(monkeypatch):
+    """Payloads that are not little-endian CDR PoseStamped go through rclpy"""
+    good = encode_pose_stamped(1, 2, 'map', [1, 2, 3, 0, 0, 0, 1])
+    big_endian = b'\x00\x00' + good[2:]
+    calls = []
+
+    def fake_fallback(data):
+        calls.append(data)
+        return [9.0] * 7, 42
+
+    monkeypatch.setattr(pose_decoder, '_deserialize_fallback', fake_fallback)
+    poses, stamps = decode_pose_stamped_batch([good, big_endian, b'\x00\x01'])
+
+    assert calls == [big_endian, b'\x00\x01']
+    np.testing.assert_array_equal(poses[0], [1, 2, 3, 0, 0, 0, 1])
+    np.testing.assert_array_equal(poses[1:], 9.0)
+    assert list(stamps) == [1_000_000_002, 42, 42]
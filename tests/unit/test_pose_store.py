@@ -0,0 +1,38 @@
+import pytest
+import numpy as np
+from src.utils.pose_store import save_poses, load_poses, count_poses, pose_filename
+from src.utils.extract_poses import PoseFile
+from src.utils.pose_decoder import encode_pose_stamped
+
+
+def test_pose_store_roundtrip_keeps_full_precision(tmp_path):
+    """Stored timestamps are not truncated and columns are contiguous"""
+    poses = np.column_stack([1733136910.123456789 + np.arange(5) * 0.01,
+                             np.random.default_rng(0).normal(size=(5, 7))])
+    path = tmp_path / pose_filename('/casestudy/predicted_pose')
+    save_poses(path, poses)
+
+    loaded = load_poses(path)
+
+    assert path.name == 'casestudy_predicted_pose.npy'
+    assert isinstance(loaded, np.memmap)
+    assert loaded.flags.f_contiguous
+    np.testing.assert_array_equal(loaded, poses)
+    assert count_poses(path) == 5
+
+
+@pytest.mark.parametrize("write_tum", [False, True])
+def test_pose_file_writes_store_and_optional_tum(tmp_path, write_tum):
+    """PoseFile always writes the binary store and TUM text only on request"""
+    pose_file = PoseFile(tmp_path / 'topic.npy', write_tum=write_tum, batch_size=3)
+    for i in range(7):
+        ts = 1_000_000_000 * (100 + i)
+        pose_file.append(encode_pose_stamped(100 + i, 0, 'map', [i, 0, 0, 0, 0, 0, 1]), ts)
+    pose_file.close()
+
+    loaded = load_poses(tmp_path / 'topic.npy')
+    np.testing.assert_array_equal(loaded[:, 0], 100 + np.arange(7))
+    np.testing.assert_array_equal(loaded[:, 1], np.arange(7))
+    assert (tmp_path / 'topic.txt').exists() == write_tum
+    if write_tum:
+        np.testing.assert_allclose(np.loadtxt(tmp_path / 'topic.txt'), loaded)
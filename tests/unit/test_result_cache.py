@@ -0,0 +1,136 @@
+import os
+import numpy as np
+import pytest
+from src.evo_analyser import evo_analyser
+from src.evo_analyser.evo_analyser import EvoAnalyser
+from src.evo_analyser.parallel import analyze_segments
+from src.evo_analyser.plot_renderer import PlotRenderer
+from src.evo_analyser.result_cache import ResultCache, hash_arrays
+from src.utils.config import Config
+from src.utils.pose_store import load_poses, save_poses
+from src.utils.synthetic import make_trajectory
+
+
+def _forbid_recompute(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("metrics were recomputed")
+    monkeypatch.setattr(evo_analyser, 'compute_errors', fail)
+
+
+def test_unchanged_segment_is_restored_from_cache(tmp_path, make_segment, monkeypatch):
+    """A second segment with the same poses gets cached metrics and plots under its own name"""
+    cache_dir = tmp_path / "cache"
+    first = make_segment(tmp_path, "segment_0")
+    second = make_segment(tmp_path / "rerun", "segment_7")
+    computed = EvoAnalyser(tmp_path, cache_dir=cache_dir).analyze_segment(first)
+
+    _forbid_recompute(monkeypatch)
+    restored = EvoAnalyser(tmp_path, cache_dir=cache_dir).analyze_segment(second)
+
+    assert restored == {**computed, "segment_id": "segment_7"}
+    assert (second / 'metrics' / 'segment_7_metrics.json').exists()
+    assert sorted(p.name.replace('segment_0', 'segment_7') for p in (first / 'plots').iterdir()) == \
+        sorted(p.name for p in (second / 'plots').iterdir())
+
+
+def test_changed_settings_miss_the_cache(tmp_path, make_segment, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    segment = make_segment(tmp_path, "segment_0")
+    EvoAnalyser(tmp_path, cache_dir=cache_dir).analyze_segment(segment)
+    # Settings that do not affect the metrics keep hitting the cache
+    monkeypatch.setitem(Config().config['analysis'], 'workers', 8)
+    monkeypatch.setitem(Config().config['analysis']['trajectory'], 'max_association_diff', 0.2)
+
+    EvoAnalyser(tmp_path, cache_dir=cache_dir).analyze_segment(segment)
+
+    assert len(list(cache_dir.iterdir())) == 2
+
+
+def test_background_plots_are_cached(tmp_path, make_segment, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    segment = make_segment(tmp_path, "segment_0")
+    with PlotRenderer(workers=1) as renderer:
+        analyze_segments(tmp_path, [segment], plot_renderer=renderer, cache_dir=cache_dir)
+
+    rerun = make_segment(tmp_path / "rerun", "segment_0")
+    _forbid_recompute(monkeypatch)
+    metrics, failures = analyze_segments(tmp_path, [rerun], cache_dir=cache_dir)
+
+    assert failures == []
+    assert len(list((rerun / 'plots').iterdir())) == len(list((segment / 'plots').iterdir())) > 0
+
+
+def test_plot_only_change_keeps_cached_metrics(tmp_path, make_segment, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    segment = make_segment(tmp_path, "segment_0")
+    computed = EvoAnalyser(tmp_path, cache_dir=cache_dir).analyze_segment(segment)
+    # A plot setting invalidates the plots but not the metrics
+    monkeypatch.setitem(Config().config['output']['plots'], 'max_points', {'trajectory': 100, 'time_series': 50})
+    monkeypatch.setattr(evo_analyser, 'delta_rpe', lambda *args, **kwargs: pytest.fail("metrics were recomputed"))
+    for path in (segment / 'plots').iterdir():
+        path.unlink()
+
+    assert EvoAnalyser(tmp_path, cache_dir=cache_dir).analyze_segment(segment) == computed
+    assert any((segment / 'plots').iterdir())
+    assert len(list((cache_dir / next(cache_dir.iterdir()).name / 'plots').iterdir())) == 2
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_plots_count_towards_the_cache_budget(tmp_path, make_segment, monkeypatch, background):
+    monkeypatch.setitem(Config().config['cache'], 'max_size_mb', 1.0)
+    cache_dir = tmp_path / "cache"
+    segments = [make_segment(tmp_path, f"segment_{i}", seed=i) for i in range(4)]
+
+    if background:
+        with PlotRenderer(workers=1) as renderer:
+            analyze_segments(tmp_path, segments, plot_renderer=renderer, cache_dir=cache_dir)
+        # The renderer stores the plots; metrics are written by the analyser
+        assert ResultCache(cache_dir).size() <= 2**20 + sum(
+            (entry / 'metrics.json').stat().st_size for entry in cache_dir.iterdir())
+    else:
+        analyser = EvoAnalyser(tmp_path, cache_dir=cache_dir)
+        for segment in segments:
+            analyser.analyze_segment(segment)
+        assert analyser.cache._size == ResultCache(cache_dir).size() <= 2**20
+    # Every segment's plots exceed a quarter of the budget, so entries were evicted
+    assert len(list(cache_dir.iterdir())) < len(segments)
+
+
+def test_lru_eviction_keeps_recent_entries(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=None)
+    for key in ("a", "b", "c"):
+        cache.put_metrics(key, {"payload": "x" * 1000})
+        os.utime(tmp_path / key, (0, {"a": 1, "b": 2, "c": 3}[key]))
+    assert cache.get_metrics("a") is not None  # refreshes a
+
+    cache.max_bytes = 2500
+    cache.put_metrics("d", {"payload": "x" * 1000})
+
+    assert cache.get_metrics("b") is None and cache.get_metrics("c") is None
+    assert cache.get_metrics("a") is not None and cache.get_metrics("d") is not None
+    assert cache.size() <= 2500
+
+
+def test_puts_within_budget_do_not_scan_the_cache(tmp_path, monkeypatch):
+    ResultCache(tmp_path).put_metrics("existing", {"payload": "x" * 1000})
+    cache = ResultCache(tmp_path, max_bytes=10_000)
+    scans = []
+    entry_sizes = cache._entry_sizes
+    monkeypatch.setattr(cache, '_entry_sizes', lambda: scans.append(1) or entry_sizes())
+
+    for key in ("a", "b", "c"):
+        cache.put_metrics(key, {"payload": "x" * 1000})
+    cache.put_metrics("a", {"payload": "x" * 2000})
+    assert scans == [] and cache._size == cache.size()
+
+    for key in range(10):
+        cache.put_metrics(str(key), {"payload": "x" * 1000})
+    assert scans and cache._size == cache.size() <= 10_000
+
+
+def test_hash_arrays_is_layout_independent(tmp_path):
+    poses = make_trajectory(5.0, 20.0)
+    save_poses(tmp_path / "poses.npy", poses)
+
+    assert hash_arrays(load_poses(tmp_path / "poses.npy")) == hash_arrays(np.ascontiguousarray(poses))
+    assert hash_arrays(poses) != hash_arrays(poses[:-1])
@@ -0,0 +1,88 @@
+import json
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pytest
+from src.results_store.results_store import ResultsStore, config_hash
+
+SETTINGS = {"segment_duration": 60, "analyser_version": "2"}
+
+
+def segment_metrics(count, ate=0.5):
+    return [{"segment_id": f"segment_{i}", "ate_rmse": ate + i, "rpe_rmse": 0.1, "duration": 10.0 * (i + 1),
+             "trajectory_length": 20.0} for i in range(count)]
+
+
+def write_segment_manifests(output_dir, count, start):
+    for i in range(count):
+        (output_dir / f"segment_{i}").mkdir(parents=True)
+        with open(output_dir / f"segment_{i}" / "manifest.json", 'w') as f:
+            json.dump({"start_time": int((start + 60 * i) * 1e9), "end_time": int((start + 60 * (i + 1)) * 1e9)}, f)
+
+
+def append_runs(db_path, worker, runs):
+    store = ResultsStore(db_path)
+    for run in range(runs):
+        store.record_run(f"/bags/worker_{worker}.db3", SETTINGS, segment_metrics(3), started_at=run)
+    return runs
+
+
+def test_record_and_query_runs_and_segments(tmp_path):
+    store = ResultsStore(tmp_path / "results.sqlite")
+    write_segment_manifests(tmp_path / "out", 3, start=1000.0)
+    run_a = store.record_run(tmp_path / "a.db3", SETTINGS, segment_metrics(3), output_dir=tmp_path / "out",
+                             started_at=1.0)
+    run_b = store.record_run(tmp_path / "b.db3", dict(SETTINGS, segment_duration=30), segment_metrics(2),
+                             failures=[{"segment_id": "segment_2", "error": "x"}], started_at=2.0)
+
+    runs = store.runs()
+    assert list(runs["run_id"]) == [run_b, run_a]
+    assert list(runs["failed_segments"]) == [1, 0]
+    assert list(store.runs(bag=tmp_path / "a.db3")["run_id"]) == [run_a]
+    assert list(store.runs(config_hash=config_hash(SETTINGS))["run_id"]) == [run_a]
+
+    segments = store.segments(columns=["ate_rmse"], run_ids=[run_a])
+    assert list(segments.columns[-1:]) == ["ate_rmse"]
+    assert list(segments["segment_index"]) == [0, 1, 2]
+    assert segments["start_time"].tolist() == [1000.0, 1060.0, 1120.0]
+    # Segments overlapping [1070, 1130)
+    overlapping = store.segments(columns=["ate_rmse"], start_time=1070.0, end_time=1130.0)
+    assert overlapping["segment_id"].tolist() == ["segment_1", "segment_2"]
+    with pytest.raises(ValueError):
+        store.segments(columns=["ate_rmse; DROP TABLE runs"])
+
+
+def test_metric_trend_over_last_runs(tmp_path):
+    store = ResultsStore(tmp_path / "results.sqlite")
+    for run in range(5):
+        store.record_run("/bags/nightly.db3", SETTINGS, segment_metrics(2, ate=run), started_at=run)
+
+    trend = store.metric_trend("ate_rmse", last_runs=3)
+
+    assert trend["started_at"].tolist() == [2.0, 3.0, 4.0]
+    assert trend["mean"].tolist() == [2.5, 3.5, 4.5]
+    # Duration-weighted: segments last 10 s and 20 s
+    assert trend["rms"].iloc[0] == pytest.approx(np.sqrt((2.0 ** 2 * 10 + 3.0 ** 2 * 20) / 30))
+
+
+def test_concurrent_appends_are_all_recorded(tmp_path):
+    db_path = tmp_path / "results.sqlite"
+    ResultsStore(db_path)
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        assert sum(executor.map(append_runs, [db_path] * 4, range(4), [15] * 4)) == 60
+
+    store = ResultsStore(db_path)
+    assert len(store.runs()) == 60
+    assert len(store.segments()) == 180
+
+
+def test_failed_write_leaves_no_partial_run(tmp_path):
+    store = ResultsStore(tmp_path / "results.sqlite")
+    store.record_run("/bags/a.db3", SETTINGS, segment_metrics(2), run_id="run-1")
+    duplicate_segments = segment_metrics(2) * 2
+
+    with pytest.raises(sqlite3.IntegrityError):
+        store.record_run("/bags/a.db3", SETTINGS, duplicate_segments, run_id="run-2")
+
+    assert store.runs()["run_id"].tolist() == ["run-1"]
+    assert len(store.segments()) == 2
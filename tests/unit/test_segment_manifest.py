@@ -0,0 +1,21 @@
+import pytest
+from src.bag_processor.segment_manifest import write_manifest, load_manifest
+
+
+def test_manifest_roundtrip(tmp_path):
+    """A virtual segment is fully described by its manifest"""
+    segment_path = tmp_path / "segment_2"
+    segment_path.mkdir()
+    topics = {'/casestudy/predicted_pose': 'geometry_msgs/msg/PoseStamped',
+              '/camera/image': 'sensor_msgs/msg/Image'}
+
+    manifest_path = write_manifest(segment_path, tmp_path / "bag.db3", 'sqlite3',
+                                   1_000_000_000, 61_000_000_000.0, topics,
+                                   ['/casestudy/predicted_pose'])
+    manifest = load_manifest(segment_path)
+
+    assert manifest == load_manifest(manifest_path)
+    assert manifest["segment_id"] == "segment_2"
+    assert manifest["end_time"] == 61_000_000_000
+    assert manifest["topics"] == topics
+    assert manifest["source_bag"] == str((tmp_path / "bag.db3").resolve())
@@ -0,0 +1,46 @@
+import pytest
+import numpy as np
+from src.bag_processor.segment_quality import SegmentQuality, TopicStats, load_quality
+
+
+def test_topic_stats_across_batches():
+    """Counts, rate, largest gap and dropouts are tracked over several batches"""
+    stats = TopicStats(dropout_gap=0.5)
+    stats.update(np.arange(0.0, 1.0, 0.1))
+    stats.update(np.array([]))
+    stats.update(np.array([2.0, 2.1]))
+    stats.update(np.array([2.2, 3.0]))
+
+    assert stats.count == 14
+    assert stats.max_gap == pytest.approx(1.1)
+    assert stats.dropouts == [[pytest.approx(0.9), 2.0], [2.2, 3.0]]
+    assert stats.message_rate == pytest.approx(13 / 3.0)
+
+
+def test_validity_gate_and_report(tmp_path):
+    """The gate uses the configured limits and the report is readable by the analyser"""
+    quality = SegmentQuality('segment_0', 0.0, 60.0, ['/est', '/ref'], dropout_gap=0.5)
+    quality.update('/est', np.arange(0.0, 10.0, 0.01))
+    quality.update('/ref', np.arange(0.0, 10.0, 0.02))
+
+    assert not quality.evaluate(max_pose_count_diff=100)
+    assert quality.evaluate(max_pose_count_diff=600)
+    assert not quality.evaluate(max_pose_count_diff=600, max_gap=0.01)
+
+    quality.save(tmp_path)
+    report = load_quality(tmp_path)
+    assert report["valid"] is False
+    assert report["topics"]["/est"]["count"] == 1000
+    assert load_quality(tmp_path / "missing") is None
+
+
+def test_analyser_skips_rejected_segment(tmp_path):
+    """A segment rejected at ingestion fails before any pose file is read"""
+    from src.evo_analyser.evo_analyser import EvoAnalyser
+
+    quality = SegmentQuality('segment_0', 0.0, 60.0, ['/est'], dropout_gap=0.5)
+    quality.evaluate(max_pose_count_diff=500)
+    quality.save(tmp_path)
+
+    with pytest.raises(ValueError, match="quality checks"):
+        EvoAnalyser(tmp_path).analyze_segment(tmp_path)
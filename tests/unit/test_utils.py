@@ -2,10 +2,22 @@ import pytest
 from src.utils import prepare_directories, extract_poses, logging_config
 from pathlib import Path
 
-def test_prepare_directories():
+def test_prepare_directories(tmp_path):
     """Test directory preparation utility"""
-    # TODO: Test directory creation and cleanup
-    pass
+    output_dir = tmp_path / "output"
+    (output_dir / "segment_3" / "poses").mkdir(parents=True)
+    (output_dir / "other_bag").mkdir()
+    (output_dir / "fleet_summary.json").write_text("{}")
+
+    assert prepare_directories.prepare_directories(output_dir) == output_dir
+    # Segments of the previous run are removed, other results are kept
+    assert not (output_dir / "segment_3").exists()
+    assert (output_dir / "other_bag").is_dir()
+    assert (output_dir / "fleet_summary.json").exists()
+
+    segment_dir = prepare_directories.prepare_directories(output_dir, 0)
+    assert segment_dir == output_dir / "segment_0"
+    assert all((segment_dir / sub).is_dir() for sub in ("poses", "plots", "metrics"))
 
 def test_pose_file_operations():
     """Test pose file handling"""